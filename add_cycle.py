@@ -4,14 +4,17 @@ from telegram.ext import (
     ConversationHandler, CallbackContext, MessageHandler,
     filters, CommandHandler, CallbackQueryHandler
 )
-import aiohttp
 from states import START_DATE, SYMPTOMS, MEDICATION, MENU
 from languages import get_message, SYMPTOM_OPTIONS, MEDICATION_OPTIONS
-from calendar_keyboard import CalendarKeyboard
+from calendar_keyboard import calendar_service as calendar
 from menu_handlers import handle_menu
+from utils import get_access_token
+from metrics import timed
+from outbox import cycle_outbox
+from token_refresh import token_subject
+from settings import user_timezone
 
 logger = logging.getLogger(__name__)
-calendar = CalendarKeyboard()
 
 async def start_add_cycle(update: Update, context: CallbackContext) -> int:
     """Start the add cycle conversation with symptoms selection."""
@@ -103,8 +106,9 @@ async def handle_medication(update: Update, context: CallbackContext) -> int:
         # Move to date selection
         await update.message.reply_text(
             get_message(lang, 'cycle', 'select_date'),
-            reply_markup=calendar.create_calendar()
+            reply_markup=calendar.create_calendar(lang=lang)
         )
+        calendar.prefetch_adjacent(lang=lang)
         return START_DATE
     
     # Handle custom medication
@@ -131,12 +135,14 @@ async def handle_medication(update: Update, context: CallbackContext) -> int:
 async def handle_calendar_selection(update: Update, context: CallbackContext) -> int:
     """Handle the calendar date selection and submit the cycle data."""
     query = update.callback_query
-    result = calendar.process_calendar_selection(query)
+    lang = context.user_data.get('language', 'en')
+    result = calendar.process_calendar_selection(query, lang)
     
     if isinstance(result, tuple):
         # Navigation was selected, update the calendar
-        _, new_markup = result
+        (year, month), new_markup = result
         await query.message.edit_reply_markup(reply_markup=new_markup)
+        calendar.prefetch_adjacent(year, month, lang)
         return START_DATE
     
     if result is None:
@@ -146,71 +152,63 @@ async def handle_calendar_selection(update: Update, context: CallbackContext) ->
     context.user_data['start_date'] = result
     return await submit_cycle(update, context)
 
+@timed('submit_cycle')
 async def submit_cycle(update: Update, context: CallbackContext) -> int:
-    """Submit the cycle data to the API."""
+    """Record the cycle in the outbox and acknowledge it; delivery to the API runs in the background."""
     chat_id = str(update.callback_query.message.chat_id)
-    user_tokens = context.bot_data.get('user_tokens', {})
-    access_token = user_tokens.get(chat_id, {}).get('access')
+    access_token = await get_access_token(chat_id)
     lang = context.user_data.get('language', 'en')
     
     if not access_token:
         await update.callback_query.message.reply_text("Please login first.")
         return ConversationHandler.END
     
+    data = {
+        'start_date': context.user_data['start_date'],
+        'symptoms': ','.join(context.user_data.get('symptoms', [])),
+        'medication': ','.join(context.user_data.get('medication', []))
+    }
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            data = {
-                'start_date': context.user_data['start_date'],
-                'symptoms': ','.join(context.user_data.get('symptoms', [])),
-                'medication': ','.join(context.user_data.get('medication', []))
-            }
-            
-            async with session.post(
-                'https://api-period.shirpala.ir/api/periods/',
-                headers=headers,
-                data=data
-            ) as response:
-                if response.status == 201:
-                    # Show success message
-                    await update.callback_query.message.reply_text(
-                        get_message(lang, 'cycle', 'save_success'),
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                    
-                    # Show main menu
-                    reply_keyboard = [
-                        [{"text": get_message(lang, 'menu', 'track_period')}, 
-                         {"text": get_message(lang, 'menu', 'view_history')}],
-                        [{"text": get_message(lang, 'menu', 'cycle_analysis')}, 
-                         {"text": get_message(lang, 'menu', 'add_new_cycle')}],
-                        [{"text": get_message(lang, 'menu', 'partner_menu')}],
-                        [{"text": get_message(lang, 'settings', 'menu')}]
-                    ]
-
-                    await update.callback_query.message.reply_text(
-                        get_message(lang, 'menu', 'main'),
-                        reply_markup=ReplyKeyboardMarkup(
-                            reply_keyboard,
-                            one_time_keyboard=True,
-                            resize_keyboard=True
-                        ),
-                        parse_mode="Markdown"
-                    )
-                    # Return to MENU state instead of ending conversation
-                    return MENU
-                else:
-                    await update.callback_query.message.reply_text(
-                        get_message(lang, 'cycle', 'save_failed')
-                    )
-    
+        # Stored before acknowledging, so the entry survives a slow or failing backend and restarts
+        entry = cycle_outbox.enqueue(
+            chat_id, data, token_subject(access_token), lang, user_timezone(context.user_data)
+        )
     except Exception as e:
-        logger.error(f"Error submitting cycle: {e}")
+        logger.error(f"Error queueing cycle: {e}")
         await update.callback_query.message.reply_text(
-            get_message(lang, 'cycle', 'save_failed')
+            get_message(lang, 'cycle', 'save_failed', data['start_date'])
         )
-    
-    return ConversationHandler.END
+        return ConversationHandler.END
+
+    # First delivery attempt in the background, retries are left to the outbox job
+    context.application.create_task(cycle_outbox.deliver(context.bot, entry))
+
+    await update.callback_query.message.reply_text(
+        get_message(lang, 'cycle', 'save_queued'),
+        reply_markup=ReplyKeyboardRemove()
+    )
+
+    # Show main menu
+    reply_keyboard = [
+        [{"text": get_message(lang, 'menu', 'track_period')}, 
+         {"text": get_message(lang, 'menu', 'view_history')}],
+        [{"text": get_message(lang, 'menu', 'cycle_analysis')}, 
+         {"text": get_message(lang, 'menu', 'add_new_cycle')}],
+        [{"text": get_message(lang, 'menu', 'partner_menu')}],
+        [{"text": get_message(lang, 'settings', 'menu')}]
+    ]
+
+    await update.callback_query.message.reply_text(
+        get_message(lang, 'menu', 'main'),
+        reply_markup=ReplyKeyboardMarkup(
+            reply_keyboard,
+            one_time_keyboard=True,
+            resize_keyboard=True
+        ),
+        parse_mode="Markdown"
+    )
+    # Return to MENU state instead of ending conversation
+    return MENU
 
 # Update the conversation handler to include MENU state
 add_cycle_conversation = ConversationHandler(
@@ -221,9 +219,10 @@ add_cycle_conversation = ConversationHandler(
     states={
         SYMPTOMS: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_symptoms)],
         MEDICATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_medication)],
-        START_DATE: [CallbackQueryHandler(handle_calendar_selection)],
+        START_DATE: [CallbackQueryHandler(handle_calendar_selection, pattern=r'^(date_|prev_|next_|ignore$)')],
         MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu)],  # Add menu state
     },
     fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)],
-    name="add_cycle_conversation"
+    name="add_cycle_conversation",
+    persistent=True
 )
@@ -1,72 +1,44 @@
 import logging
-import httpx
-import aiohttp
 from telegram import Update
 from telegram.ext import CallbackContext, ConversationHandler
 from states import REGISTER, MENU
-from utils import load_tokens, save_tokens
-from config import BASE_URL
+from token_store import get_token_store
+from http_client import get_client
 from menu_handlers import show_main_menu
+from persistence import REGISTRATION_RESTARTED
+from languages import get_message
 
 logger = logging.getLogger(__name__)
 
 async def authenticate_user(username, password):
-    """Authenticate user and get access token."""
+    """Authenticate user and get the access and refresh tokens."""
     logger.info(f"Attempting to authenticate user: {username}")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BASE_URL}/api/auth/jwt/create/", 
-                data={
-                    "username": username, 
-                    "password": password
-                }
-            )
-            
-            logger.info(f"Auth response status: {response.status_code}")
-            if response.status_code == 200:
-                json_response = response.json()
-                logger.info("Authentication successful")
-                return json_response.get("access")
-            else:
-                logger.error(f"Authentication failed: {response.text}")
-                return None
+        client = get_client()
+        response = await client.post(
+            "/api/auth/jwt/create/", 
+            data={
+                "username": username, 
+                "password": password
+            }
+        )
+        
+        logger.info(f"Auth response status: {response.status_code}")
+        if response.status_code == 200:
+            json_response = response.json()
+            logger.info("Authentication successful")
+            return {
+                "access": json_response.get("access"),
+                "refresh": json_response.get("refresh")
+            }
+        else:
+            logger.error(f"Authentication failed: {response.text}")
+            return None
 
     except Exception as e:
         logger.error(f"Authentication error: {str(e)}")
         return None
 
-async def refresh_token(chat_id, user_tokens):
-    """Refresh the access token using the refresh token."""
-    if chat_id not in user_tokens or "refresh" not in user_tokens[chat_id]:
-        logger.warning(f"No refresh token found for chat_id: {chat_id}")
-        return None
-
-    refresh_token = user_tokens[chat_id]["refresh"]
-    logger.info(f"Attempting to refresh token for chat_id: {chat_id}")
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BASE_URL}/api/auth/jwt/refresh/", 
-                data={"refresh": refresh_token}
-            )
-
-            logger.info(f"Refresh response status: {response.status_code}")
-            if response.status_code == 200:
-                new_access = response.json().get("access")
-                user_tokens[chat_id]["access"] = new_access
-                save_tokens(user_tokens)
-                logger.info("Token refresh successful")
-                return new_access
-            else:
-                logger.error(f"Token refresh failed: {response.text}")
-                return None
-
-    except Exception as e:
-        logger.error(f"Token refresh error: {str(e)}")
-        return None
-
 async def handle_registration(update: Update, context: CallbackContext) -> int:
     """Handle the registration process step by step."""
     current_step = context.user_data.get('registration_step', 'username')
@@ -76,7 +48,14 @@ async def handle_registration(update: Update, context: CallbackContext) -> int:
     print(f"DEBUG: User input: {user_input}")
     logger.info(f"Processing registration step: {current_step}")
     
-    if current_step == 'username':
+    if current_step == REGISTRATION_RESTARTED:
+        # The bot restarted mid-registration and the password was not stored
+        lang = context.user_data.get('language', 'en')
+        await update.message.reply_text(get_message(lang, 'auth', 'registration_restarted'))
+        context.user_data['registration_step'] = 'username'
+        return REGISTER
+
+    elif current_step == 'username':
         context.user_data['username'] = user_input
         print(f"DEBUG: Stored username: {user_input}")
         logger.info(f"Username stored: {user_input}")
@@ -121,55 +100,52 @@ async def handle_registration(update: Update, context: CallbackContext) -> int:
             print("DEBUG: Starting API registration process")
             logger.info("Initiating API registration")
             
-            print("DEBUG: Creating aiohttp session")
-            async with aiohttp.ClientSession() as session:
-                data = {
-                    'username': context.user_data['username'],
-                    'password': context.user_data['password'],
-                    're_password': context.user_data['password'],
-                    'email': context.user_data['email'],
-                    'sex': user_input.lower()
-                }
-                print(f"DEBUG: Registration data prepared: {data}")
-                logger.info(f"Registration data prepared (username: {data['username']}, email: {data['email']}, sex: {data['sex']})")
-                
-                api_url = f'{BASE_URL}/api/auth/users/'
-                print(f"DEBUG: Making API request to: {api_url}")
-                
-                async with session.post(api_url, data=data) as response:
-                    response_text = await response.text()
-                    print(f"DEBUG: API Response status: {response.status}")
-                    print(f"DEBUG: API Response body: {response_text}")
-                    logger.info(f"API response received: {response.status}")
-                    
-                    if response.status == 201:
-                        print("DEBUG: Registration successful")
-                        logger.info("Registration successful")
-                        await update.message.reply_text("Registration successful!")
-                        # Auto-login process
-                        print("DEBUG: Starting auto-login")
-                        token = await authenticate_user(context.user_data['username'], context.user_data['password'])
-                        if token:
-                            chat_id = str(update.message.chat_id)
-                            user_tokens = load_tokens()
-                            user_tokens[chat_id] = {"access": token}
-                            save_tokens(user_tokens)
-                            context.user_data.clear()
-                            print(f"DEBUG: Auto-login successful for user: {data['username']}")
-                            logger.info(f"Auto-login successful for user: {data['username']}")
-                            return await show_main_menu(update, context)
-                        else:
-                            print("DEBUG: Auto-login failed")
-                            logger.error("Auto-login failed after successful registration")
-                            await update.message.reply_text("Registration successful but login failed. Please use /start to login.")
-                            return ConversationHandler.END
-                    else:
-                        error_msg = f"Registration failed. Server response: {response_text}"
-                        print(f"DEBUG: {error_msg}")
-                        logger.error(error_msg)
-                        await update.message.reply_text(error_msg)
-                        return REGISTER
-                    
+            client = get_client()
+            data = {
+                'username': context.user_data['username'],
+                'password': context.user_data['password'],
+                're_password': context.user_data['password'],
+                'email': context.user_data['email'],
+                'sex': user_input.lower()
+            }
+            print(f"DEBUG: Registration data prepared: {data}")
+            logger.info(f"Registration data prepared (username: {data['username']}, email: {data['email']}, sex: {data['sex']})")
+            
+            api_url = '/api/auth/users/'
+            print(f"DEBUG: Making API request to: {api_url}")
+            
+            response = await client.post(api_url, data=data)
+            response_text = response.text
+            print(f"DEBUG: API Response status: {response.status_code}")
+            print(f"DEBUG: API Response body: {response_text}")
+            logger.info(f"API response received: {response.status_code}")
+            
+            if response.status_code == 201:
+                print("DEBUG: Registration successful")
+                logger.info("Registration successful")
+                await update.message.reply_text("Registration successful!")
+                # Auto-login process
+                print("DEBUG: Starting auto-login")
+                tokens = await authenticate_user(context.user_data['username'], context.user_data['password'])
+                if tokens:
+                    chat_id = str(update.message.chat_id)
+                    get_token_store().set(chat_id, tokens)
+                    context.user_data.clear()
+                    print(f"DEBUG: Auto-login successful for user: {data['username']}")
+                    logger.info(f"Auto-login successful for user: {data['username']}")
+                    return await show_main_menu(update, context)
+                else:
+                    print("DEBUG: Auto-login failed")
+                    logger.error("Auto-login failed after successful registration")
+                    await update.message.reply_text("Registration successful but login failed. Please use /start to login.")
+                    return ConversationHandler.END
+            else:
+                error_msg = f"Registration failed. Server response: {response_text}"
+                print(f"DEBUG: {error_msg}")
+                logger.error(error_msg)
+                await update.message.reply_text(error_msg)
+                return REGISTER
+            
         except Exception as e:
             error_msg = f"Registration error: {str(e)}"
             print(f"DEBUG: Exception occurred: {error_msg}")
@@ -0,0 +1,107 @@
+"""End-to-end load test of the bot against a local stand-in backend.
+
+Simulates many chats that log in, view their history and add a cycle, feeding
+synthetic updates through the real Application (handlers, conversation state,
+persistence, update processor and pooled HTTP client). Reports throughput and
+latency percentiles per flow and per update.
+
+    python -m benchmarks.e2e --chats 2000 --concurrency 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+from datetime import date, timedelta
+
+from benchmarks.fake_backend import FakeBackend
+from benchmarks.harness import running_bot, feed, quiet_logging, gather_bounded
+from benchmarks.report import LatencyReport
+from benchmarks.telegram_stub import SyntheticChat
+from languages import get_message, SYMPTOM_OPTIONS
+
+
+def flow_steps(lang):
+    """Return {flow: [step, ...]} where a step is ('message', text) or ('callback', data)."""
+    start_date = (date.today() - timedelta(days=random.randint(0, 20))).isoformat()
+    symptom = SYMPTOM_OPTIONS[lang][0][0]
+    done = get_message(lang, 'buttons', 'done')
+    return {
+        'login': [
+            ('message', '/start'),
+            ('message', get_message(lang, 'auth', 'login')),
+            ('message', 'username'),
+            ('message', 'password'),
+        ],
+        'view_history': [
+            ('message', get_message(lang, 'menu', 'view_history')),
+        ],
+        'add_cycle': [
+            ('message', get_message(lang, 'menu', 'add_new_cycle')),
+            ('message', symptom),
+            ('message', done),
+            ('message', done),
+            ('callback', f'date_{start_date}'),
+        ],
+    }
+
+
+async def simulate_chat(application, chat, flows, report):
+    """Run every flow for one chat in order, recording flow and update latencies."""
+    for flow, steps in flows.items():
+        total = 0.0
+        for kind, payload in steps:
+            if kind == 'message' and payload == 'username':
+                payload = f'user{chat.chat_id}'
+            update = chat.message(payload) if kind == 'message' else chat.callback(payload)
+            try:
+                latency = await feed(application, update)
+            except Exception:
+                report.record_error(flow)
+                return
+            report.record(f'{flow} (update)', latency)
+            total += latency
+        report.record(flow, total)
+
+
+async def run(args):
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter, history_size=args.history_size)
+    await backend.start()
+    try:
+        async with running_bot(backend) as (application, request):
+            chats = [SyntheticChat(application.bot, 10_000_000 + i) for i in range(args.chats)]
+            report = LatencyReport(f"e2e {args.chats} chats, concurrency {args.concurrency}")
+            # The handlers print debug output on every step
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                await gather_bounded(
+                    (simulate_chat(application, chat, flow_steps('en'), report) for chat in chats),
+                    args.concurrency
+                )
+            report.finish()
+    finally:
+        await backend.stop()
+
+    print(report.format_table())
+    print(f"backend requests: {dict(sorted(backend.requests.items()))}")
+    print(f"bot api calls: {dict(sorted(request.calls.items()))}")
+    if args.output:
+        report.save(args.output, chats=args.chats, concurrency=args.concurrency,
+                    latency=args.latency, jitter=args.jitter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--chats', type=int, default=1000, help="number of simulated chats")
+    parser.add_argument('--concurrency', type=int, default=100, help="chats active at the same time")
+    parser.add_argument('--latency', type=float, default=0.05, help="backend latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random backend latency in seconds")
+    parser.add_argument('--history-size', type=int, default=12, help="periods per user on the backend")
+    parser.add_argument('--output', help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
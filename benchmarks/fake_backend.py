@@ -0,0 +1,254 @@
+"""Stand-in for the period tracking backend, for load tests.
+
+Implements the endpoints the bot calls over plain HTTP/1.1 with keep-alive,
+so the bot's pooled client is exercised the same way as in production.
+Every response is delayed by a configurable latency (plus random jitter).
+"""
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+from datetime import date, timedelta
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LIFETIME = 3600
+REFRESH_LIFETIME = 86400
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+
+def make_jwt(username, token_type, lifetime, now=None):
+    """Build an unsigned JWT with the claims the bot inspects locally."""
+    now = time.time() if now is None else now
+    claims = {'token_type': token_type, 'exp': int(now + lifetime), 'user': username,
+              'jti': f"{random.getrandbits(64):x}"}
+    return f"{_b64({'alg': 'none', 'typ': 'JWT'})}.{_b64(claims)}.sig"
+
+
+def make_history(count, start=None):
+    """Return count synthetic periods, newest first, about four weeks apart."""
+    start = start or date.today() - timedelta(days=28 * count)
+    periods = []
+    for i in range(count):
+        first = start + timedelta(days=28 * i + random.randint(-2, 2))
+        periods.append({
+            'id': i + 1,
+            'start_date': first.isoformat(),
+            'end_date': (first + timedelta(days=5)).isoformat(),
+            'symptoms': 'Cramps,Headache',
+            'medication': 'Painkillers'
+        })
+    periods.reverse()
+    return periods
+
+
+def canned_analysis(history):
+    """Return a cycle analysis of a history, or None with fewer than two periods.
+
+    Deliberately simple and independent of the bot's local_analysis, so load
+    tests never check the bot against its own formulas. The numbers are only
+    plausible, not the real backend's.
+    """
+    starts = sorted({date.fromisoformat(period['start_date']) for period in history if period.get('start_date')})
+    if len(starts) < 2:
+        return None
+    gaps = [(later - earlier).days for earlier, later in zip(starts, starts[1:])]
+    average = sum(gaps) / len(gaps)
+    spread = max(gaps) - min(gaps)
+    return {
+        'next_predicted_date': (starts[-1] + timedelta(days=round(average))).isoformat(),
+        'average_cycle': round(average, 1),
+        'regularity_score': max(0, 100 - 10 * spread),
+        'prediction_reliability': min(100, 15 * len(gaps)),
+        'cycle_variations': [abs(gap - round(average)) for gap in gaps]
+    }
+
+
+class FakeBackend:
+    """Minimal HTTP server implementing the backend API used by the bot."""
+
+    def __init__(self, latency=0.05, jitter=0.0, history_size=12, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.history_size = history_size
+        self.host = host
+        self.port = port
+        self._server = None
+        # username -> period list
+        self.periods = {}
+        self.invitations = {}
+        self.requests = {}
+        self.routes = {
+            ('POST', '/api/auth/jwt/create/'): self.jwt_create,
+            ('POST', '/api/auth/jwt/refresh/'): self.jwt_refresh,
+            ('POST', '/api/auth/users/'): self.register,
+            ('GET', '/api/user/profile/'): self.profile,
+            ('POST', '/api/user/invitation/'): self.invitation,
+            ('GET', '/api/periods/'): self.list_periods,
+            ('POST', '/api/periods/'): self.create_period,
+            ('GET', '/api/periods/cycle_analysis/'): self.cycle_analysis,
+        }
+        # Requests sent with the 'role: partner' header answer with the partner's data
+        self.partner_routes = {
+            ('GET', '/api/periods/cycle_analysis/'): self.partner_analysis,
+        }
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Fake backend listening on {self.url} (latency {self.latency * 1000:.0f} ms)")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # Request handling
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                path = target.split('?', 1)[0]
+                status, payload = await self._dispatch(method, path, headers, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, body):
+        key = f"{method} {path}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, {'detail': 'Not found.'}
+        form = dict(parse_qsl(body.decode())) if body else {}
+        subject = self._subject(headers)
+        if headers.get('role') == 'partner' and subject is not None:
+            route = self.partner_routes.get((method, path), route)
+            subject = f"{subject}:partner"
+        return route(subject, form)
+
+    @staticmethod
+    def _subject(headers):
+        auth = headers.get('authorization', '')
+        if not auth.startswith('Bearer '):
+            return None
+        try:
+            payload = auth[7:].split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            return None
+        if claims.get('exp', 0) < time.time():
+            return None
+        return claims.get('user')
+
+    def _history(self, username):
+        if username not in self.periods:
+            self.periods[username] = make_history(self.history_size)
+        return self.periods[username]
+
+    # Endpoints
+
+    def jwt_create(self, subject, form):
+        username = form.get('username')
+        if not username or not form.get('password'):
+            return 401, {'detail': 'No active account found with the given credentials'}
+        return 200, {
+            'access': make_jwt(username, 'access', ACCESS_LIFETIME),
+            'refresh': make_jwt(username, 'refresh', REFRESH_LIFETIME)
+        }
+
+    def jwt_refresh(self, subject, form):
+        try:
+            payload = form['refresh'].split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except (KeyError, IndexError, ValueError):
+            return 401, {'detail': 'Token is invalid or expired'}
+        return 200, {'access': make_jwt(claims['user'], 'access', ACCESS_LIFETIME)}
+
+    def register(self, subject, form):
+        return 201, {'username': form.get('username'), 'email': form.get('email')}
+
+    def profile(self, subject, form):
+        if subject is None:
+            return 401, {'detail': 'Authentication credentials were not provided.'}
+        return 200, {'username': subject}
+
+    def invitation(self, subject, form):
+        if subject is None:
+            return 401, {'detail': 'Authentication credentials were not provided.'}
+        if 'code_to_accept' in form:
+            return 200, {'detail': 'accepted'}
+        code = self.invitations.setdefault(subject, f"{random.getrandbits(32):08x}")
+        return 201, {'invitation_code': code}
+
+    def list_periods(self, subject, form):
+        if subject is None:
+            return 401, {'detail': 'Authentication credentials were not provided.'}
+        return 200, self._history(subject)
+
+    def create_period(self, subject, form):
+        if subject is None:
+            return 401, {'detail': 'Authentication credentials were not provided.'}
+        history = self._history(subject)
+        period = {
+            'id': len(history) + 1,
+            'start_date': form.get('start_date'),
+            'end_date': None,
+            'symptoms': form.get('symptoms', ''),
+            'medication': form.get('medication', '')
+        }
+        history.insert(0, period)
+        return 201, period
+
+    def cycle_analysis(self, subject, form):
+        if subject is None:
+            return 401, {'detail': 'Authentication credentials were not provided.'}
+        analysis = canned_analysis(self._history(subject))
+        if analysis is None:
+            return 400, {'detail': 'Not enough data'}
+        return 200, {'data': analysis}
+
+    def partner_analysis(self, subject, form):
+        history = self._history(subject)
+        analysis = canned_analysis(history)
+        return 200, {'data': {
+            'partner_name': 'Partner',
+            'next_predicted_date': analysis['next_predicted_date'] if analysis else None,
+            'cycle_length_avg': analysis['average_cycle'] if analysis else None,
+            'is_regular': analysis['regularity_score'] >= 80 if analysis else None,
+            'last_period_start': history[0]['start_date'] if history else None
+        }}
@@ -0,0 +1,97 @@
+"""Runs the real bot application offline against the fake backend."""
+import asyncio
+import contextlib
+import logging
+import os
+import tempfile
+import time
+
+import bot
+import config
+import http_client
+import token_store
+from benchmarks.telegram_stub import FakeBotRequest
+
+logger = logging.getLogger(__name__)
+
+
+def configure(backend_url, workdir):
+    """Point the bot at the fake backend and keep all of its state in workdir.
+
+    Returns what restore() needs to undo it: the replaced config values and
+    the token store.
+    """
+    settings = {
+        'TELEGRAM_BOT_TOKEN': '123456:benchmark',
+        'BASE_URL': backend_url,
+        'TOKEN_FILE': os.path.join(workdir, 'user_tokens.json'),
+        'TOKEN_DB_PATH': os.path.join(workdir, 'user_tokens.db'),
+        'PERSISTENCE_PATH': os.path.join(workdir, 'bot_data.db'),
+        'METRICS_PORT': 0,
+        'METRICS_DUMP_PATH': '',
+        'UPDATE_RECORDING_PATH': '',
+        # The Bot API is local, pacing it would only measure the configured limits
+        'TELEGRAM_RATE_LIMIT': False,
+    }
+    saved = {name: getattr(config, name) for name in settings}
+    for name, value in settings.items():
+        setattr(config, name, value)
+    # Reopen the token store in workdir
+    saved_store, token_store._store = token_store._store, None
+    return saved, saved_store
+
+
+def restore(saved, saved_store):
+    """Close the token store opened in the workdir and put back what configure replaced."""
+    if token_store._store is not None:
+        token_store._store.close()
+    token_store._store = saved_store
+    for name, value in saved.items():
+        setattr(config, name, value)
+
+
+@contextlib.asynccontextmanager
+async def running_bot(backend):
+    """Yield (application, bot request stub) for the bot wired to the given backend."""
+    with tempfile.TemporaryDirectory() as workdir:
+        saved = configure(backend.url, workdir)
+        try:
+            request = FakeBotRequest()
+            application = bot.build_application(request=request)
+            try:
+                async with application:
+                    await http_client.init_client(application)
+                    await application.start()
+                    try:
+                        yield application, request
+                    finally:
+                        await application.stop()
+            finally:
+                # Only run_polling and run_webhook call it, it closes the client and the SQLite stores
+                await bot.post_shutdown(application)
+        finally:
+            restore(*saved)
+
+
+async def feed(application, update):
+    """Process one update the way the polling loop does and return its latency."""
+    start = time.perf_counter()
+    await application.update_processor.process_update(update, application.process_update(update))
+    return time.perf_counter() - start
+
+
+def quiet_logging():
+    """The bot logs every step at INFO, which would dominate a load test."""
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+async def gather_bounded(coroutines, limit):
+    """Run coroutines with at most limit of them at a time."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
@@ -0,0 +1,219 @@
+"""Micro-benchmarks of the pure functions run for every message.
+
+Each case is timed with timeit (median of --repeat runs) and compared with a
+baseline, so a regression shows up as a percentage diff. Inputs are sized like
+real use: Persian locale and 200-cycle histories.
+
+Timings only compare on the same machine under the same load, so the
+preferred baseline is another git revision measured in the same run: --against
+checks it out in a temporary worktree and this script measures the bot's
+modules of both trees, taking turns over a few rounds. Cases whose functions
+the older tree does not have yet are left out of the comparison. A baseline
+saved with --save is local to the machine and not committed.
+
+    python -m benchmarks.micro --against master   # compare with master, measured now
+    python -m benchmarks.micro --against 53f8b1e  # compare with the tree before the optimizations
+    python -m benchmarks.micro --save          # record a local baseline
+    python -m benchmarks.micro                 # compare with the local baseline
+    python -m benchmarks.micro -k calendar     # only cases matching a name
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from types import SimpleNamespace
+
+from benchmarks.fake_backend import make_history
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'micro_baseline.json')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_SIZE = 200
+LANG = 'fa'
+
+
+def build_cases():
+    """Return {name: zero-argument callable}.
+
+    The bot's modules are imported here rather than at the top, so that with
+    --tree they come from that tree. Cases are not checked against the
+    tree's functions, see available_cases.
+    """
+    import config
+    import period
+    from calendar_keyboard import CalendarKeyboard
+    from languages import get_message
+
+    random.seed(42)
+    history = make_history(HISTORY_SIZE)
+    for i, cycle in enumerate(history):
+        cycle['symptoms'] = ['Cramps,Headache', 'Fatigue,Bloating,Acne', 'Mood Swings', ''][i % 4]
+        cycle['medication'] = ['Ibuprofen', 'Birth Control Pills,Pain Relievers', ''][i % 3]
+    pages = range(0, len(history), getattr(config, 'HISTORY_PAGE_SIZE', 5))
+
+    warm_calendar = CalendarKeyboard()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(TypeError, AttributeError):
+        warm_calendar.create_calendar(2024, 3, LANG)
+        warm_calendar.prefetch_adjacent(2024, 3, LANG)
+    date_query = SimpleNamespace(data='date_2024-03-15')
+    next_query = SimpleNamespace(data='next_2024_4')
+
+    return {
+        'get_message': lambda: get_message(LANG, 'menu', 'view_history'),
+        'get_message_format': lambda: get_message(LANG, 'period_history', 'cycle', 12),
+        'translate_items': lambda: period.translate_items('Cramps, Headache, Fatigue', LANG),
+        'translate_history_200': lambda: period.translate_history(history, LANG),
+        'calculate_duration': lambda: period.calculate_duration('2024-03-01', '2024-03-06', LANG),
+        'create_calendar_cached': lambda: warm_calendar.create_calendar(2024, 3, LANG),
+        'create_calendar_cold': lambda: CalendarKeyboard()._build_calendar(2024, 3, LANG),
+        'process_calendar_date': lambda: warm_calendar.process_calendar_selection(date_query, LANG),
+        'process_calendar_next': lambda: warm_calendar.process_calendar_selection(next_query, LANG),
+        'format_history_200': lambda: ''.join(period.iter_period_blocks(history, LANG)),
+        'render_history_page': lambda: period.render_history_page(history, LANG),
+        'render_all_pages_200': lambda: [period.render_history_page(history, LANG, start) for start in pages],
+    }
+
+
+def available_cases(pattern=None):
+    """Return the cases matching pattern that run in the imported tree.
+
+    Each case is called once: one raising AttributeError or TypeError uses a
+    function or signature this tree does not have, e.g. an older revision
+    measured with --against, and is left out.
+    """
+    cases = {}
+    for name, func in build_cases().items():
+        if pattern and pattern not in name:
+            continue
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+        except (AttributeError, TypeError):
+            print(f"Skipping {name}: not available in this tree", file=sys.stderr)
+            continue
+        cases[name] = func
+    return cases
+
+
+def measure(func, repeat):
+    """Return the median time per call in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_checkout(tree, repeat, pattern, results_path):
+    """Measure the bot's modules of a tree with this script in a fresh interpreter and return the results."""
+    command = [
+        sys.executable, '-m', 'benchmarks.micro', '--tree', tree,
+        '--save', '--baseline', results_path, '--repeat', str(repeat)
+    ]
+    if pattern:
+        command += ['-k', pattern]
+    subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(results_path) as f:
+        return json.load(f)
+
+
+def compare_with_revision(revision, rounds, repeat, pattern=None):
+    """Measure this checkout and a git revision in alternating rounds.
+
+    The revision is checked out in a temporary worktree. Both sides run this
+    script in fresh interpreters, taking turns to go first, so drift in
+    machine load affects them alike, and revisions without the script can be
+    measured too. Returns (results, baseline), each case's median over
+    the rounds.
+    """
+    samples = ({}, {})
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, 'tree')
+        subprocess.run(['git', 'worktree', 'add', '--quiet', '--detach', tree, revision], cwd=REPO_ROOT, check=True)
+        try:
+            for i in range(rounds):
+                print(f"Round {i + 1} of {rounds}...")
+                sides = [(0, REPO_ROOT), (1, tree)]
+                for side, checkout in sides if i % 2 == 0 else reversed(sides):
+                    results_path = os.path.join(tmp, f"results{side}.json")
+                    if os.path.exists(results_path):
+                        os.remove(results_path)
+                    for name, seconds in run_checkout(checkout, repeat, pattern, results_path).items():
+                        samples[side].setdefault(name, []).append(seconds)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', tree], cwd=REPO_ROOT, check=True)
+    return tuple({name: statistics.median(times) for name, times in side.items()} for side in samples)
+
+
+def format_time(seconds):
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:.0f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='pattern', help="only run cases whose name contains this")
+    parser.add_argument('--repeat', type=int, default=9,
+                        help="timing runs per case, the median is kept (split over the rounds with --against)")
+    parser.add_argument('--against', metavar='REVISION',
+                        help="measure this git revision now and compare with it instead of the saved baseline")
+    parser.add_argument('--rounds', type=int, default=3, help="alternating rounds per side with --against")
+    parser.add_argument('--tree', default=REPO_ROOT,
+                        help="checkout whose bot modules are measured (set by --against for the revision)")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file to compare with")
+    parser.add_argument('--threshold', type=float, default=50.0,
+                        help="slowdown in percent reported as a regression")
+    args = parser.parse_args()
+    if args.against and args.save:
+        parser.error("--save records this checkout's results, it cannot be combined with --against")
+
+    # The bot's modules of the tree are imported first, before those next to this script
+    sys.path.insert(0, os.path.abspath(args.tree))
+
+    if args.against:
+        repeat = -(-args.repeat // args.rounds)
+        results, baseline = compare_with_revision(args.against, args.rounds, repeat, args.pattern)
+    else:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        results = {}
+        for name, func in available_cases(args.pattern).items():
+            # calendar_keyboard prints its progress
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = measure(func, args.repeat)
+
+    regressions = []
+    print(f"{'case':<26}{'time':>12}{'baseline':>12}{'diff':>9}")
+    for name, seconds in results.items():
+        old = baseline.get(name)
+        if old:
+            diff = (seconds - old) / old * 100
+            flag = '  <-- regression' if diff > args.threshold else ''
+            if flag:
+                regressions.append(name)
+            print(f"{name:<26}{format_time(seconds):>12}{format_time(old):>12}{diff:>+8.1f}%{flag}")
+        else:
+            print(f"{name:<26}{format_time(seconds):>12}{'-':>12}")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Record a real backend's cycle analysis as a fixture for the parity test.
+
+Logs in as the given user on BASE_URL, fetches the period list and the
+backend's cycle analysis, and writes both to one JSON file that
+tests/test_analysis_parity.py compares local_analysis against. Use accounts
+with varied histories; the fixture contains their dates, so only commit
+recordings of test accounts.
+
+    python -m benchmarks.record_analysis USERNAME --password-env BACKEND_PASSWORD
+"""
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import httpx
+
+import config
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'cycle_analysis'
+
+
+async def record(username, password, base_url):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        response = await client.post('/api/auth/jwt/create/', data={'username': username, 'password': password})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['access']}"}
+        periods = await client.get('/api/periods/', headers=headers)
+        periods.raise_for_status()
+        analysis = await client.get('/api/periods/cycle_analysis/', headers=headers)
+        return {
+            'base_url': base_url,
+            'periods': periods.json(),
+            'status': analysis.status_code,
+            'response': analysis.json() if analysis.status_code == 200 else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('username')
+    parser.add_argument('--password-env', default='BACKEND_PASSWORD',
+                        help='environment variable holding the password')
+    parser.add_argument('--base-url', default=config.BASE_URL)
+    parser.add_argument('--name', help='fixture name, defaults to the username')
+    args = parser.parse_args()
+
+    fixture = asyncio.run(record(args.username, os.environ[args.password_env], args.base_url))
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    path = FIXTURE_DIR / f"{args.name or args.username}.json"
+    path.write_text(json.dumps(fixture, indent=2) + '\n')
+    print(f"Recorded {len(fixture['periods'])} periods and HTTP {fixture['status']} to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Replay a recording of anonymized updates against the stand-in backend.
+
+Recordings are written by the bot when UPDATE_RECORDING_PATH is set. Updates
+are fed through the real Application at the recorded pace (--speed 1), N times
+faster (--speed N) or as fast as possible (--speed 0). Latencies are reported
+per kind of update; save them with --output and pass an earlier file to
+--compare to see the difference between two builds.
+
+Before replaying, every chat is put back into the session recorded with its
+first update: logged in with a token minted for the fake backend, with its
+language and conversation states. Chats of recordings made before sessions
+were recorded are assumed to be logged in at the main menu.
+
+    python -m benchmarks.replay updates.jsonl --speed 10 --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+from telegram import Update
+from telegram.ext import ConversationHandler
+
+from benchmarks.fake_backend import FakeBackend, make_jwt, ACCESS_LIFETIME, REFRESH_LIFETIME
+from benchmarks.harness import running_bot, feed, quiet_logging
+from benchmarks.report import LatencyReport
+from menu_handlers import main_menu_router
+from settings import settings_router
+from partner import partner_router
+from states import MENU
+from token_store import get_token_store
+
+ROUTERS = (main_menu_router, settings_router, partner_router)
+
+# Session of chats whose recording has none
+DEFAULT_SESSION = {'logged_in': True, 'language': None, 'conversations': {'main_conversation': MENU}}
+
+
+def load_recording(path):
+    """Return [(offset seconds, update dict, session or None)] in recorded order."""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records.append((record['t'], record['update'], record.get('session')))
+    return records
+
+
+def restore_sessions(application, records):
+    """Log in every chat of the recording and restore its language and conversation states.
+
+    Returns the number of chats restored.
+    """
+    conversations = [
+        handler for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, ConversationHandler)
+    ]
+    store = get_token_store()
+    seen = set()
+    for _, data, session in records:
+        update = Update.de_json(data, application.bot)
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None or chat.id in seen:
+            continue
+        seen.add(chat.id)
+        session = session or DEFAULT_SESSION
+
+        if session.get('logged_in'):
+            username = f"replay{chat.id}"
+            store.set(str(chat.id), {
+                'access': make_jwt(username, 'access', ACCESS_LIFETIME),
+                'refresh': make_jwt(username, 'refresh', REFRESH_LIFETIME)
+            })
+        if session.get('language') and user is not None:
+            application.user_data[user.id]['language'] = session['language']
+        for handler in conversations:
+            state = session.get('conversations', {}).get(handler.name)
+            if state is not None:
+                handler._conversations[handler._get_key(update)] = state
+    return len(seen)
+
+
+def classify(update):
+    """Name the flow an update belongs to, e.g. 'menu:view_history' or 'callback:date'."""
+    if update.callback_query is not None:
+        return f"callback:{(update.callback_query.data or '').split('_', 1)[0]}"
+    message = update.message
+    if message is None or message.text is None:
+        return 'other'
+    if message.text.startswith('/'):
+        return f"command:{message.text[1:]}"
+    for router in ROUTERS:
+        action = router.resolve(message.text)
+        if action is not None:
+            return f"{router.name}:{action.__name__.lstrip('_')}"
+    return 'text'
+
+
+async def replay(application, records, speed, report):
+    """Feed the records at the given speed; 0 means without waiting."""
+    tasks = []
+    started = time.perf_counter()
+    for offset, data, _ in records:
+        if speed:
+            delay = offset / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.de_json(data, application.bot)
+        tasks.append(asyncio.create_task(_timed_feed(application, update, report)))
+        # Let the update enter the processor so updates of one chat keep their order
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+async def _timed_feed(application, update, report):
+    flow = classify(update)
+    try:
+        report.record(flow, await feed(application, update))
+    except Exception:
+        report.record_error(flow)
+
+
+def print_comparison(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['flows']
+    print(f"\n{'flow':<32}{'p50 old':>10}{'p50 new':>10}{'p99 old':>10}{'p99 new':>10}{'p99 diff':>10}")
+    for flow, stats in report.summary().items():
+        old = baseline.get(flow)
+        if old is None or old['p99'] is None or stats['p99'] is None:
+            print(f"{flow:<32}{'(new)':>10}")
+            continue
+        diff = (stats['p99'] - old['p99']) / old['p99'] * 100 if old['p99'] else 0.0
+        print(f"{flow:<32}{old['p50']:>10.1f}{stats['p50']:>10.1f}"
+              f"{old['p99']:>10.1f}{stats['p99']:>10.1f}{diff:>+9.1f}%")
+
+
+async def run(args):
+    records = load_recording(args.recording)
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter, history_size=args.history_size)
+    await backend.start()
+    try:
+        async with running_bot(backend) as (application, request):
+            restore_sessions(application, records)
+            speed = 'max' if not args.speed else f"{args.speed:g}x"
+            report = LatencyReport(f"replay of {len(records)} updates at {speed}")
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                await replay(application, records, args.speed, report)
+            report.finish()
+    finally:
+        await backend.stop()
+
+    print(report.format_table())
+    print(f"backend requests: {dict(sorted(backend.requests.items()))}")
+    if args.output:
+        report.save(args.output, recording=os.path.basename(args.recording), speed=args.speed,
+                    latency=args.latency, jitter=args.jitter)
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', help="JSONL file written by the update recorder")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, 0 for max speed")
+    parser.add_argument('--latency', type=float, default=0.05, help="backend latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random backend latency in seconds")
+    parser.add_argument('--history-size', type=int, default=12, help="periods per user on the backend")
+    parser.add_argument('--output', help="write the summary as JSON to this file")
+    parser.add_argument('--compare', help="summary JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    quiet_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Latency bookkeeping and reporting shared by the load-test scripts."""
+import json
+import time
+
+
+def percentile(sorted_values, q):
+    """Return the q-th percentile (0-100) of already sorted values, by nearest rank."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+class LatencyReport:
+    """Collects latencies per flow and summarizes them with throughput and percentiles."""
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, flow, seconds):
+        self.samples.setdefault(flow, []).append(seconds)
+
+    def record_error(self, flow):
+        self.errors[flow] = self.errors.get(flow, 0) + 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        """Return {flow: {count, errors, throughput, mean, p50, ..., max}} with times in ms."""
+        elapsed = self.elapsed
+        result = {}
+        for flow in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(flow, []))
+            stats = {
+                'count': len(values),
+                'errors': self.errors.get(flow, 0),
+                'throughput': len(values) / elapsed if elapsed else 0.0,
+                'mean': sum(values) / len(values) * 1000 if values else None,
+                'max': values[-1] * 1000 if values else None
+            }
+            for q in self.PERCENTILES:
+                value = percentile(values, q)
+                stats[f'p{q}'] = value * 1000 if value is not None else None
+            result[flow] = stats
+        return result
+
+    def format_table(self):
+        columns = ['count', 'errors', 'throughput', 'mean'] + [f'p{q}' for q in self.PERCENTILES] + ['max']
+        lines = [
+            f"{self.name}: {self.elapsed:.2f}s",
+            f"{'flow':<24}" + ''.join(f"{column:>11}" for column in columns)
+        ]
+        for flow, stats in self.summary().items():
+            cells = []
+            for column in columns:
+                value = stats[column]
+                if value is None:
+                    cells.append(f"{'-':>11}")
+                elif column in ('count', 'errors'):
+                    cells.append(f"{value:>11}")
+                else:
+                    cells.append(f"{value:>11.1f}")
+            lines.append(f"{flow:<24}" + ''.join(cells))
+        lines.append("(throughput in /s, times in ms)")
+        return '\n'.join(lines)
+
+    def save(self, path, **meta):
+        """Write the summary as JSON so runs of different builds can be compared."""
+        with open(path, 'w') as f:
+            json.dump({'name': self.name, 'elapsed': self.elapsed, 'meta': meta,
+                       'flows': self.summary()}, f, indent=2)
@@ -0,0 +1,101 @@
+"""Offline stand-in for the Telegram Bot API and a factory for synthetic updates."""
+import itertools
+import json
+import time
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeBotRequest(BaseRequest):
+    """Answers every Bot API call locally, counting calls per method."""
+
+    def __init__(self):
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    def _message(self, params):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', '')
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        params = request_data.parameters if request_data is not None else {}
+
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            result = self._message(params)
+        elif api_method == 'getUpdates':
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+class SyntheticChat:
+    """Builds updates as a private chat with one user would send them."""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, bot, chat_id, language_code='en'):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.user = {'id': chat_id, 'is_bot': False, 'first_name': f'User{chat_id}',
+                     'language_code': language_code}
+        self.chat = {'id': chat_id, 'type': 'private'}
+        self._message_ids = itertools.count(1)
+
+    def _update(self, **payload):
+        return Update.de_json(dict(payload, update_id=next(self._update_ids)), self.bot)
+
+    def _message_dict(self, text):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self.chat,
+            'from': self.user,
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0,
+                                    'length': len(text.split()[0])}]
+        return message
+
+    def message(self, text):
+        return self._update(message=self._message_dict(text))
+
+    def callback(self, data):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self.chat,
+            'from': BOT_USER,
+            'text': 'calendar'
+        }
+        return self._update(callback_query={
+            'id': str(next(self._update_ids)),
+            'from': self.user,
+            'chat_instance': str(self.chat_id),
+            'message': message,
+            'data': data
+        })
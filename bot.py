@@ -1,12 +1,11 @@
 import logging
-import aiohttp
 from telegram import Update, ReplyKeyboardMarkup, CallbackQuery
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters, 
     ConversationHandler, CallbackContext, CallbackQueryHandler
 )
 from auth import authenticate_user, handle_registration
-from period import fetch_periods
+from period import fetch_periods, handle_history_page
 from cycle_analysis import fetch_cycle_analysis as cycle_analysis_handler
 from add_cycle import (
     add_cycle_conversation, 
@@ -15,7 +14,9 @@ from add_cycle import (
     handle_symptoms,
     handle_medication
 )
-from utils import load_tokens, save_tokens
+from token_store import get_token_store
+from token_refresh import token_refresher, schedule_token_refresh, validation_stats
+from cache import invalidate_chat
 from settings import show_settings_menu, handle_settings
 import config
 from states import (
@@ -29,7 +30,20 @@ from partner import (
     handle_partner_menu, 
     handle_partner_message
 )
-from calendar_keyboard import CalendarKeyboard
+from http_client import init_client, close_client, pool_stats
+from metrics import registry, instrument_application, init_metrics, close_metrics
+from cache import history_cache, analysis_cache, partner_cache
+from calendar_keyboard import calendar_service
+from update_processor import ChatOrderedUpdateProcessor
+from persistence import SqlitePersistence
+from recorder import start_recording, stop_recording
+from rate_limiter import PriorityRateLimiter
+from reminders import schedule_reminders, reminder_stats
+from timing_wheel import notification_scheduler, schedule_notifications, start_recompute
+from prefetch import menu_prefetcher
+from outbox import cycle_outbox, schedule_outbox
+from breaker import BackendBusy
+from coalescing import coalescing_stats
 from menu_handlers import (
     start, show_main_menu, handle_menu, 
     handle_initial_choice, cancel
@@ -42,16 +56,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load user tokens
-user_tokens = load_tokens()
-logger.info("User tokens loaded")
-
 # At the top of the file, add MENU to the exports
 __all__ = ['MENU', 'show_main_menu']
 
-# Add this near the top of the file, after the imports
-calendar = CalendarKeyboard()  # Create global calendar instance
-
 async def login(update: Update, context: CallbackContext) -> int:
     """Handle user login."""
     context.user_data['username'] = update.message.text
@@ -63,14 +70,17 @@ async def authenticate(update: Update, context: CallbackContext) -> int:
     username = context.user_data['username']
     password = update.message.text
 
-    token = await authenticate_user(username, password)
+    tokens = await authenticate_user(username, password)
     chat_id = str(update.message.chat_id)
 
-    if token:
-        user_tokens[chat_id] = {"access": token}
-        save_tokens(user_tokens)
-        # Update bot_data with new tokens
-        context.bot_data['user_tokens'] = user_tokens
+    if tokens:
+        # Refreshes and backoff of an earlier session must not touch the new one
+        token_refresher.forget(chat_id)
+        get_token_store().set(chat_id, tokens)
+        # Submissions waiting for this user are posted now if it is the same account
+        cycle_outbox.wake_chat(chat_id)
+        # Logout cancelled the notifications, the account may also have another history
+        start_recompute(context.application, chat_id, context.user_data)
         return await show_main_menu(update, context)
 
     await update.message.reply_text("❌ Login failed. Please try again.")
@@ -80,12 +90,17 @@ async def logout(update: Update, context: CallbackContext) -> int:
     """Logout user and remove token."""
     chat_id = str(update.message.chat_id)
 
-    if chat_id in user_tokens:
-        del user_tokens[chat_id]
-        save_tokens(user_tokens)
-        # Update bot_data after logout
-        context.bot_data['user_tokens'] = user_tokens
+    if get_token_store().delete(chat_id):
+        token_refresher.forget(chat_id)
+        menu_prefetcher.cancel(chat_id)
+        invalidate_chat(chat_id)
+        notification_scheduler.cancel_all(chat_id)
         await update.message.reply_text("You have been logged out. Use /start to log in again.")
+        # Kept until the same user logs in again; the outbox never posts them under another account
+        pending = cycle_outbox.pending_for_chat(chat_id)
+        if pending:
+            lang = context.user_data.get('language', 'en')
+            await update.message.reply_text(get_message(lang, 'cycle', 'pending_on_logout', pending))
     else:
         await update.message.reply_text("You are not logged in.")
 
@@ -96,7 +111,7 @@ async def view_history(update: Update, context: CallbackContext) -> int:
     chat_id = str(update.message.chat_id)
     lang = context.user_data.get('language', 'en')
     
-    if chat_id in user_tokens and "access" in user_tokens[chat_id]:
+    if get_token_store().get_access(chat_id):
         await fetch_periods(update, context)
         return MENU
     else:
@@ -107,21 +122,96 @@ async def cycle_analysis_handler(update: Update, context: CallbackContext) -> in
     """Handle 'Cycle Analysis' - Fetch and display cycle analysis."""
     chat_id = str(update.message.chat_id)
 
-    if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
+    access_token = get_token_store().get_access(chat_id)
+    if not access_token:
         await update.message.reply_text("⚠️ You need to log in first. Use /start.")
         return MENU
 
-    access_token = user_tokens[chat_id]["access"]
     await fetch_cycle_analysis(update, access_token)
 
     return MENU  # Return to menu after displaying analysis
 
-def main():
-    """Start the Telegram bot."""
+async def post_init(application: Application) -> None:
+    await init_client(application)
+    await init_metrics(application)
+
+async def post_shutdown(application: Application) -> None:
+    await close_metrics(application)
+    await close_client(application)
+    await stop_recording(application)
+    notification_scheduler.close()
+    cycle_outbox.close()
+
+def register_stats(update_processor, persistence, rate_limiter=None) -> None:
+    """Expose the counters kept by the pool, caches, refresher and persistence as gauges."""
+    registry.register_stats('http_pool', pool_stats)
+    registry.register_stats('coalescing', lambda: coalescing_stats)
+    registry.register_stats('history_cache', history_cache.stats)
+    registry.register_stats('analysis_cache', analysis_cache.stats)
+    registry.register_stats('partner_cache', partner_cache.stats)
+    registry.register_stats('prefetch', menu_prefetcher.prefetch_stats)
+    registry.register_stats('calendar_cache', calendar_service.cache_stats)
+    registry.register_stats('updates', update_processor.queue_stats)
+    registry.register_stats('token_refresh', lambda: token_refresher.stats)
+    registry.register_stats('token_validation', lambda: validation_stats)
+    registry.register_stats('persistence', lambda: persistence.stats)
+    registry.register_stats('reminders', lambda: reminder_stats)
+    registry.register_stats('notifications', notification_scheduler.timer_stats)
+    registry.register_stats('outbox', cycle_outbox.outbox_stats)
+    if rate_limiter is not None:
+        registry.register_stats('outbound', rate_limiter.queue_stats)
+
+def build_application(request=None) -> Application:
+    """Build the application with all handlers registered.
+
+    request replaces the HTTP layer used to talk to the Telegram Bot API,
+    which lets benchmarks drive the real application without network access.
+    """
     logger.info("Initializing bot...")
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    persistence = SqlitePersistence(
+        config.PERSISTENCE_PATH,
+        update_interval=config.PERSISTENCE_INTERVAL
+    )
+    update_processor = ChatOrderedUpdateProcessor(
+        max_running=config.UPDATE_CONCURRENCY,
+        max_queued=config.UPDATE_QUEUE_LIMIT
+    )
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(update_processor)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    rate_limiter = None
+    if config.TELEGRAM_RATE_LIMIT:
+        rate_limiter = PriorityRateLimiter(
+            global_rate=config.TELEGRAM_GLOBAL_RATE,
+            global_burst=config.TELEGRAM_GLOBAL_BURST,
+            chat_rate=config.TELEGRAM_CHAT_RATE,
+            chat_burst=config.TELEGRAM_CHAT_BURST,
+            max_retries=config.TELEGRAM_MAX_RETRIES,
+            max_bulk_queue=config.TELEGRAM_BULK_QUEUE_LIMIT
+        )
+        builder = builder.rate_limiter(rate_limiter)
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
     logger.info("Bot application created")
 
+    # Refresh JWTs shortly before they expire
+    schedule_token_refresh(application)
+
+    # Daily predicted-period reminders
+    schedule_reminders(application)
+
+    # Per-user notifications on a timing wheel
+    schedule_notifications(application)
+
+    # Background delivery and retries of cycle submissions
+    schedule_outbox(application)
+
     # Add handlers with logging
     logger.info("Adding conversation handlers...")
     
@@ -150,7 +240,8 @@ def main():
         },
         fallbacks=[CommandHandler('cancel', cancel)],
         allow_reentry=True,
-        name="main_conversation"
+        name="main_conversation",
+        persistent=True
     )
     logger.info("Created main conversation handler")
 
@@ -158,6 +249,10 @@ def main():
     application.add_handler(conv_handler, group=1)
     logger.info("Added main conversation handler")
 
+    # History page navigation works from any conversation state
+    application.add_handler(CallbackQueryHandler(handle_history_page, pattern=r'^history_\d+(_\d+)?$'), group=2)
+    logger.info("Added history pagination handler")
+
     # Add error handler
     application.add_error_handler(error_handler)
     logger.info("Added error handler")
@@ -166,8 +261,40 @@ def main():
     application.add_handler(CommandHandler('logout', logout))
     logger.info("Added logout handler")
 
-    logger.info("Bot initialization complete. Starting polling...")
-    application.run_polling()
+    # Latency and outcome metrics for every handler registered above
+    instrument_application(application)
+    register_stats(update_processor, persistence, rate_limiter)
+
+    # Opt-in recording of anonymized updates for load test replays
+    start_recording(application)
+    return application
+
+def main():
+    """Start the Telegram bot."""
+    run_application(build_application())
+
+def run_application(application: Application) -> None:
+    """Serve updates by long polling or through the embedded webhook server."""
+    if config.BOT_MODE == 'webhook':
+        if not config.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL must be set when BOT_MODE is 'webhook'")
+        if not config.WEBHOOK_SECRET:
+            # Without it anyone who finds the URL can post forged updates
+            raise ValueError("WEBHOOK_SECRET must be set when BOT_MODE is 'webhook'")
+
+        logger.info(f"Bot initialization complete. Starting webhook on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT}...")
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        logger.info("Bot initialization complete. Starting polling...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 async def error_handler(update: Update, context: CallbackContext) -> None:
     """Log Errors caused by Updates."""
@@ -190,6 +317,11 @@ async def error_handler(update: Update, context: CallbackContext) -> None:
     # Log the full error traceback
     logger.exception("Full error traceback:")
 
+    # The backend circuit is open: tell the user instead of leaving them waiting
+    if isinstance(context.error, BackendBusy) and update and update.effective_message:
+        lang = context.user_data.get('language', 'en') if context.user_data is not None else 'en'
+        await update.effective_message.reply_text(get_message(lang, 'errors', 'service_busy'))
+
 if __name__ == "__main__":
     logger.info("Starting bot application...")
     main()
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+import httpx
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# Gauge values of the states
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = registry.gauge(
+    'bot_backend_circuit_state', 'Circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)',
+    ('endpoint',)
+)
+breaker_transitions = registry.counter(
+    'bot_backend_circuit_transitions_total', 'Circuit breaker state changes', ('endpoint', 'state')
+)
+breaker_rejected = registry.counter(
+    'bot_backend_circuit_rejected_total', 'Requests failed fast while the circuit was open', ('endpoint',)
+)
+
+
+class BackendBusy(httpx.TransportError):
+    """Raised without contacting the backend while an endpoint's circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one endpoint.
+
+    After failure_threshold failures in a row the circuit opens and requests
+    fail fast. After recovery_time seconds it lets up to half_open_probes
+    requests through; one success closes it, a failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_time=30.0, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        breaker_state.set(STATE_VALUES[CLOSED], endpoint=name)
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit of {self.name} is now {state}")
+        self.state = state
+        breaker_state.set(STATE_VALUES[state], endpoint=self.name)
+        breaker_transitions.inc(endpoint=self.name, state=state)
+
+    def is_open(self):
+        """Whether a request would be rejected right now."""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at < self.recovery_time
+        return self.state == HALF_OPEN and self.probes >= self.half_open_probes
+
+    def allow(self):
+        """Reserve a request slot. Returns False if the request must fail fast."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_time:
+            self.probes = 0
+            self._transition(HALF_OPEN)
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_probes:
+                return False
+            self.probes += 1
+        return True
+
+    def release(self):
+        """Give back a slot whose request ended without an outcome, e.g. cancelled."""
+        if self.state == HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    def record_success(self):
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+
+# (method, path) -> CircuitBreaker, kept across clients so a recreated client keeps the state
+breakers = {}
+
+
+def endpoint_busy(method, path):
+    """Whether requests to an endpoint currently fail fast."""
+    breaker = breakers.get((method, path))
+    return breaker is not None and breaker.is_open()
+
+
+def parse_budgets(value):
+    """Parse "METHOD /path=seconds,..." into {(method, path): seconds}."""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        endpoint, _, seconds = item.rpartition('=')
+        method, _, path = endpoint.strip().partition(' ')
+        budgets[(method.upper(), path.strip())] = float(seconds)
+    return budgets
+
+
+class BreakerTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper with a circuit breaker and latency budget per endpoint.
+
+    A request that takes longer than its endpoint's budget is cancelled and
+    counts as a failure, like transport errors and 5xx responses. While the
+    circuit is open requests raise BackendBusy at once instead of piling up
+    behind a degraded backend.
+    """
+
+    def __init__(self, transport, failure_threshold=5, recovery_time=30.0, default_budget=8.0, budgets=None):
+        self._transport = transport
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+
+    def breaker(self, method, path):
+        key = (method, path)
+        breaker = breakers.get(key)
+        if breaker is None:
+            breaker = breakers[key] = CircuitBreaker(
+                f"{method} {path}", self.failure_threshold, self.recovery_time
+            )
+        return breaker
+
+    async def handle_async_request(self, request):
+        method, path = request.method, request.url.path
+        breaker = self.breaker(method, path)
+        if not breaker.allow():
+            breaker_rejected.inc(endpoint=breaker.name)
+            raise BackendBusy(f"Circuit of {breaker.name} is open", request=request)
+
+        budget = self.budgets.get((method, path), self.default_budget)
+        try:
+            response = await asyncio.wait_for(self._transport.handle_async_request(request), budget)
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            raise httpx.ReadTimeout(f"{breaker.name} exceeded its {budget}s latency budget", request=request)
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+import config
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ttl seconds after being stored."""
+
+    def __init__(self, maxsize, ttl, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            # Expired entries stay until evicted, see get_stale
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key):
+        """Return the value even if it has expired, or None if it was never stored or was dropped."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self.stale_hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'stale_hits': self.stale_hits,
+            'size': len(self._data)
+        }
+
+
+# Per-chat period list as returned by /api/periods/
+history_cache = TTLCache(config.HISTORY_CACHE_SIZE, config.HISTORY_CACHE_TTL, name='history')
+
+# Per-chat /api/periods/cycle_analysis/ data
+analysis_cache = TTLCache(config.HISTORY_CACHE_SIZE, config.ANALYSIS_CACHE_TTL, name='analysis')
+
+# Partner history and analysis per chat, i.e. per pairing
+partner_cache = TTLCache(config.PARTNER_CACHE_SIZE, config.PARTNER_CACHE_TTL, name='partner')
+
+
+def invalidate_chat(chat_id):
+    """Drop every cached entry of a chat, e.g. after a new cycle or on logout."""
+    history_cache.invalidate(str(chat_id))
+    analysis_cache.invalidate(str(chat_id))
+    partner_cache.invalidate(str(chat_id))
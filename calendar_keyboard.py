@@ -2,29 +2,96 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from datetime import datetime, timedelta
 import calendar
 import logging
+from collections import OrderedDict
+import config
 
 logger = logging.getLogger(__name__)
 
+MONTH_NAMES = {
+    'en': [
+        "January", "February", "March", "April", "May", "June",
+        "July", "August", "September", "October", "November", "December"
+    ],
+    'fa': [
+        "ژانویه", "فوریه", "مارس", "آوریل", "مه", "ژوئن",
+        "ژوئیه", "اوت", "سپتامبر", "اکتبر", "نوامبر", "دسامبر"
+    ]
+}
+
+WEEKDAY_NAMES = {
+    'en': ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"],
+    'fa': ["د", "س", "چ", "پ", "ج", "ش", "ی"]
+}
+
+def adjacent_months(year, month):
+    """Return ((prev_year, prev_month), (next_year, next_month))."""
+    prev_month = month - 1 if month > 1 else 12
+    prev_year = year if month > 1 else year - 1
+    next_month = month + 1 if month < 12 else 1
+    next_year = year if month < 12 else year + 1
+    return (prev_year, prev_month), (next_year, next_month)
+
 class CalendarKeyboard:
-    def __init__(self):
-        self.months = [
-            "January", "February", "March", "April", "May", "June",
-            "July", "August", "September", "October", "November", "December"
-        ]
+    """Builds month calendars, keeping recently used markups in a bounded LRU.
+
+    Markups are immutable, so one prebuilt markup per (year, month, locale) is
+    shared by every chat. Handlers call prefetch_adjacent once the calendar
+    is sent, so the next ◀/▶ tap is a cache hit without delaying the reply.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = config.CALENDAR_CACHE_SIZE if maxsize is None else maxsize
+        self._markups = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    def create_calendar(self, year=None, month=None):
+    @staticmethod
+    def _resolve(year, month, lang):
         now = datetime.now()
         if year is None:
             year = now.year
         if month is None:
             month = now.month
+        if lang not in MONTH_NAMES:
+            lang = 'en'
+        return year, month, lang
 
+    def create_calendar(self, year=None, month=None, lang='en'):
+        year, month, lang = self._resolve(year, month, lang)
+        key = (year, month, lang)
+        markup = self._markups.get(key)
+        if markup is not None:
+            self._markups.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            markup = self._store(key, self._build_calendar(year, month, lang))
+        return markup
+
+    def prefetch_adjacent(self, year=None, month=None, lang='en'):
+        """Build the months the navigation buttons of a calendar point to."""
+        year, month, lang = self._resolve(year, month, lang)
+        for adjacent in adjacent_months(year, month):
+            adjacent_key = (*adjacent, lang)
+            if adjacent_key not in self._markups:
+                self._store(adjacent_key, self._build_calendar(*adjacent, lang))
+
+    def _store(self, key, markup):
+        self._markups[key] = markup
+        while len(self._markups) > self.maxsize:
+            self._markups.popitem(last=False)
+        return markup
+
+    def cache_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._markups)}
+
+    def _build_calendar(self, year, month, lang):
         keyboard = []
         
         # First row - Month and Year
         row = [
             InlineKeyboardButton(
-                f"{self.months[month-1]} {year}",
+                f"{MONTH_NAMES[lang][month-1]} {year}",
                 callback_data="ignore"
             )
         ]
@@ -32,7 +99,7 @@ class CalendarKeyboard:
         
         # Second row - Days of week
         row = []
-        for day in ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]:
+        for day in WEEKDAY_NAMES[lang]:
             row.append(InlineKeyboardButton(day, callback_data="ignore"))
         keyboard.append(row)
 
@@ -55,13 +122,8 @@ class CalendarKeyboard:
         # Navigation buttons
         nav_row = []
         
-        # Calculate previous month and year
-        prev_month = month - 1 if month > 1 else 12
-        prev_year = year if month > 1 else year - 1
-        
-        # Calculate next month and year
-        next_month = month + 1 if month < 12 else 1
-        next_year = year if month < 12 else year + 1
+        # Calculate previous and next month and year
+        (prev_year, prev_month), (next_year, next_month) = adjacent_months(year, month)
         
         nav_row.extend([
             InlineKeyboardButton(
@@ -77,7 +139,7 @@ class CalendarKeyboard:
 
         return InlineKeyboardMarkup(keyboard)
 
-    def process_calendar_selection(self, callback_query):
+    def process_calendar_selection(self, callback_query, lang='en'):
         print("\n=== Calendar Keyboard Processing Selection ===")
         try:
             data = callback_query.data
@@ -92,9 +154,9 @@ class CalendarKeyboard:
                 _, year, month = data.split("_")
                 year, month = int(year), int(month)
                 print(f"Creating new calendar for {year}-{month}")
-                new_markup = self.create_calendar(year, month)
+                new_markup = self.create_calendar(year, month, lang)
                 print("New calendar markup created")
-                return None, new_markup
+                return (year, month), new_markup
                 
             elif data.startswith("date_"):
                 print(f"Date selection detected: {data}")
@@ -108,4 +170,7 @@ class CalendarKeyboard:
             return None
             
         print("No matching callback data pattern found")
-        return None 
\ No newline at end of file
+        return None 
+
+# Shared by every handler that shows a calendar
+calendar_service = CalendarKeyboard()
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import httpx
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+coalesced_total = registry.counter(
+    'bot_backend_coalesced_total', 'GET requests served by an identical request already in flight', ('endpoint',)
+)
+
+# Counters over all clients
+coalescing_stats = {'leaders': 0, 'coalesced': 0}
+
+
+class CoalescingTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper sharing one in-flight GET among identical callers.
+
+    Requests with the same URL and headers, Authorization included, that
+    arrive while such a GET is running wait for it instead of sending their
+    own. Keying on the exact token means a caller never gets a response,
+    such as a 401, that was meant for a different token of the same user.
+    The body is read once and every caller gets its own response over it.
+    The shared request runs in its own task, so a caller giving up does not
+    cancel it for the others. Nothing is kept once the request completes.
+    """
+
+    def __init__(self, transport):
+        self._transport = transport
+        # key -> task resolving to (status, headers, raw body, extensions)
+        self._in_flight = {}
+
+    @staticmethod
+    def _key(request):
+        return str(request.url), tuple(sorted(request.headers.items()))
+
+    async def _fetch(self, request):
+        response = await self._transport.handle_async_request(request)
+        try:
+            # Raw bytes, the client decodes them per caller
+            body = b''.join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        # The connection-level extensions belong to the one underlying response
+        extensions = {name: value for name, value in response.extensions.items()
+                      if name in ('http_version', 'reason_phrase')}
+        return response.status_code, response.headers, body, extensions
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieved here too, in case every caller gave up before it failed
+        if not task.cancelled():
+            task.exception()
+
+    async def handle_async_request(self, request):
+        if request.method != 'GET':
+            return await self._transport.handle_async_request(request)
+
+        key = self._key(request)
+        task = self._in_flight.get(key)
+        if task is None:
+            coalescing_stats['leaders'] += 1
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(request))
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            coalescing_stats['coalesced'] += 1
+            coalesced_total.inc(endpoint=request.url.path)
+
+        status, headers, body, extensions = await asyncio.shield(task)
+        return httpx.Response(
+            status, headers=headers, stream=httpx.ByteStream(body), extensions=extensions, request=request
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
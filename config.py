@@ -4,3 +4,131 @@ TELEGRAM_BOT_TOKEN = "7527376290:AAFdYSSYJfOj1hZNsxM92U3v64yzfa3gd3U"
 BASE_URL = "https://api-period.shirpala.ir"
 TOKEN_FILE = "user_tokens.json"
 
+# Shared backend HTTP client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# Per-endpoint circuit breaker: opens after BREAKER_FAILURE_THRESHOLD failures in a row
+# (errors, 5xx, or over the latency budget) and probes again after BREAKER_RECOVERY_TIME seconds
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") != "0"
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_TIME = float(os.getenv("BREAKER_RECOVERY_TIME", "30"))
+# Latency budget in seconds per request, overridable per endpoint as "GET /api/periods/=5,..."
+BACKEND_LATENCY_BUDGET = float(os.getenv("BACKEND_LATENCY_BUDGET", "8"))
+BACKEND_LATENCY_BUDGETS = os.getenv("BACKEND_LATENCY_BUDGETS", "GET /api/periods/=5")
+# Show expired cached data instead of an error while the backend is unavailable
+SERVE_STALE_WHEN_BUSY = os.getenv("SERVE_STALE_WHEN_BUSY", "1") != "0"
+
+# Identical concurrent GETs (same URL and access token) share one backend request
+COALESCE_GETS = os.getenv("COALESCE_GETS", "1") != "0"
+
+# Token storage: "sqlite" (default) or the legacy "json" file
+TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "sqlite")
+TOKEN_DB_PATH = os.getenv("TOKEN_DB_PATH", "user_tokens.db")
+
+# Background JWT refresh
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "10"))
+# Longest wait before retrying a refresh that failed for a transient reason (5xx, network)
+TOKEN_REFRESH_RETRY_MAX = int(os.getenv("TOKEN_REFRESH_RETRY_MAX", "3600"))
+# /start trusts a token locally if it is valid for at least this many seconds
+START_TOKEN_MARGIN = int(os.getenv("START_TOKEN_MARGIN", "30"))
+
+# Per-chat period history cache
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "10000"))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "600"))
+
+# Per-chat cycle analysis from the backend
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "600"))
+
+# Partner snapshot (history and analysis) per pairing; kept short as the partner may log new cycles
+PARTNER_CACHE_SIZE = int(os.getenv("PARTNER_CACHE_SIZE", "10000"))
+PARTNER_CACHE_TTL = int(os.getenv("PARTNER_CACHE_TTL", "60"))
+PARTNER_HISTORY_CYCLES = int(os.getenv("PARTNER_HISTORY_CYCLES", "3"))
+
+# Opt-in: load the history and analysis in the background while the main menu is shown
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0") == "1"
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "10"))
+
+# Cycle submissions outbox: retries back off exponentially from OUTBOX_RETRY_BASE up to OUTBOX_RETRY_MAX seconds
+OUTBOX_RETRY_INTERVAL = float(os.getenv("OUTBOX_RETRY_INTERVAL", "5"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "5"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "900"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "10"))
+# Hours a submission waits for its user to log in again (after logout or an expired session) before it is given up
+OUTBOX_LOGIN_WAIT_HOURS = float(os.getenv("OUTBOX_LOGIN_WAIT_HOURS", "168"))
+
+# Latency budget of /api/periods/cycle_analysis/ before falling back to local analysis
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "3"))
+
+# Serving mode: "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# Required in webhook mode: Telegram sends it with every update and others are rejected
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Concurrent update processing (updates of one chat always run in order)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+UPDATE_QUEUE_LIMIT = int(os.getenv("UPDATE_QUEUE_LIMIT", "4096"))
+
+# Conversation, user_data and bot_data persistence
+PERSISTENCE_PATH = os.getenv("PERSISTENCE_PATH", "bot_data.db")
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "30"))
+
+# Cycles shown per history page
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "5"))
+
+# Prebuilt calendar keyboards kept per (year, month, locale)
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "64"))
+
+# Metrics: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+# and/or a periodic dump file (empty disables)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))
+
+# Opt-in recording of anonymized incoming updates for replay in load tests (empty disables)
+UPDATE_RECORDING_PATH = os.getenv("UPDATE_RECORDING_PATH", "")
+# Key for hashing chat and user ids; a random one is used per run when empty
+UPDATE_RECORDING_SALT = os.getenv("UPDATE_RECORDING_SALT", "")
+
+# Outgoing message limits (Telegram allows about 30 messages/s overall and 1/s per chat)
+TELEGRAM_RATE_LIMIT = os.getenv("TELEGRAM_RATE_LIMIT", "1") != "0"
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_GLOBAL_BURST = int(os.getenv("TELEGRAM_GLOBAL_BURST", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_BULK_QUEUE_LIMIT = int(os.getenv("TELEGRAM_BULK_QUEUE_LIMIT", "10000"))
+
+# Daily predicted-period reminders: chats are checked at REMINDER_CHECK_TIME and
+# reminded at REMINDER_SEND_TIME (HH:MM in REMINDER_TIMEZONE) or the time they chose
+# in the settings out of REMINDER_TIME_CHOICES
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1") != "0"
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "UTC")
+REMINDER_CHECK_TIME = os.getenv("REMINDER_CHECK_TIME", "06:00")
+REMINDER_SEND_TIME = os.getenv("REMINDER_SEND_TIME", "09:00")
+REMINDER_TIME_CHOICES = tuple(os.getenv("REMINDER_TIME_CHOICES", "08:00,12:00,18:00,21:00").split(","))
+# Timezone given to users choosing a language ("lang=Area/City,..."); others get REMINDER_TIMEZONE
+LANGUAGE_TIMEZONES = dict(
+    item.split("=", 1) for item in os.getenv("LANGUAGE_TIMEZONES", "fa=Asia/Tehran").split(",") if item
+)
+REMINDER_DAYS_BEFORE = tuple(int(days) for days in os.getenv("REMINDER_DAYS_BEFORE", "2,0").split(","))
+# At most HTTP_MAX_KEEPALIVE_CONNECTIONS, so the check reuses pooled connections
+REMINDER_FETCH_CONCURRENCY = int(os.getenv("REMINDER_FETCH_CONCURRENCY", "20"))
+REMINDER_SEND_CONCURRENCY = int(os.getenv("REMINDER_SEND_CONCURRENCY", "50"))
+
+# Per-user notifications (before period, fertile window) on a timing wheel
+NOTIFICATION_TICK = int(os.getenv("NOTIFICATION_TICK", "60"))
+NOTIFICATION_HOUR = int(os.getenv("NOTIFICATION_HOUR", "9"))
@@ -1,56 +1,100 @@
 # cycle_analysis.py
 
-import httpx
-from utils import load_tokens, refresh_token  # These utilities should work as expected
-from config import BASE_URL
+import logging
+from utils import get_access_token
+from http_client import get_client
 from telegram import Update
 from telegram.ext import CallbackContext
 from states import MENU
 from languages import get_message
+from local_analysis import analyze_periods
+from cache import analysis_cache
+from breaker import endpoint_busy
+import config
+from metrics import timed
 
+logger = logging.getLogger(__name__)
+
+async def request_cycle_analysis(access_token):
+    """Get the analysis from the backend. Returns None if it is slow, down or fails."""
+    headers = {"Authorization": f"Bearer {access_token}"}
+    try:
+        client = get_client()
+        response = await client.get(
+            "/api/periods/cycle_analysis/",
+            headers=headers,
+            timeout=config.ANALYSIS_TIMEOUT
+        )
+        if response.status_code == 200:
+            return response.json()['data']
+        logger.warning(f"Cycle analysis request failed: {response.status_code}")
+    except Exception as e:
+        logger.warning(f"Cycle analysis request error: {str(e)}")
+    return None
+
+async def load_cycle_analysis(chat_id, access_token):
+    """Return the backend analysis of a chat from the cache, or request and cache it. None on failure."""
+    data = analysis_cache.get(chat_id)
+    if data is None:
+        data = await request_cycle_analysis(access_token)
+        if data is not None:
+            analysis_cache.set(chat_id, data)
+    return data
+
+async def local_cycle_analysis(chat_id, access_token):
+    """Approximate the analysis from the chat's period list, fetching it if needed.
+
+    Only a fallback for when the backend analysis is unavailable. analyze_periods
+    uses its own formulas rather than the backend's, so the result is shown
+    to the user as a local estimate.
+    """
+    from period import load_periods
+    try:
+        periods = await load_periods(chat_id, access_token)
+    except Exception as e:
+        logger.error(f"Error loading periods for local analysis: {str(e)}")
+        return None
+    return analyze_periods(periods) if periods else None
+
+def format_cycle_analysis(data):
+    """Format the analysis message."""
+    return (
+        "📊 *Your Cycle Analysis*\n\n"
+        f"📅 Next Predicted Period: *{data['next_predicted_date']}*\n"
+        f"⏱ Average Cycle Length: *{data['average_cycle']} days*\n"
+        f"📈 Regularity Score: *{data['regularity_score']}%*\n"
+        f"🎯 Prediction Reliability: *{data['prediction_reliability']}%*\n"
+        f"🔄 Cycle Variations: *{', '.join(map(str, data['cycle_variations']))} days*"
+    )
+
+@timed('fetch_cycle_analysis')
 async def fetch_cycle_analysis(update: Update, context: CallbackContext) -> None:
     """Fetch and display cycle analysis data."""
     chat_id = str(update.message.chat_id)
     lang = context.user_data.get('language', 'en')
     
-    # Get access token from user_tokens
-    from bot import user_tokens
-    if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
+    # Get access token from the token store
+    access_token = await get_access_token(chat_id)
+    if not access_token:
         await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
         return MENU
 
-    access_token = user_tokens[chat_id]["access"]
-    headers = {"Authorization": f"Bearer {access_token}"}
+    data = await load_cycle_analysis(chat_id, access_token)
+    estimate = data is None
+    if estimate:
+        # Backend slow or down: fall back to computing it locally
+        data = await local_cycle_analysis(chat_id, access_token)
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{BASE_URL}/api/periods/cycle_analysis/",
-                headers=headers
-            )
-
-            if response.status_code == 200:
-                data = response.json()['data']
-                
-                # Format the analysis message
-                analysis_message = (
-                    "📊 *Your Cycle Analysis*\n\n"
-                    f"📅 Next Predicted Period: *{data['next_predicted_date']}*\n"
-                    f"⏱ Average Cycle Length: *{data['average_cycle']} days*\n"
-                    f"📈 Regularity Score: *{data['regularity_score']}%*\n"
-                    f"🎯 Prediction Reliability: *{data['prediction_reliability']}%*\n"
-                    f"🔄 Cycle Variations: *{', '.join(map(str, data['cycle_variations']))} days*"
-                )
-                
-                await update.message.reply_text(
-                    analysis_message,
-                    parse_mode="Markdown"
-                )
-            else:
-                await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
-                
-    except Exception as e:
-        await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
-        
-    return MENU
+    if data is None:
+        busy = endpoint_busy('GET', '/api/periods/')
+        await update.message.reply_text(get_message(lang, 'errors', 'service_busy' if busy else 'fetch_failed'))
+        return MENU
 
+    text = format_cycle_analysis(data)
+    if estimate:
+        text += "\n\n" + get_message(lang, 'analysis', 'local_estimate')
+    await update.message.reply_text(
+        text,
+        parse_mode="Markdown"
+    )
+    return MENU
@@ -0,0 +1,122 @@
+import logging
+import httpx
+import config
+from metrics import InstrumentedTransport
+from breaker import BreakerTransport, parse_budgets
+from coalescing import CoalescingTransport
+
+logger = logging.getLogger(__name__)
+
+# Application-scoped client shared by every module that talks to the backend
+_client = None
+_transport = None
+_request_count = 0
+
+
+async def _count_request(request):
+    global _request_count
+    _request_count += 1
+
+
+def _http2_available():
+    """Check whether the optional h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_client() -> httpx.AsyncClient:
+    """Create the pooled client using the limits and timeouts from config."""
+    global _transport
+
+    http2 = config.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        config.HTTP_TIMEOUT,
+        connect=config.HTTP_CONNECT_TIMEOUT,
+        pool=config.HTTP_POOL_TIMEOUT
+    )
+    _transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+
+    logger.info(
+        f"Creating shared HTTP client (http2={http2}, "
+        f"max_connections={config.HTTP_MAX_CONNECTIONS}, "
+        f"max_keepalive={config.HTTP_MAX_KEEPALIVE_CONNECTIONS})"
+    )
+    transport = InstrumentedTransport(_transport)
+    if config.BREAKER_ENABLED:
+        transport = BreakerTransport(
+            transport,
+            failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+            recovery_time=config.BREAKER_RECOVERY_TIME,
+            default_budget=config.BACKEND_LATENCY_BUDGET,
+            budgets=parse_budgets(config.BACKEND_LATENCY_BUDGETS)
+        )
+    if config.COALESCE_GETS:
+        # Outermost, so a shared request passes the breaker and the metrics once
+        transport = CoalescingTransport(transport)
+    return httpx.AsyncClient(
+        base_url=config.BASE_URL,
+        transport=transport,
+        timeout=timeout,
+        event_hooks={'request': [_count_request]}
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+async def init_client(application=None) -> None:
+    """Create the shared client. Used as the application's post_init hook."""
+    get_client()
+
+
+async def close_client(application=None) -> None:
+    """Close the shared client and its pooled connections. Used as post_shutdown hook."""
+    global _client, _transport
+    if _client is not None:
+        await _client.aclose()
+        logger.info("Shared HTTP client closed")
+    _client = None
+    _transport = None
+
+
+def pool_stats() -> dict:
+    """Return a snapshot of the connection pool of the shared client."""
+    stats = {
+        'requests': _request_count,
+        'connections': 0,
+        'idle': 0,
+        'active': 0,
+        'http2': 0,
+        'max_connections': config.HTTP_MAX_CONNECTIONS,
+        'max_keepalive_connections': config.HTTP_MAX_KEEPALIVE_CONNECTIONS
+    }
+    pool = getattr(_transport, '_pool', None)
+    if pool is None:
+        return stats
+
+    for connection in pool.connections:
+        stats['connections'] += 1
+        if connection.is_idle():
+            stats['idle'] += 1
+        else:
+            stats['active'] += 1
+        if 'HTTP/2' in connection.info():
+            stats['http2'] += 1
+    return stats
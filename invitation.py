@@ -1,10 +1,12 @@
 import logging
 import uuid
-import aiohttp
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext
 from languages import get_message
 from states import MENU, ACCEPTING_INVITATION, SETTINGS
+from http_client import get_client
+from utils import get_access_token
+from cache import partner_cache
 
 logger = logging.getLogger(__name__)
 
@@ -15,40 +17,37 @@ async def generate_invitation_code(update: Update, context: CallbackContext) ->
     
     try:
         # Get the user's access token
-        from utils import load_tokens
-        user_tokens = load_tokens()
+        access_token = await get_access_token(chat_id)
         
-        if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
+        if not access_token:
             await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
             return MENU
-
-        access_token = user_tokens[chat_id]["access"]
         
         # Make API call to generate invitation code
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'https://api-period.shirpala.ir/api/user/invitation/',
-                headers={"Authorization": f"Bearer {access_token}"}
-            ) as response:
-                if response.status == 200 or response.status == 201:
-                    data = await response.json()
-                    invitation_code = data.get('invitation_code')
-                    
-                    # Store the invitation code in user_data
-                    context.user_data['invitation_code'] = invitation_code
-                    
-                    # Send the code to the user
-                    await update.message.reply_text(
-                        get_message(lang, 'invitation', 'code_generated').format(invitation_code),
-                        reply_markup=ReplyKeyboardMarkup([[get_message(lang, 'menu', 'back_to_main')]], 
-                                                      one_time_keyboard=True)
-                    )
-                    return SETTINGS
-                else:
-                    logger.error(f"Failed to generate invitation code. Status: {response.status}")
-                    await update.message.reply_text(get_message(lang, 'invitation', 'generation_error'))
-                    return SETTINGS
-                    
+        client = get_client()
+        response = await client.post(
+            '/api/user/invitation/',
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        if response.status_code == 200 or response.status_code == 201:
+            data = response.json()
+            invitation_code = data.get('invitation_code')
+            
+            # Store the invitation code in user_data
+            context.user_data['invitation_code'] = invitation_code
+            
+            # Send the code to the user
+            await update.message.reply_text(
+                get_message(lang, 'invitation', 'code_generated').format(invitation_code),
+                reply_markup=ReplyKeyboardMarkup([[get_message(lang, 'menu', 'back_to_main')]], 
+                                              one_time_keyboard=True)
+            )
+            return SETTINGS
+        else:
+            logger.error(f"Failed to generate invitation code. Status: {response.status_code}")
+            await update.message.reply_text(get_message(lang, 'invitation', 'generation_error'))
+            return SETTINGS
+            
     except Exception as e:
         logger.error(f"Error generating invitation code: {str(e)}")
         await update.message.reply_text(get_message(lang, 'invitation', 'generation_error'))
@@ -77,39 +76,34 @@ async def accept_invitation(update: Update, context: CallbackContext) -> int:
     
     try:
         # Get the user's access token
-        from utils import load_tokens
-        user_tokens = load_tokens()
+        access_token = await get_access_token(chat_id)
         
-        if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
+        if not access_token:
             await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
             return MENU
-
-        access_token = user_tokens[chat_id]["access"]
         
         # Make API call to accept invitation
-        async with aiohttp.ClientSession() as session:
-            # Create form data
-            form_data = aiohttp.FormData()
-            form_data.add_field('code_to_accept', text)
+        client = get_client()
+        response = await client.post(
+            '/api/user/invitation/',
+            headers={"Authorization": f"Bearer {access_token}"},
+            data={'code_to_accept': text}
+        )
+        if response.status_code == 200 or response.status_code == 201:
+            # The pairing changed, a cached partner snapshot is stale
+            partner_cache.invalidate(chat_id)
+            # Show success message
+            await update.message.reply_text(
+                get_message(lang, 'invitation', 'accepted'),
+                reply_markup=ReplyKeyboardMarkup([[get_message(lang, 'menu', 'back_to_main')]], 
+                                              one_time_keyboard=True)
+            )
+            return SETTINGS
+        else:
+            logger.error(f"Failed to accept invitation. Status: {response.status_code}")
+            await update.message.reply_text(get_message(lang, 'invitation', 'acceptance_error'))
+            return SETTINGS
             
-            async with session.post(
-                'https://api-period.shirpala.ir/api/user/invitation/',
-                headers={"Authorization": f"Bearer {access_token}"},
-                data=form_data
-            ) as response:
-                if response.status == 200 or response.status == 201:
-                    # Show success message
-                    await update.message.reply_text(
-                        get_message(lang, 'invitation', 'accepted'),
-                        reply_markup=ReplyKeyboardMarkup([[get_message(lang, 'menu', 'back_to_main')]], 
-                                                      one_time_keyboard=True)
-                    )
-                    return SETTINGS
-                else:
-                    logger.error(f"Failed to accept invitation. Status: {response.status}")
-                    await update.message.reply_text(get_message(lang, 'invitation', 'acceptance_error'))
-                    return SETTINGS
-                    
     except Exception as e:
         logger.error(f"Error accepting invitation: {str(e)}")
         await update.message.reply_text(get_message(lang, 'invitation', 'acceptance_error'))
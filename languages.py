@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 # English messages
 EN = {
     'welcome': {
@@ -24,6 +26,7 @@ EN = {
         'enter_email': "Enter your email address (e.g., example@gmail.com):",
         'invalid_email': "Please enter a valid email address (e.g., example@gmail.com):",
         'reg_success': "Registration successful!",
+        'registration_restarted': "Your registration was interrupted, please start again. Please enter your username:",
         'login_failed': "❌ Login failed. Please try again.",
         'logged_out': "You have been logged out. Use /start to log in again.",
         'not_logged_in': "You are not logged in.",
@@ -39,6 +42,9 @@ EN = {
         'custom_medication': "Please type your medication and press 'Done' when finished:",
         'added_item': "Added: {}\nSelected {}: {}\n\nSelect more or press 'Done'",
         'save_success': "✅ Cycle data has been saved successfully!",
+        'save_queued': "✅ Cycle data has been saved! It will appear in your history once it is synced.",
+        'save_abandoned': "❌ The cycle starting {} could not be synced because you have not logged in again for too long. Please log in and add it again.",
+        'pending_on_logout': "⏳ {} cycle(s) you added are not synced yet. They will be synced when you log in again with the same account.",
         'save_failed': "❌ Failed to save cycle data: {}"
     },
     'buttons': {
@@ -55,7 +61,11 @@ EN = {
         'operation_cancelled': "Operation cancelled.",
         'fetch_failed': "❌ Failed to fetch data. Please try again later.",
         'no_data': "ℹ️ No data available yet.",
-        'login_required': "🔒 Please login first to access this feature."
+        'login_required': "🔒 Please login first to access this feature.",
+        'service_busy': "⏳ The service is busy right now. Please try again in a minute."
+    },
+    'analysis': {
+        'local_estimate': "ℹ️ The analysis service is unavailable, so this is a local estimate from your recorded cycles. It may differ from the full analysis."
     },
     'period_history': {
         'title': "📅 **Your Period History**:",
@@ -66,12 +76,14 @@ EN = {
         'medicine_title': "💊 *Medicine*",
         'none_noted': "None noted",
         'none_taken': "None taken",
-        'days': "d"  # for days abbreviation
+        'days': "d",  # for days abbreviation
+        'page': "Page {} of {}"
     },
     'settings': {
         'menu': "⚙️ Settings",
         'title': "⚙️ **Settings Menu**\nChoose an option:",
-        'back_to_main': "↩️ Back to Main Menu"
+        'back_to_main': "↩️ Back to Main Menu",
+        'reminder_time_changed': "⏰ Reminders will be sent at {}"
     },
     'invitation': {
         'code_generated': "🎟️ Your invitation code is: `{}`\nShare this code with your partner.",
@@ -91,7 +103,14 @@ EN = {
         'enter_message': "Enter your message to your partner:",
         'coming_soon': "🔜 This feature is coming soon!",
         'message_sent': "✅ Message sent to partner",
-        'no_partner': "❌ No partner connected. Please connect with a partner first."
+        'no_partner': "❌ No partner connected. Please connect with a partner first.",
+        'recent_cycles': "🗓 *Recent cycles*"
+    },
+    'reminders': {
+        'upcoming': "🔔 Your next period is predicted to start in {} days ({}).",
+        'today': "🔔 Your period is predicted to start today ({}).",
+        'before_period': "🔔 Your period is expected in 2 days ({}).",
+        'fertile_window': "🌱 Your fertile window starts today (next period expected {})."
     }
 }
 
@@ -121,6 +140,7 @@ FA = {
         'enter_email': "آدرس ایمیل خود را وارد کنید (مثال: example@gmail.com):",
         'invalid_email': "لطفاً یک آدرس ایمیل معتبر وارد کنید (مثال: example@gmail.com):",
         'reg_success': "ثبت نام با موفقیت انجام شد!",
+        'registration_restarted': "ثبت نام شما قطع شد، لطفاً دوباره شروع کنید. لطفاً نام کاربری خود را وارد کنید:",
         'login_failed': "❌ ورود ناموفق بود. لطفا دوباره تلاش کنید.",
         'logged_out': "شما از سیستم خارج شدید. برای ورود مجدد از /start استفاده کنید.",
         'not_logged_in': "شما وارد نشده‌اید.",
@@ -136,6 +156,9 @@ FA = {
         'custom_medication': "لطفاً داروی خود را تایپ کنید و پس از اتمام 'پایان' را فشار دهید:",
         'added_item': "اضافه شد: {}\nموارد انتخاب شده {}: {}\n\nموارد بیشتری انتخاب کنید یا 'پایان' را فشار دهید",
         'save_success': "✅ اطلاعات دوره با موفقیت ذخیره شد!",
+        'save_queued': "✅ اطلاعات دوره ذخیره شد! پس از همگام‌سازی در تاریخچه شما نمایش داده می‌شود.",
+        'save_abandoned': "❌ دوره با تاریخ شروع {} همگام‌سازی نشد زیرا مدت زیادی دوباره وارد حساب خود نشدید. لطفاً وارد شوید و دوباره آن را اضافه کنید.",
+        'pending_on_logout': "⏳ {} دوره‌ای که اضافه کرده‌اید هنوز همگام‌سازی نشده است. با ورود دوباره با همین حساب همگام‌سازی می‌شوند.",
         'save_failed': "❌ ذخیره اطلاعات دوره ناموفق بود: {}"
     },
     'buttons': {
@@ -152,7 +175,11 @@ FA = {
         'operation_cancelled': "عملیات لغو شد.",
         'fetch_failed': "❌ دریافت اطلاعات ناموفق بود. لطفاً بعداً دوباره تلاش کنید.",
         'no_data': "ℹ️ اطلاعاتی برای نمایش وجود ندارد.",
-        'login_required': "🔒 برای دسترسی به این ویژگی ابتدا باید وارد شوید."
+        'login_required': "🔒 برای دسترسی به این ویژگی ابتدا باید وارد شوید.",
+        'service_busy': "⏳ سرویس در حال حاضر شلوغ است. لطفاً یک دقیقه دیگر دوباره تلاش کنید."
+    },
+    'analysis': {
+        'local_estimate': "ℹ️ سرویس تحلیل در دسترس نیست، بنابراین این یک برآورد محلی بر اساس دوره‌های ثبت‌شده شماست و ممکن است با تحلیل کامل متفاوت باشد."
     },
     'period_history': {
         'title': "📅 **تاریخچه دوره شما**:",
@@ -163,12 +190,14 @@ FA = {
         'medicine_title': "💊 *دارو*",
         'none_noted': "هیچ علامتی ثبت نشده",
         'none_taken': "هیچ دارویی مصرف نشده",
-        'days': "روز"
+        'days': "روز",
+        'page': "صفحه {} از {}"
     },
     'settings': {
         'menu': "⚙️ تنظیمات",
         'title': "⚙️ **منوی تنظیمات**\nیک گزینه را انتخاب کنید:",
-        'back_to_main': "↩️ بازگشت به منوی اصلی"
+        'back_to_main': "↩️ بازگشت به منوی اصلی",
+        'reminder_time_changed': "⏰ یادآوری‌ها ساعت {} ارسال می‌شوند"
     },
     'invitation': {
         'code_generated': "🎟️ کد دعوت شما: `{}`\nاین کد را با شریک خود به اشتراک بگذارید.",
@@ -188,10 +217,20 @@ FA = {
         'enter_message': "پیام خود را به شریک وارد کنید:",
         'coming_soon': "🔜 این ویژگی به زودی اضافه خواهد شد!",
         'message_sent': "✅ پیام به شریک ارسال شد",
-        'no_partner': "❌ شریکی متصل نیست. لطفا ابتدا با یک شریک متصل شوید."
+        'no_partner': "❌ شریکی متصل نیست. لطفا ابتدا با یک شریک متصل شوید.",
+        'recent_cycles': "🗓 *دوره‌های اخیر*"
+    },
+    'reminders': {
+        'upcoming': "🔔 دوره بعدی شما {} روز دیگر ({}) پیش‌بینی شده است.",
+        'today': "🔔 دوره شما امروز ({}) پیش‌بینی شده است.",
+        'before_period': "🔔 دوره شما ۲ روز دیگر ({}) انتظار می‌رود.",
+        'fertile_window': "🌱 دوره باروری شما از امروز شروع می‌شود (دوره بعدی {})."
     }
 }
 
+# All supported languages by code
+LANGUAGES = {'en': EN, 'fa': FA}
+
 # Predefined options in both languages
 SYMPTOM_OPTIONS = {
     'en': [
@@ -221,6 +260,35 @@ MEDICATION_OPTIONS = {
     ]
 }
 
+def _build_translation_tables():
+    """Build item translation tables for every pair of languages.
+
+    Returns ({(source, target): table}, {target: table from any other language}).
+    Control buttons such as 'Done' are not items and are left out.
+    """
+    controls = {text for messages in LANGUAGES.values() for text in messages['buttons'].values()}
+    pairs = {}
+    to_language = {}
+    for source in LANGUAGES:
+        for target in LANGUAGES:
+            if source == target:
+                continue
+            table = {}
+            for options in (SYMPTOM_OPTIONS, MEDICATION_OPTIONS):
+                for source_row, target_row in zip(options[source], options[target]):
+                    for source_item, target_item in zip(source_row, target_row):
+                        if source_item not in controls:
+                            table[source_item] = target_item
+            pairs[(source, target)] = MappingProxyType(table)
+            to_language.setdefault(target, {}).update(table)
+    return (
+        MappingProxyType(pairs),
+        MappingProxyType({lang: MappingProxyType(table) for lang, table in to_language.items()})
+    )
+
+# Built once at import; read-only afterwards
+TRANSLATIONS, TRANSLATIONS_TO = _build_translation_tables()
+
 def get_message(lang: str, category: str, key: str, *args) -> str:
     """
     Get a message in the specified language.
@@ -0,0 +1,58 @@
+import logging
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure-Python path gives the same results
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Number of recorded cycles after which predictions are considered fully backed by data
+RELIABLE_CYCLE_COUNT = 6
+
+
+def _start_ordinals(periods):
+    """Sorted, de-duplicated start dates of the periods as day ordinals."""
+    starts = set()
+    for period in periods:
+        start_date = period.get("start_date")
+        if start_date:
+            starts.add(date.fromisoformat(start_date).toordinal())
+    return sorted(starts)
+
+
+def _cycle_stats(starts):
+    """Return (cycle lengths, mean, standard deviation) for sorted start ordinals."""
+    if np is not None:
+        lengths = np.diff(np.asarray(starts, dtype=np.int64))
+        return lengths.tolist(), float(lengths.mean()), float(lengths.std())
+
+    lengths = [b - a for a, b in zip(starts, starts[1:])]
+    mean = sum(lengths) / len(lengths)
+    std = (sum((length - mean) ** 2 for length in lengths) / len(lengths)) ** 0.5
+    return lengths, mean, std
+
+
+def analyze_periods(periods):
+    """Compute the /api/periods/cycle_analysis/ fields from a period list.
+
+    Returns None when fewer than two periods are recorded, since no cycle
+    length can be derived from a single start date.
+    """
+    starts = _start_ordinals(periods)
+    if len(starts) < 2:
+        return None
+
+    lengths, mean, std = _cycle_stats(starts)
+    regularity = max(0.0, 100.0 - std / mean * 100.0) if mean else 0.0
+    coverage = min(1.0, len(lengths) / RELIABLE_CYCLE_COUNT)
+    next_start = date.fromordinal(starts[-1]) + timedelta(days=round(mean))
+
+    return {
+        'next_predicted_date': next_start.isoformat(),
+        'average_cycle': round(mean, 1),
+        'regularity_score': round(regularity),
+        'prediction_reliability': round(regularity * coverage),
+        'cycle_variations': [round(abs(length - mean), 1) for length in lengths]
+    }
@@ -3,9 +3,13 @@ from telegram.ext import CallbackContext, ConversationHandler
 from languages import get_message
 from states import MENU, REGISTER, LOGIN, PERIOD_TRACKING
 import logging
-import httpx
-from utils import load_tokens, save_tokens, refresh_token
-from config import BASE_URL
+from utils import refresh_token
+from token_store import get_token_store
+from token_refresh import check_token_locally, validation_stats, TOKEN_VALID, TOKEN_EXPIRING
+from http_client import get_client
+from menu_router import MenuRouter
+from prefetch import menu_prefetcher, HISTORY, ANALYSIS
+import config
 
 logger = logging.getLogger(__name__)
 
@@ -17,31 +21,45 @@ async def start(update: Update, context: CallbackContext) -> int:
     
     logger.info(f"Starting bot for chat_id: {chat_id}")
     
-    # Get user_tokens from bot_data
-    user_tokens = load_tokens()
+    access_token = get_token_store().get_access(chat_id)
     
     # Check if user has valid token
-    if chat_id in user_tokens and "access" in user_tokens[chat_id]:
+    if access_token:
         logger.info(f"Found existing token for chat_id: {chat_id}")
-        # Try to use the token to verify it's still valid
+        # JWT expiry can be checked locally; only ask the backend when unsure
+        status = check_token_locally(access_token, margin=config.START_TOKEN_MARGIN)
+        if status == TOKEN_VALID:
+            validation_stats['avoided'] += 1
+            logger.info("Token is valid, showing main menu")
+            return await show_main_menu(update, context)
+        if status == TOKEN_EXPIRING:
+            validation_stats['avoided'] += 1
+            logger.info("Token is expiring, refreshing")
+            if await refresh_token(chat_id):
+                return await show_main_menu(update, context)
+            access_token = None
+
+    if access_token:
+        # Opaque token: try to use it to verify it's still valid
+        validation_stats['backend'] += 1
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{BASE_URL}api/user/profile/",
-                    headers={"Authorization": f"Bearer {user_tokens[chat_id]['access']}"}
-                )
-                
-                if response.status_code == 200:
-                    logger.info("Token is valid, showing main menu")
+            client = get_client()
+            response = await client.get(
+                "/api/user/profile/",
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
+            
+            if response.status_code == 200:
+                logger.info("Token is valid, showing main menu")
+                return await show_main_menu(update, context)
+            else:
+                logger.warning("Token is invalid, trying refresh")
+                # Try to refresh the token
+                new_token = await refresh_token(chat_id)
+                if new_token:
+                    logger.info("Token refreshed successfully")
                     return await show_main_menu(update, context)
-                else:
-                    logger.warning("Token is invalid, trying refresh")
-                    # Try to refresh the token
-                    new_token = await refresh_token(chat_id, user_tokens)
-                    if new_token:
-                        logger.info("Token refreshed successfully")
-                        return await show_main_menu(update, context)
-                    
+                
         except Exception as e:
             logger.error(f"Error checking token: {str(e)}")
     
@@ -80,40 +98,51 @@ async def show_main_menu(update: Update, context: CallbackContext) -> int:
         ),
         parse_mode="Markdown"
     )
+    # History or analysis is usually the next tap
+    if config.PREFETCH_ENABLED:
+        menu_prefetcher.prefetch(context.application, str(update.effective_chat.id))
+    return MENU
+
+async def _add_new_cycle(update: Update, context: CallbackContext) -> int:
+    from add_cycle import start_add_cycle
+    return await start_add_cycle(update, context)
+
+async def _view_history(update: Update, context: CallbackContext) -> int:
+    from period import fetch_periods
+    await menu_prefetcher.claim(str(update.message.chat_id), HISTORY)
+    await fetch_periods(update, context)
     return MENU
 
+async def _cycle_analysis(update: Update, context: CallbackContext) -> int:
+    from cycle_analysis import fetch_cycle_analysis
+    await menu_prefetcher.claim(str(update.message.chat_id), ANALYSIS)
+    return await fetch_cycle_analysis(update, context)
+
+async def _partner_menu(update: Update, context: CallbackContext) -> int:
+    from partner import show_partner_menu
+    return await show_partner_menu(update, context)
+
+async def _settings_menu(update: Update, context: CallbackContext) -> int:
+    from settings import show_settings_menu
+    return await show_settings_menu(update, context)
+
+async def _logout(update: Update, context: CallbackContext) -> int:
+    from bot import logout
+    return await logout(update, context)
+
+main_menu_router = (
+    MenuRouter('main menu')
+    .add('menu', 'add_new_cycle', _add_new_cycle)
+    .add('menu', 'view_history', _view_history)
+    .add('menu', 'cycle_analysis', _cycle_analysis)
+    .add('menu', 'partner_menu', _partner_menu)
+    .add('settings', 'menu', _settings_menu)
+    .add('menu', 'logout', _logout)
+)
+
 async def handle_menu(update: Update, context: CallbackContext) -> int:
     """Handle main menu selections."""
-    text = update.message.text
-    lang = context.user_data.get('language', 'en')
-    
-    # Log the received text and expected partner menu text
-    logger.info(f"Received menu text: '{text}'")
-    logger.info(f"Expected partner menu text: '{get_message(lang, 'menu', 'partner_menu')}'")
-    
-    if text == get_message(lang, 'menu', 'add_new_cycle'):
-        from add_cycle import start_add_cycle
-        return await start_add_cycle(update, context)
-    elif text == get_message(lang, 'menu', 'view_history'):
-        from period import fetch_periods
-        await fetch_periods(update, context)
-        return MENU
-    elif text == get_message(lang, 'menu', 'cycle_analysis'):
-        from cycle_analysis import fetch_cycle_analysis
-        return await fetch_cycle_analysis(update, context)
-    elif text == "👥 Partner Menu" or text == "👥 منوی شریک":  # Direct text comparison
-        from partner import show_partner_menu
-        return await show_partner_menu(update, context)
-    elif text == get_message(lang, 'settings', 'menu'):
-        from settings import show_settings_menu
-        return await show_settings_menu(update, context)
-    elif text == get_message(lang, 'menu', 'logout'):
-        from auth import logout
-        return await logout(update, context)
-    
-    # Log unhandled menu option
-    logger.warning(f"Unhandled menu option: '{text}'")
-    return MENU
+    return await main_menu_router.dispatch(update, context, default=MENU)
 
 async def handle_initial_choice(update: Update, context: CallbackContext) -> int:
     """Handle the initial Register/Login choice."""
@@ -122,8 +151,7 @@ async def handle_initial_choice(update: Update, context: CallbackContext) -> int
     chat_id = str(update.message.chat_id)
     
     # Check if user is already logged in
-    user_tokens = context.bot_data.get('user_tokens', {})
-    if chat_id in user_tokens and "access" in user_tokens[chat_id]:
+    if get_token_store().get_access(chat_id):
         return await show_main_menu(update, context)
     
     if choice == get_message(lang, 'auth', 'register'):
@@ -0,0 +1,64 @@
+import logging
+import timeit
+from languages import LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+
+class MenuRouter:
+    """Dispatches reply-keyboard button texts to handlers with one dict lookup.
+
+    Every button is registered by its message key, and the text of that key in
+    every language is indexed up front, so dispatch cost does not depend on the
+    user's language or on the number of buttons in the menu.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._routes = {}
+
+    def add(self, category, key, action):
+        """Route the button text of a message key, in all languages, to action."""
+        for lang, messages in LANGUAGES.items():
+            self.add_text(messages[category][key], action)
+        return self
+
+    def add_text(self, text, action):
+        """Route a literal button text to action."""
+        existing = self._routes.get(text)
+        if existing is not None and existing is not action:
+            raise ValueError(f"{self.name}: button text '{text}' is already routed")
+        self._routes[text] = action
+        return self
+
+    def resolve(self, text):
+        """Return the action for a button text, or None."""
+        return self._routes.get(text)
+
+    async def dispatch(self, update, context, default):
+        """Run the action for the message text, or return default if there is none."""
+        action = self._routes.get(update.message.text)
+        if action is None:
+            logger.warning(f"Unhandled {self.name} option: '{update.message.text}'")
+            return default
+        return await action(update, context)
+
+    def __len__(self):
+        return len(self._routes)
+
+
+def benchmark_router(router, texts, number=100000):
+    """Return the average lookup time in nanoseconds over the given texts."""
+    resolve = router.resolve
+    elapsed = timeit.timeit(lambda: [resolve(text) for text in texts], number=number)
+    return elapsed / (number * len(texts)) * 1e9
+
+
+if __name__ == '__main__':
+    from menu_handlers import main_menu_router
+    from settings import settings_router
+    from partner import partner_router
+
+    for router in (main_menu_router, settings_router, partner_router):
+        texts = list(router._routes) + ["unknown text"]
+        print(f"{router.name}: {len(router)} texts, {benchmark_router(router, texts):.1f} ns/lookup")
@@ -0,0 +1,304 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+import httpx
+import config
+
+logger = logging.getLogger(__name__)
+
+# Running exposition server, see init_metrics
+_server = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{name}="{str(value)}"' for name, value in labels)
+    return '{' + inner + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple((name, labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[tuple((name, labels[name]) for name in self.labelnames)] = value
+
+    def value(self, **labels):
+        return self._values.get(tuple((name, labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile from the buckets (upper bound of the matching bucket)."""
+        series = self._values.get(tuple((name, labels[name]) for name in self.labelnames))
+        if not series or not series[-1]:
+            return None
+        rank = q * series[-1]
+        for i, bound in enumerate(self.buckets):
+            if series[i] >= rank:
+                return bound
+        return float('inf')
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self._values.items():
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {series[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # prefix -> function returning a dict of numeric stats
+        self._stats = {}
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, labelnames=()):
+        metric = Gauge(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix, stats_fn):
+        """Expose every numeric value of stats_fn() as a gauge named bot_<prefix>_<key>."""
+        self._stats[prefix] = stats_fn
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats_fn in self._stats.items():
+            try:
+                stats = stats_fn()
+            except Exception:
+                logger.error(f"Failed to collect {prefix} stats", exc_info=True)
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"bot_{prefix}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+handler_duration = registry.histogram(
+    'bot_handler_duration_seconds', 'Time spent in update handlers', ('handler',)
+)
+handler_total = registry.counter(
+    'bot_handler_total', 'Handled updates by handler and outcome', ('handler', 'outcome')
+)
+backend_duration = registry.histogram(
+    'bot_backend_request_duration_seconds', 'Backend request latency', ('method', 'endpoint')
+)
+backend_total = registry.counter(
+    'bot_backend_requests_total', 'Backend requests by status', ('method', 'endpoint', 'status')
+)
+
+
+def instrument(name, callback):
+    """Wrap a handler callback to record its duration and outcome."""
+    if getattr(callback, '_instrumented', False):
+        return callback
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - start, handler=name)
+            handler_total.inc(handler=name, outcome=outcome)
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def timed(name):
+    """Decorator form of instrument, for flows that are not registered handlers themselves."""
+    return lambda callback: instrument(name, callback)
+
+
+def _handler_tree(handler):
+    """Yield a handler and, for ConversationHandlers, every handler nested in it."""
+    from telegram.ext import ConversationHandler
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points:
+            yield from _handler_tree(child)
+        for state_handlers in handler.states.values():
+            for child in state_handlers:
+                yield from _handler_tree(child)
+        for child in handler.fallbacks:
+            yield from _handler_tree(child)
+    else:
+        yield handler
+
+
+def instrument_application(application):
+    """Instrument the callback of every handler registered on the application."""
+    count = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            for child in _handler_tree(handler):
+                callback = child.callback
+                name = getattr(callback, '__name__', type(callback).__name__)
+                child.callback = instrument(name, callback)
+                count += 1
+    logger.info(f"Instrumented {count} handlers")
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper that records every backend request."""
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            endpoint = request.url.path
+            backend_duration.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+            backend_total.inc(method=request.method, endpoint=endpoint, status=status)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+async def _serve_metrics(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Skip the request headers
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[1] == b'/metrics':
+            body = registry.render().encode()
+            status = b'200 OK'
+        else:
+            body = b'not found\n'
+            status = b'404 Not Found'
+        writer.write(
+            b'HTTP/1.1 ' + status + b'\r\n'
+            b'Content-Type: text/plain; version=0.0.4\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+def dump_metrics(path):
+    """Write the current metrics to a file, replacing it atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+async def _dump_metrics_job(context):
+    dump_metrics(context.job.data)
+
+
+async def init_metrics(application=None) -> None:
+    """Start the exposition endpoint and/or the dump job configured in config."""
+    global _server
+    if config.METRICS_PORT and _server is None:
+        _server = await asyncio.start_server(_serve_metrics, config.METRICS_HOST, config.METRICS_PORT)
+        logger.info(f"Metrics endpoint listening on {config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+    if config.METRICS_DUMP_PATH and application is not None and application.job_queue is not None:
+        application.job_queue.run_repeating(
+            _dump_metrics_job,
+            interval=config.METRICS_DUMP_INTERVAL,
+            data=config.METRICS_DUMP_PATH,
+            name="metrics_dump"
+        )
+        logger.info(f"Dumping metrics to {config.METRICS_DUMP_PATH} every {config.METRICS_DUMP_INTERVAL}s")
+
+
+async def close_metrics(application=None) -> None:
+    """Stop the exposition endpoint and write a final dump."""
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
+    if config.METRICS_DUMP_PATH:
+        dump_metrics(config.METRICS_DUMP_PATH)
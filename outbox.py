@@ -0,0 +1,275 @@
+import json
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from telegram.error import TelegramError
+from http_client import get_client
+from utils import get_access_token
+from token_refresh import token_subject
+from cache import invalidate_chat
+from languages import get_message
+from timing_wheel import recompute_user_timers
+import config
+
+logger = logging.getLogger(__name__)
+
+# Entry states; delivered entries are deleted
+PENDING = 'pending'
+REJECTED = 'rejected'
+# Given up because the user who added the cycle is no longer logged in
+ABANDONED = 'abandoned'
+
+# Client errors worth retrying: expired token, timeout, rate limited
+_RETRY_STATUSES = (401, 408, 429)
+
+
+class CycleOutbox:
+    """Durable queue of cycle submissions, persisted in SQLite.
+
+    A submission is committed to the outbox table before the user is told it
+    was saved, then posted to /api/periods/ right away in the background.
+    Failed attempts are retried by a repeating job with exponential backoff
+    and jitter, for as long as it takes. Every entry carries an idempotency
+    key sent as the Idempotency-Key header, so a retry after a lost response
+    does not create the cycle twice on a backend that honours it. Entries the
+    backend refuses (other 4xx) are kept as rejected and the user is told.
+
+    Each entry is bound to the user (JWT subject) logged in when it was
+    added and is only posted with a token of that user. While the chat is
+    logged out or logged in as someone else the entry waits, and is only
+    abandoned, telling the user, once it is OUTBOX_LOGIN_WAIT_HOURS old.
+    Logging in again retries the chat's waiting entries at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        # Entry ids with a delivery attempt running
+        self._in_flight = set()
+        self.stats = {'queued': 0, 'delivered': 0, 'retries': 0, 'rejected': 0, 'abandoned': 0}
+
+    def open(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                "chat_id TEXT NOT NULL, data TEXT NOT NULL, lang TEXT NOT NULL, timezone TEXT, "
+                "state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, created REAL NOT NULL, last_error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if 'subject' not in columns:
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN subject TEXT")
+        pending = self.pending_count()
+        if pending:
+            logger.info(f"Loaded {pending} undelivered cycle submissions")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def enqueue(self, chat_id, data, subject, lang='en', timezone=None):
+        """Store a submission of the user subject durably and return its entry."""
+        now = time.time()
+        entry = {
+            'key': uuid.uuid4().hex,
+            'chat_id': str(chat_id),
+            'subject': subject,
+            'data': data,
+            'lang': lang,
+            'timezone': timezone,
+            'attempts': 0,
+            'created': now
+        }
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (idempotency_key, chat_id, subject, data, lang, timezone, state, "
+                "next_attempt, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry['key'], entry['chat_id'], subject, json.dumps(data), lang, timezone, PENDING, now, now)
+            )
+        entry['id'] = cursor.lastrowid
+        self.stats['queued'] += 1
+        return entry
+
+    def pending_for_chat(self, chat_id):
+        """Number of submissions of a chat not delivered yet."""
+        if self._conn is None:
+            return 0
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE chat_id = ? AND state = ?", (str(chat_id), PENDING)
+        ).fetchone()[0]
+
+    def wake_chat(self, chat_id):
+        """Make the pending entries of a chat due now, e.g. when its user logs in again."""
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET next_attempt = ? WHERE chat_id = ? AND state = ?",
+                (time.time(), str(chat_id), PENDING)
+            )
+
+    def pending_count(self):
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE state = ?", (PENDING,)).fetchone()[0]
+
+    def _due_entries(self, limit):
+        rows = self._conn.execute(
+            "SELECT id, idempotency_key, chat_id, subject, data, lang, timezone, attempts, created FROM outbox "
+            "WHERE state = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+            (PENDING, time.time(), limit + len(self._in_flight))
+        )
+        entries = []
+        for entry_id, key, chat_id, subject, data, lang, timezone, attempts, created in rows:
+            if entry_id not in self._in_flight:
+                entries.append({
+                    'id': entry_id, 'key': key, 'chat_id': chat_id, 'subject': subject,
+                    'data': json.loads(data), 'lang': lang, 'timezone': timezone,
+                    'attempts': attempts, 'created': created
+                })
+        return entries[:limit]
+
+    def _backoff(self, attempts):
+        delay = min(config.OUTBOX_RETRY_MAX, config.OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+        # Jitter over the upper half of the delay spreads retries after an outage
+        return delay * random.uniform(0.5, 1.0)
+
+    def _reschedule(self, entry, error):
+        attempts = entry['attempts'] + 1
+        delay = self._backoff(attempts)
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, entry['id'])
+            )
+        self.stats['retries'] += 1
+        logger.warning(
+            f"Cycle submission {entry['key']} of chat {entry['chat_id']} failed ({error}), "
+            f"retry {attempts} in {delay:.0f}s"
+        )
+
+    async def deliver(self, bot, entry):
+        """Post one entry to the backend; reschedules it on failure."""
+        if entry['id'] in self._in_flight:
+            return
+        # Skip an entry read before another attempt delivered or rescheduled it
+        row = self._conn.execute(
+            "SELECT attempts FROM outbox WHERE id = ? AND state = ?", (entry['id'], PENDING)
+        ).fetchone()
+        if row is None or row[0] != entry['attempts']:
+            return
+        self._in_flight.add(entry['id'])
+        try:
+            await self._deliver(bot, entry)
+        finally:
+            self._in_flight.discard(entry['id'])
+
+    async def _tell(self, bot, entry, key):
+        try:
+            await bot.send_message(
+                entry['chat_id'], get_message(entry['lang'], 'cycle', key, entry['data'].get('start_date'))
+            )
+        except TelegramError as e:
+            logger.warning(f"Could not tell chat {entry['chat_id']} about cycle submission {entry['key']}: {e}")
+
+    async def _login_missing(self, bot, entry, error):
+        # Sessions can stay expired for a long time; wait for the user rather than count attempts
+        if time.time() - entry['created'] < config.OUTBOX_LOGIN_WAIT_HOURS * 3600:
+            self._reschedule(entry, error)
+            return
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, last_error = ? WHERE id = ?", (ABANDONED, error, entry['id'])
+            )
+        self.stats['abandoned'] += 1
+        logger.warning(f"Gave up cycle submission {entry['key']} of chat {entry['chat_id']}: {error}")
+        await self._tell(bot, entry, 'save_abandoned')
+
+    async def _deliver(self, bot, entry):
+        chat_id = entry['chat_id']
+        try:
+            access_token = await get_access_token(chat_id)
+            if not access_token:
+                await self._login_missing(bot, entry, 'not logged in')
+                return
+            # Never post a cycle under another account logged in on the same chat
+            if entry['subject'] is not None and token_subject(access_token) != entry['subject']:
+                await self._login_missing(bot, entry, 'logged in as another user')
+                return
+            response = await get_client().post(
+                '/api/periods/',
+                headers={
+                    'Authorization': f'Bearer {access_token}',
+                    'Idempotency-Key': entry['key']
+                },
+                data=entry['data']
+            )
+        except Exception as e:
+            self._reschedule(entry, f"{type(e).__name__}: {e}")
+            return
+
+        # 409: the backend already has a cycle with this idempotency key
+        if response.status_code in (200, 201, 409):
+            with self._conn:
+                self._conn.execute("DELETE FROM outbox WHERE id = ?", (entry['id'],))
+            self.stats['delivered'] += 1
+            # The cached history no longer includes every cycle
+            invalidate_chat(chat_id)
+            # Reschedule this user's notifications from the new history
+            await recompute_user_timers(chat_id, entry['lang'], entry['timezone'])
+        elif response.status_code >= 500 or response.status_code in _RETRY_STATUSES:
+            self._reschedule(entry, f"HTTP {response.status_code}")
+        else:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE outbox SET state = ?, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (REJECTED, f"HTTP {response.status_code}: {response.text[:200]}", entry['id'])
+                )
+            self.stats['rejected'] += 1
+            logger.error(f"Backend rejected cycle submission {entry['key']} of chat {chat_id}: {response.status_code}")
+            await self._tell(bot, entry, 'save_failed')
+
+    async def retry_due(self, context):
+        """Job: start deliveries of the entries whose retry time has come.
+
+        Runs at most OUTBOX_CONCURRENCY deliveries at a time, including those
+        started from submit_cycle; the job itself does not wait for them.
+        """
+        if self._conn is None:
+            return
+        free = config.OUTBOX_CONCURRENCY - len(self._in_flight)
+        if free <= 0:
+            return
+        for entry in self._due_entries(free):
+            context.application.create_task(self.deliver(context.bot, entry))
+
+    def outbox_stats(self):
+        return dict(self.stats, pending=self.pending_count(), in_flight=len(self._in_flight))
+
+
+cycle_outbox = CycleOutbox(config.PERSISTENCE_PATH)
+
+
+def schedule_outbox(application):
+    """Open the outbox and register the retry job."""
+    # An application built before in this process, e.g. by the benchmarks, may have left it open
+    cycle_outbox.close()
+    cycle_outbox.path = config.PERSISTENCE_PATH
+    cycle_outbox.open()
+    if application.job_queue is None:
+        logger.warning("JobQueue not available, failed cycle submissions are not retried")
+        return
+    application.job_queue.run_repeating(
+        cycle_outbox.retry_due,
+        interval=config.OUTBOX_RETRY_INTERVAL,
+        first=0,
+        name="outbox_retry"
+    )
+    logger.info(f"Scheduled cycle outbox retries every {config.OUTBOX_RETRY_INTERVAL}s")
@@ -1,9 +1,19 @@
+import asyncio
+import logging
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
-import httpx
-from config import BASE_URL
+from http_client import get_client
+from utils import get_access_token
 from states import MENU, PARTNER_MENU, PARTNER_MESSAGE
 from languages import get_message
+from menu_router import MenuRouter
+from cache import partner_cache
+from breaker import BackendBusy
+from period import iter_period_blocks, fit_block, TELEGRAM_MESSAGE_LIMIT
+from metrics import timed
+import config
+
+logger = logging.getLogger(__name__)
 
 async def show_partner_menu(update: Update, context: CallbackContext) -> int:
     """Display partner menu."""
@@ -24,80 +34,138 @@ async def show_partner_menu(update: Update, context: CallbackContext) -> int:
     )
     return PARTNER_MENU
 
-async def handle_partner_menu(update: Update, context: CallbackContext) -> int:
-    """Handle partner menu selections."""
-    text = update.message.text
+def partner_headers(access_token):
+    """Headers that make the backend answer with the partner's data."""
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "role": "partner"
+    }
+
+async def _get_json(client, path, headers):
+    response = await client.get(path, headers=headers)
+    if response.status_code != 200:
+        logger.warning(f"Partner request {path} failed: {response.status_code}")
+        return None
+    return response.json()
+
+async def load_partner_snapshot(chat_id, access_token):
+    """Return {'history', 'analysis'} of the chat's partner, or None if both failed.
+
+    Raises BackendBusy when both failed fast on an open circuit and no earlier
+    snapshot is left to serve instead.
+
+    Both are requested concurrently, so the snapshot costs one round trip, and
+    kept for PARTNER_CACHE_TTL seconds per pairing.
+    """
+    snapshot = partner_cache.get(chat_id)
+    if snapshot is not None:
+        return snapshot
+
+    client = get_client()
+    headers = partner_headers(access_token)
+    history, analysis = await asyncio.gather(
+        _get_json(client, "/api/periods/", headers),
+        _get_json(client, "/api/periods/cycle_analysis/", headers),
+        return_exceptions=True
+    )
+    busy = next((result for result in (history, analysis) if isinstance(result, BackendBusy)), None)
+    if isinstance(history, Exception):
+        logger.error(f"Error fetching partner history: {history}")
+        history = None
+    if isinstance(analysis, Exception):
+        logger.error(f"Error fetching partner analysis: {analysis}")
+        analysis = None
+    if history is None and analysis is None:
+        if busy is None:
+            return None
+        stale = partner_cache.get_stale(chat_id) if config.SERVE_STALE_WHEN_BUSY else None
+        if stale is not None:
+            return stale
+        raise busy
+
+    snapshot = {
+        'history': sorted(history, key=lambda x: x["start_date"], reverse=True) if history is not None else None,
+        'analysis': analysis.get('data') if analysis is not None else None
+    }
+    partner_cache.set(chat_id, snapshot)
+    return snapshot
+
+def format_partner_analysis(data):
+    """Format the partner analysis returned by the backend."""
+    return (
+        f"👥 *{data['partner_name']}'s Cycle Analysis*\n\n"
+        f"📅 Next Predicted Period: *{data['next_predicted_date']}*\n"
+        f"📊 Average Cycle Length: *{data['cycle_length_avg'] or 'Not enough data'}*\n"
+        f"🔄 Cycle Regularity: *{data['is_regular'] if data['is_regular'] is not None else 'Not enough data'}*\n"
+        f"📆 Last Period Start: *{data['last_period_start']}*\n"
+    )
+
+def render_partner_dashboard(snapshot, lang):
+    """Render the partner's analysis and most recent cycles as one message.
+
+    Shows as many of the recent cycles as fit in one message, oldest dropped first.
+    """
+    parts = []
+    if snapshot['analysis']:
+        parts.append(format_partner_analysis(snapshot['analysis']) + "\n")
+    history = snapshot['history']
+    if history:
+        parts.append(f"{get_message(lang, 'partner', 'recent_cycles')}\n\n")
+        length = sum(len(part) for part in parts)
+        shown = 0
+        for block in iter_period_blocks(history, lang, 0, config.PARTNER_HISTORY_CYCLES):
+            if length + len(block) > TELEGRAM_MESSAGE_LIMIT:
+                if shown:
+                    break
+                # A single oversized cycle is cut rather than skipped
+                block = fit_block(block, TELEGRAM_MESSAGE_LIMIT - length)
+            parts.append(block)
+            length += len(block)
+            shown += 1
+    elif history is not None:
+        parts.append(get_message(lang, 'errors', 'no_history'))
+    return ''.join(parts)
+
+async def _partner_snapshot_for(update, context):
+    """Load the snapshot for the chat, replying with an error when that is not possible."""
     lang = context.user_data.get('language', 'en')
-    
-    if text == get_message(lang, 'settings', 'back_to_main'):
-        from bot import show_main_menu
-        return await show_main_menu(update, context)
-    elif text == get_message(lang, 'partner', 'view_partner_cycles'):
-        return await view_partner_cycles(update, context)
-    elif text == get_message(lang, 'partner', 'partner_analysis'):
-        return await partner_analysis(update, context)
-    elif text == get_message(lang, 'partner', 'send_message'):
-        return await start_partner_message(update, context)
-    elif text == get_message(lang, 'partner', 'partner_notifications'):
-        return await partner_notifications(update, context)
-    elif text == get_message(lang, 'partner', 'partner_settings'):
-        return await partner_settings(update, context)
-    
-    return PARTNER_MENU
+    chat_id = str(update.message.chat_id)
+
+    access_token = await get_access_token(chat_id)
+    if not access_token:
+        await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
+        return None
+    try:
+        snapshot = await load_partner_snapshot(chat_id, access_token)
+    except BackendBusy:
+        await update.message.reply_text(get_message(lang, 'errors', 'service_busy'))
+        return None
+    except Exception as e:
+        logger.error(f"Error loading partner snapshot: {str(e)}")
+        snapshot = None
+    if snapshot is None:
+        await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
+    return snapshot
 
+@timed('view_partner_cycles')
 async def view_partner_cycles(update: Update, context: CallbackContext) -> int:
-    """View partner's cycle history."""
+    """View the partner's analysis and recent cycles in one message."""
     lang = context.user_data.get('language', 'en')
-    # Add API call to fetch partner's cycles
-    await update.message.reply_text(get_message(lang, 'partner', 'coming_soon'))
+    snapshot = await _partner_snapshot_for(update, context)
+    if snapshot is not None:
+        await update.message.reply_text(render_partner_dashboard(snapshot, lang), parse_mode="Markdown")
     return PARTNER_MENU
 
 async def partner_analysis(update: Update, context: CallbackContext) -> int:
     """View partner's cycle analysis."""
     lang = context.user_data.get('language', 'en')
-    chat_id = str(update.message.chat_id)
-    
-    # Get access token from user_tokens
-    from bot import user_tokens
-    if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
-        await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
+    snapshot = await _partner_snapshot_for(update, context)
+    if snapshot is None:
         return PARTNER_MENU
-        
-    access_token = user_tokens[chat_id]["access"]
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "role": "partner"
-    }
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{BASE_URL}/api/periods/cycle_analysis/",
-                headers=headers
-            )
-
-            if response.status_code == 200:
-                data = response.json()['data']
-                
-                # Format the partner analysis message
-                analysis_message = (
-                    f"👥 *{data['partner_name']}'s Cycle Analysis*\n\n"
-                    f"📅 Next Predicted Period: *{data['next_predicted_date']}*\n"
-                    f"📊 Average Cycle Length: *{data['cycle_length_avg'] or 'Not enough data'}*\n"
-                    f"🔄 Cycle Regularity: *{data['is_regular'] if data['is_regular'] is not None else 'Not enough data'}*\n"
-                    f"📆 Last Period Start: *{data['last_period_start']}*\n"
-                )
-                
-                await update.message.reply_text(
-                    analysis_message,
-                    parse_mode="Markdown"
-                )
-            else:
-                await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
-                
-    except Exception as e:
+    if snapshot['analysis']:
+        await update.message.reply_text(format_partner_analysis(snapshot['analysis']), parse_mode="Markdown")
+    else:
         await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
-        
     return PARTNER_MENU
 
 async def start_partner_message(update: Update, context: CallbackContext) -> int:
@@ -120,6 +188,24 @@ async def partner_settings(update: Update, context: CallbackContext) -> int:
     await update.message.reply_text(get_message(lang, 'partner', 'coming_soon'))
     return PARTNER_MENU
 
+async def _back_to_main(update: Update, context: CallbackContext) -> int:
+    from menu_handlers import show_main_menu
+    return await show_main_menu(update, context)
+
+partner_router = (
+    MenuRouter('partner menu')
+    .add('settings', 'back_to_main', _back_to_main)
+    .add('partner', 'view_partner_cycles', view_partner_cycles)
+    .add('partner', 'partner_analysis', partner_analysis)
+    .add('partner', 'send_message', start_partner_message)
+    .add('partner', 'partner_notifications', partner_notifications)
+    .add('partner', 'partner_settings', partner_settings)
+)
+
+async def handle_partner_menu(update: Update, context: CallbackContext) -> int:
+    """Handle partner menu selections."""
+    return await partner_router.dispatch(update, context, default=PARTNER_MENU)
+
 async def handle_partner_message(update: Update, context: CallbackContext) -> int:
     """Handle messages sent to partner."""
     text = update.message.text
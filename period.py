@@ -1,103 +1,254 @@
+import logging
 import httpx
-from utils import load_tokens
-from config import BASE_URL
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from utils import refresh_token, get_access_token
+from http_client import get_client
+from cache import history_cache
+from breaker import BackendBusy
 from datetime import datetime
-from languages import get_message, SYMPTOM_OPTIONS, MEDICATION_OPTIONS
+from languages import get_message, TRANSLATIONS_TO
+import config
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
 
 def translate_items(items_str: str, lang: str) -> str:
-    """Translate symptoms or medications from English to the target language"""
-    if not items_str or lang == 'en':
+    """Translate comma-separated symptoms or medications into the target language"""
+    if not items_str:
         return items_str
-        
-    # Create translation dictionaries from SYMPTOM_OPTIONS and MEDICATION_OPTIONS
-    translations = {}
+    translations = TRANSLATIONS_TO.get(lang)
+    if not translations:
+        return items_str
+    # Use original if no translation
+    return ', '.join(translations.get(item, item) for item in (part.strip() for part in items_str.split(',')))
+
+def translate_history(periods, lang: str) -> list:
+    """Translate symptoms and medications of a whole history in one pass.
+
+    Returns (symptoms, medications) per period, in order. Each distinct item
+    string is translated only once, since histories repeat the same values.
+    """
+    translated = {}
+    result = []
+    for period in periods:
+        pair = []
+        for field in ('symptoms', 'medication'):
+            value = period.get(field)
+            if value not in translated:
+                translated[value] = translate_items(value, lang)
+            pair.append(translated[value])
+        result.append(tuple(pair))
+    return result
+
+async def load_periods(chat_id, access_token):
+    """Return the chat's period list, served from the history cache when possible.
+
+    When the backend is unavailable an expired cached history is served if
+    there is one. Otherwise returns None if the request fails, or raises
+    BackendBusy while the backend's circuit is open.
+    """
+    periods = history_cache.get(chat_id)
+    if periods is not None:
+        return periods
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    
+    client = get_client()
+    try:
+        response = await client.get("/api/periods/", headers=headers)
+
+        if response.status_code == 401:  # Token expired
+            new_token = await refresh_token(chat_id)
+            if new_token:
+                headers["Authorization"] = f"Bearer {new_token}"
+                response = await client.get("/api/periods/", headers=headers)
+    except httpx.HTTPError as e:
+        # Busy, over its latency budget or unreachable: better an outdated
+        # history than none while the backend recovers
+        stale = history_cache.get_stale(chat_id) if config.SERVE_STALE_WHEN_BUSY else None
+        if stale is not None:
+            return stale
+        if isinstance(e, BackendBusy):
+            raise
+        logger.warning(f"History request error for chat {chat_id}: {str(e)}")
+        return None
+
+    if response.status_code != 200:
+        return None
+
+    # Newest first, the order the history is shown in
+    periods = sorted(response.json(), key=lambda x: x["start_date"], reverse=True)
+    history_cache.set(chat_id, periods)
+    return periods
+
+def format_period(period, idx, symptoms, medications, lang):
+    """Format one cycle of the history"""
+    # Add RTL mark for Persian
+    rtl_mark = '\u200F' if lang == 'fa' else ''
+    ltr_mark = '\u200E' if lang == 'fa' else ''
     
-    # Add symptom translations
-    for en_list, fa_list in zip(SYMPTOM_OPTIONS['en'], SYMPTOM_OPTIONS['fa']):
-        for en, fa in zip(en_list, fa_list):
-            if en not in ['Write Custom Symptoms', 'Done']:
-                translations[en] = fa
-                
-    # Add medication translations
-    for en_list, fa_list in zip(MEDICATION_OPTIONS['en'], MEDICATION_OPTIONS['fa']):
-        for en, fa in zip(en_list, fa_list):
-            if en not in ['Write Custom Medication', 'Done']:
-                translations[en] = fa
+    start_date = period["start_date"]
+    end_date = period["end_date"]
+    predicted_end_date = period.get("predicted_end_date")
     
-    # Split items and translate each one
-    items = [item.strip() for item in items_str.split(',')]
-    translated_items = []
+    symptoms = symptoms or get_message(lang, 'period_history', 'none_noted')
+    medications = medications or get_message(lang, 'period_history', 'none_taken')
     
-    for item in items:
-        translated_items.append(translations.get(item, item))  # Use original if no translation
-        
-    return ', '.join(translated_items)
+    if lang == 'fa':
+        symptoms = f"{rtl_mark}{symptoms}"
+        medications = f"{rtl_mark}{medications}"
+    
+    return (
+        f"{rtl_mark}{get_message(lang, 'period_history', 'cycle', idx)}\n"
+        f"┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈\n\n"
+        f"{rtl_mark}🗓 {ltr_mark}*{start_date}* → *{end_date}*\n"
+        f"{rtl_mark}{get_message(lang, 'period_history', 'predicted')}: {ltr_mark}*{predicted_end_date}*\n"
+        f"{rtl_mark}{get_message(lang, 'period_history', 'duration')}: {ltr_mark}*{calculate_duration(start_date, end_date, lang)}*{rtl_mark}{get_message(lang, 'period_history', 'days')}\n\n"
+        f"{rtl_mark}{get_message(lang, 'period_history', 'symptoms_title')}\n"
+        f"{rtl_mark}• {symptoms}\n\n"
+        f"{rtl_mark}{get_message(lang, 'period_history', 'medicine_title')}\n"
+        f"{rtl_mark}• {medications}\n\n"
+        f"•°•°•°•°•°•°•°•°•°\n\n"
+    )
+
+def iter_period_blocks(periods, lang, start=0, count=None):
+    """Yield formatted cycles of the sorted history, starting at index start."""
+    stop = len(periods) if count is None else min(len(periods), start + count)
+    page = periods[start:stop]
+    # Translate symptoms and medications of the visible cycles only
+    for offset, (period, (symptoms, medications)) in enumerate(zip(page, translate_history(page, lang))):
+        yield format_period(period, start + offset + 1, symptoms, medications, lang)
+
+def fit_block(block, room):
+    """Cut a formatted block to at most room characters at a line boundary.
 
+    Every Markdown pair of a block is on one line, so the cut never leaves
+    one open.
+    """
+    if len(block) <= room:
+        return block
+    return block[:block.rfind('\n', 0, room) + 1]
+
+def render_history_page(periods, lang, start=0):
+    """Render the page beginning at start.
+
+    Page k holds the cycles from k * HISTORY_PAGE_SIZE on. When they do not
+    fit in one message the page stops early and its remaining cycles follow,
+    under the same page number, starting at the returned offset. So page
+    numbers and page starts stay the same however long the cycles are.
+    Returns (text, start of the next page).
+    """
+    page_size = config.HISTORY_PAGE_SIZE
+    total_pages = (len(periods) + page_size - 1) // page_size
+    header = (
+        f"{get_message(lang, 'period_history', 'title')}\n"
+        f"{get_message(lang, 'period_history', 'page', start // page_size + 1, total_pages)}\n\n"
+    )
+    parts = [header]
+    length = len(header)
+    next_start = start
+    for block in iter_period_blocks(periods, lang, start, page_size - start % page_size):
+        if length + len(block) > TELEGRAM_MESSAGE_LIMIT:
+            if next_start > start:
+                break
+            # A single oversized cycle is cut rather than skipped
+            block = fit_block(block, TELEGRAM_MESSAGE_LIMIT - length)
+        parts.append(block)
+        length += len(block)
+        next_start += 1
+    return ''.join(parts), next_start
+
+def previous_page_start(start):
+    """Start of the page ◀ leads to: the beginning of this page, or of the page before it."""
+    page_size = config.HISTORY_PAGE_SIZE
+    if start % page_size:
+        return start - start % page_size
+    return max(0, start - page_size)
+
+def history_keyboard(start, next_start, total, back=None):
+    """Inline ◀/▶ buttons for the history page, or None for a single page.
+
+    The callback data is "history_<start>_<back>": the offset of the page to
+    show and that of the page its ◀ leads to, so ▶ then ◀ returns to exactly
+    the page the user came from.
+    """
+    buttons = []
+    if start > 0:
+        target = previous_page_start(start) if back is None else back
+        buttons.append(InlineKeyboardButton(
+            "◀", callback_data=f"history_{target}_{previous_page_start(target)}"
+        ))
+    if next_start < total:
+        buttons.append(InlineKeyboardButton("▶", callback_data=f"history_{next_start}_{start}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+@timed('fetch_periods')
 async def fetch_periods(update, context):
-    """Fetch and display period history"""
+    """Fetch and display the first page of the period history"""
     lang = context.user_data.get('language', 'en')
     chat_id = str(update.message.chat_id)
     
-    # Get access token from user_tokens
-    from bot import user_tokens
-    if chat_id not in user_tokens or "access" not in user_tokens[chat_id]:
+    # Get access token from the token store
+    access_token = await get_access_token(chat_id)
+    if not access_token:
         await update.message.reply_text(get_message(lang, 'auth', 'login_required'))
         return
         
-    access_token = user_tokens[chat_id]["access"]
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{BASE_URL}/api/periods/", headers=headers)
+    try:
+        periods = await load_periods(chat_id, access_token)
+    except BackendBusy:
+        await update.message.reply_text(get_message(lang, 'errors', 'service_busy'))
+        return
 
-        if response.status_code == 401:  # Token expired
-            new_token = await refresh_token(chat_id, user_tokens)
-            if new_token:
-                headers["Authorization"] = f"Bearer {new_token}"
-                response = await client.get(f"{BASE_URL}/api/periods/", headers=headers)
-
-        if response.status_code == 200:
-            periods = response.json()
-            
-            if not periods:
-                await update.message.reply_text(get_message(lang, 'errors', 'no_history'))
-                return
-            
-            # Add RTL mark for Persian
-            rtl_mark = '\u200F' if lang == 'fa' else ''
-            ltr_mark = '\u200E' if lang == 'fa' else ''
-            
-            formatted_periods = f"{get_message(lang, 'period_history', 'title')}\n\n"
-            
-            for idx, period in enumerate(sorted(periods, key=lambda x: x["start_date"], reverse=True), start=1):
-                start_date = period["start_date"]
-                end_date = period["end_date"]
-                predicted_end_date = period.get("predicted_end_date")
-                
-                # Translate symptoms and medications
-                symptoms = translate_items(period['symptoms'], lang) if period['symptoms'] else get_message(lang, 'period_history', 'none_noted')
-                medications = translate_items(period['medication'], lang) if period['medication'] else get_message(lang, 'period_history', 'none_taken')
-                
-                if lang == 'fa':
-                    symptoms = f"{rtl_mark}{symptoms}"
-                    medications = f"{rtl_mark}{medications}"
-                
-                formatted_periods += (
-                    f"{rtl_mark}{get_message(lang, 'period_history', 'cycle', idx)}\n"
-                    f"┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈\n\n"
-                    f"{rtl_mark}🗓 {ltr_mark}*{start_date}* → *{end_date}*\n"
-                    f"{rtl_mark}{get_message(lang, 'period_history', 'predicted')}: {ltr_mark}*{predicted_end_date}*\n"
-                    f"{rtl_mark}{get_message(lang, 'period_history', 'duration')}: {ltr_mark}*{calculate_duration(start_date, end_date, lang)}*{rtl_mark}{get_message(lang, 'period_history', 'days')}\n\n"
-                    f"{rtl_mark}{get_message(lang, 'period_history', 'symptoms_title')}\n"
-                    f"{rtl_mark}• {symptoms}\n\n"
-                    f"{rtl_mark}{get_message(lang, 'period_history', 'medicine_title')}\n"
-                    f"{rtl_mark}• {medications}\n\n"
-                    f"•°•°•°•°•°•°•°•°•°\n\n"
-                )
-
-            await update.message.reply_text(formatted_periods, parse_mode="Markdown")
-        else:
-            await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
+    if periods is None:
+        await update.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
+        return
+    if not periods:
+        await update.message.reply_text(get_message(lang, 'errors', 'no_history'))
+        return
+
+    text, next_start = render_history_page(periods, lang)
+    await update.message.reply_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=history_keyboard(0, next_start, len(periods))
+    )
+
+async def handle_history_page(update, context):
+    """Show another history page by editing the message the ◀/▶ buttons belong to"""
+    query = update.callback_query
+    await query.answer()
+    lang = context.user_data.get('language', 'en')
+    chat_id = str(query.message.chat_id)
+    # "history_<start>", from messages sent before the ◀ target was included, or "history_<start>_<back>"
+    offsets = [int(offset) for offset in query.data.split('_')[1:]]
+    start = offsets[0]
+    back = offsets[1] if len(offsets) > 1 else None
+
+    access_token = await get_access_token(chat_id)
+    if not access_token:
+        await query.message.reply_text(get_message(lang, 'auth', 'login_required'))
+        return
+    try:
+        periods = await load_periods(chat_id, access_token)
+    except BackendBusy:
+        await query.message.reply_text(get_message(lang, 'errors', 'service_busy'))
+        return
+    if not periods:
+        await query.message.reply_text(get_message(lang, 'errors', 'fetch_failed'))
+        return
+
+    start = min(start, len(periods) - 1)
+    if back is not None and back >= start:
+        back = None
+    text, next_start = render_history_page(periods, lang, start)
+    await query.edit_message_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=history_keyboard(start, next_start, len(periods), back)
+    )
 
 def calculate_duration(start_date, end_date, lang):
     """Calculate the duration between start and end date"""
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# user_data keys that must never be written to disk
+TRANSIENT_USER_KEYS = ('password',)
+# Registration answers given alongside the password. Stored without it they
+# would fail the last step after a restart, so the registration starts over
+REGISTRATION_KEYS = ('registration_step', 'username', 'email')
+REGISTRATION_RESTARTED = 'restarted'
+
+
+class SqlitePersistence(BasePersistence):
+    """PTB persistence backed by SQLite.
+
+    user_data and chat_data are loaded lazily the first time a user or chat
+    sends an update (through refresh_user_data/refresh_chat_data), so startup
+    does not read every stored user. Changes handed over by the application on
+    each update_interval run are buffered and written in one transaction.
+    """
+
+    def __init__(self, path, update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, "
+                "PRIMARY KEY (name, key))"
+            )
+        self._loaded = {'user_data': set(), 'chat_data': set()}
+        # (table, id) -> serialized data, or None to delete the row
+        self._pending = {}
+        self._pending_conversations = {}
+        self._bot_data_json = None
+        self._commit_scheduled = False
+        self.stats = {'batches': 0, 'rows_written': 0, 'lazy_loads': 0}
+
+    # Loading
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        row = self._conn.execute("SELECT data FROM bot_data WHERE id = 0").fetchone()
+        if row is None:
+            return {}
+        self._bot_data_json = row[0]
+        return json.loads(row[0])
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        conversations = {}
+        for key, state in self._conn.execute(
+            "SELECT key, state FROM conversations WHERE name = ?", (name,)
+        ):
+            conversations[tuple(json.loads(key))] = json.loads(state)
+        logger.info(f"Loaded {len(conversations)} persisted states for conversation {name}")
+        return conversations
+
+    def _load(self, table, key, data):
+        if key in self._loaded[table]:
+            return
+        self._loaded[table].add(key)
+        # Pending writes are newer than what is on disk
+        if (table, key) in self._pending:
+            return
+        row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self.stats['lazy_loads'] += 1
+        for name, value in json.loads(row[0]).items():
+            data.setdefault(name, value)
+
+    async def refresh_user_data(self, user_id, user_data):
+        self._load('user_data', user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        self._load('chat_data', chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def stored_user_data(self, user_id):
+        """Return the user_data of a user as last stored, without loading it into the application."""
+        if ('user_data', user_id) in self._pending:
+            data = self._pending[('user_data', user_id)]
+            return json.loads(data) if data is not None else {}
+        row = self._conn.execute("SELECT data FROM user_data WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    # Buffered writes
+
+    def _schedule_commit(self):
+        if self._commit_scheduled:
+            return
+        self._commit_scheduled = True
+        # The application hands over all dirty entries of a run together, so
+        # committing on the next loop iteration writes them as one batch
+        asyncio.get_running_loop().call_soon(self._commit)
+
+    def _commit(self):
+        self._commit_scheduled = False
+        if not self._pending and not self._pending_conversations:
+            return
+        pending, self._pending = self._pending, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        try:
+            with self._conn:
+                for (table, key), data in pending.items():
+                    if data is None:
+                        self._conn.execute(f"DELETE FROM {table} WHERE id = ?", (key,))
+                    else:
+                        self._conn.execute(
+                            f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", (key, data)
+                        )
+                for (name, key), state in conversations.items():
+                    if state is None:
+                        self._conn.execute(
+                            "DELETE FROM conversations WHERE name = ? AND key = ?", (name, key)
+                        )
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                            (name, key, state)
+                        )
+        except sqlite3.Error:
+            logger.error("Failed to write persistence batch", exc_info=True)
+            # Keep the batch for the next run unless newer data arrived meanwhile
+            for item, data in pending.items():
+                self._pending.setdefault(item, data)
+            for item, state in conversations.items():
+                self._pending_conversations.setdefault(item, state)
+            return
+        self.stats['batches'] += 1
+        self.stats['rows_written'] += len(pending) + len(conversations)
+
+    async def update_conversation(self, name, key, new_state):
+        state = None if new_state is None else json.dumps(new_state)
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_commit()
+
+    async def update_user_data(self, user_id, data):
+        self._loaded['user_data'].add(user_id)
+        stored = {key: value for key, value in data.items() if key not in TRANSIENT_USER_KEYS}
+        if 'password' in data:
+            for key in REGISTRATION_KEYS:
+                stored.pop(key, None)
+            stored['registration_step'] = REGISTRATION_RESTARTED
+        self._pending[('user_data', user_id)] = json.dumps(stored)
+        self._schedule_commit()
+
+    async def update_chat_data(self, chat_id, data):
+        self._loaded['chat_data'].add(chat_id)
+        self._pending[('chat_data', chat_id)] = json.dumps(data)
+        self._schedule_commit()
+
+    async def update_bot_data(self, data):
+        data = json.dumps(data)
+        if data == self._bot_data_json:
+            return
+        self._bot_data_json = data
+        self._pending[('bot_data', 0)] = data
+        self._schedule_commit()
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._pending[('user_data', user_id)] = None
+        self._schedule_commit()
+
+    async def drop_chat_data(self, chat_id):
+        self._pending[('chat_data', chat_id)] = None
+        self._schedule_commit()
+
+    async def flush(self):
+        self._commit()
+        self._conn.close()
+        logger.info("Persistence flushed")
+
+
+def user_data_of(application, user_id):
+    """Return the user_data of a user, also outside of their updates.
+
+    user_data is only loaded when a user sends an update, so after a restart
+    jobs would otherwise see an empty dict for everyone who has not written
+    since. Read-only: changes to the returned dict are not stored.
+    """
+    if user_id in application.user_data:
+        return application.user_data[user_id]
+    if isinstance(application.persistence, SqlitePersistence):
+        return application.persistence.stored_user_data(user_id)
+    return {}
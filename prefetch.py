@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from cache import history_cache, analysis_cache
+from period import load_periods
+from cycle_analysis import load_cycle_analysis
+from token_store import get_token_store
+from utils import get_access_token
+import config
+
+logger = logging.getLogger(__name__)
+
+HISTORY = 'history'
+ANALYSIS = 'analysis'
+# kind -> (cache the lookup reads, loader filling it)
+PREFETCH_KINDS = {
+    HISTORY: (history_cache, load_periods),
+    ANALYSIS: (analysis_cache, load_cycle_analysis),
+}
+
+
+class MenuPrefetcher:
+    """Warms the history and analysis caches of a chat while the main menu is on screen.
+
+    View History and Cycle Analysis, the usual next taps, are each prefetched
+    as their own task into the cache the tap reads, so a tap waits only for
+    its own data. At most PREFETCH_CONCURRENCY prefetches run at a time;
+    beyond that they are skipped rather than queued. A user tapping while a
+    prefetch is in flight waits for it instead of sending a second request.
+
+    A prefetched entry counts as a hit when the user asks for it while it is
+    still cached, so the tap is served from it, and as wasted when it
+    expires, is dropped or the user logs out first.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        # (chat_id, kind) -> task
+        self._tasks = {}
+        # (chat_id, kind) of prefetched entries the user has not asked for yet, oldest first
+        self._unclaimed = OrderedDict()
+        self.stats = {
+            'started': 0, 'fetched': 0, 'failed': 0, 'skipped': 0,
+            'cancelled': 0, 'joined': 0, 'hits': 0, 'wasted': 0
+        }
+
+    def prefetch(self, application, chat_id):
+        """Start background prefetches for a logged-in chat unless nothing is to gain."""
+        if not get_token_store().get_access(chat_id):
+            return
+        for kind, (cache, _) in PREFETCH_KINDS.items():
+            key = (chat_id, kind)
+            if key in self._tasks or chat_id in cache:
+                continue
+            self._drop_unclaimed(key)
+            if len(self._tasks) >= self.limit:
+                self.stats['skipped'] += 1
+                continue
+            self.stats['started'] += 1
+            self._tasks[key] = application.create_task(self._run(key))
+
+    async def _run(self, key):
+        task = asyncio.current_task()
+        chat_id, kind = key
+        try:
+            access_token = await get_access_token(chat_id)
+            if access_token and await PREFETCH_KINDS[kind][1](chat_id, access_token) is not None:
+                self.stats['fetched'] += 1
+                self._unclaimed[key] = True
+                if len(self._unclaimed) > config.HISTORY_CACHE_SIZE:
+                    self._unclaimed.popitem(last=False)
+                    self.stats['wasted'] += 1
+            else:
+                self.stats['failed'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.warning(f"Prefetch of the {kind} of chat {chat_id} failed: {str(e)}")
+        finally:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def _drop_unclaimed(self, key):
+        if self._unclaimed.pop(key, None):
+            self.stats['wasted'] += 1
+
+    async def claim(self, chat_id, kind):
+        """Called before the user's own lookup of kind: joins a running prefetch and counts hits."""
+        key = (chat_id, kind)
+        task = self._tasks.get(key)
+        if task is not None:
+            self.stats['joined'] += 1
+            # wait() does not propagate the prefetch's result or cancellation
+            await asyncio.wait({task})
+        if self._unclaimed.pop(key, None):
+            if chat_id in PREFETCH_KINDS[kind][0]:
+                self.stats['hits'] += 1
+            else:
+                self.stats['wasted'] += 1
+
+    def cancel(self, chat_id):
+        """Stop the running prefetches of a chat, e.g. on logout."""
+        for kind in PREFETCH_KINDS:
+            key = (chat_id, kind)
+            task = self._tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+                self.stats['cancelled'] += 1
+            self._drop_unclaimed(key)
+
+    def prefetch_stats(self):
+        used = self.stats['hits'] + self.stats['wasted']
+        return dict(
+            self.stats,
+            in_flight=len(self._tasks),
+            hit_rate=round(self.stats['hits'] / used, 3) if used else 0.0
+        )
+
+
+menu_prefetcher = MenuPrefetcher(config.PREFETCH_CONCURRENCY)
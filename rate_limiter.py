@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priorities, passed as rate_limit_args={'priority': BULK} by bulk senders
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# Number of idle per-chat buckets after which fully refilled ones are dropped
+_CHAT_BUCKET_PRUNE_SIZE = 10000
+
+
+def bulk_send_kwargs(bot):
+    """Keyword arguments marking a Bot API call as a bulk send.
+
+    PTB rejects rate_limit_args when no rate limiter is configured, so they are
+    only passed when one is.
+    """
+    if getattr(bot, 'rate_limiter', None) is None:
+        return {}
+    return {'rate_limit_args': {'priority': BULK}}
+
+
+class SendDropped(TelegramError):
+    """Raised for a bulk send that was dropped because the bulk queue is full."""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Keeps outgoing messages within Telegram's global and per-chat limits.
+
+    Requests addressed to a chat first wait for that chat's token bucket and
+    then queue for the global bucket, which a single dispatcher hands out,
+    serving interactive replies before bulk sends. A RetryAfter from Telegram
+    pauses all sending for the requested time and the request is retried.
+    Requests without a chat (getUpdates, getMe, answerCallbackQuery...) are not
+    limited.
+    """
+
+    def __init__(self, global_rate=30, global_burst=30, chat_rate=1, chat_burst=3,
+                 max_retries=3, max_bulk_queue=10000):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_bulk_queue = max_bulk_queue
+        self._chat_buckets = {}
+        self._queues = {INTERACTIVE: deque(), BULK: deque()}
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self.stats = {'sent': 0, 'retries': 0, 'dropped': 0, 'retry_after': 0, 'peak_queued': 0}
+
+    async def initialize(self):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self._queues.values():
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.cancel()
+
+    def queue_stats(self):
+        """Return counters plus the current depth of both queues."""
+        return dict(
+            self.stats,
+            queued_interactive=len(self._queues[INTERACTIVE]),
+            queued_bulk=len(self._queues[BULK]),
+            chats=len(self._chat_buckets)
+        )
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queues[INTERACTIVE] or self._queues[BULK]:
+                wait = max(self.global_bucket.wait_time(), self._paused_until - time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                future = self._next_waiter()
+                if future is not None:
+                    self.global_bucket.take()
+                    future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in (INTERACTIVE, BULK):
+            queue = self._queues[priority]
+            while queue:
+                future = queue.popleft()
+                # Skip requests cancelled while they were waiting
+                if not future.done():
+                    return future
+        return None
+
+    async def _acquire_global(self, priority, retry=False):
+        queue = self._queues[priority]
+        if priority == BULK and not retry and len(queue) >= self.max_bulk_queue:
+            self.stats['dropped'] += 1
+            raise SendDropped("Bulk send queue is full")
+        future = asyncio.get_running_loop().create_future()
+        # Retried requests go first, they have already waited once
+        if retry:
+            queue.appendleft(future)
+        else:
+            queue.append(future)
+        queued = len(self._queues[INTERACTIVE]) + len(self._queues[BULK])
+        self.stats['peak_queued'] = max(self.stats['peak_queued'], queued)
+        self._wakeup.set()
+        await future
+
+    async def _acquire_chat(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= _CHAT_BUCKET_PRUNE_SIZE:
+                self._prune_chat_buckets()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        while True:
+            wait = bucket.wait_time()
+            if not wait:
+                bucket.take()
+                return
+            await asyncio.sleep(wait)
+
+    def _prune_chat_buckets(self):
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_full()]:
+            del self._chat_buckets[chat_id]
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = (rate_limit_args or {}).get('priority', INTERACTIVE)
+        await self._acquire_chat(chat_id)
+        await self._acquire_global(priority)
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats['sent'] += 1
+                return result
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                delay = exc.retry_after.total_seconds() if hasattr(exc.retry_after, 'total_seconds') \
+                    else float(exc.retry_after)
+                self.stats['retry_after'] += 1
+                self.stats['retries'] += 1
+                logger.warning(f"Telegram asked to retry {endpoint} after {delay}s, pausing sends")
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await self._acquire_global(priority, retry=True)
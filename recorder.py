@@ -0,0 +1,174 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+from telegram import Update
+from telegram.ext import TypeHandler, ConversationHandler
+from languages import LANGUAGES, SYMPTOM_OPTIONS, MEDICATION_OPTIONS
+from token_store import get_token_store
+import config
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Keys holding a Telegram user or chat whose ids are hashed
+_PARTY_KEYS = ('chat', 'from', 'user', 'sender_chat', 'forward_from', 'forward_from_chat')
+# Personal fields of users and chats that are replaced
+_NAME_FIELDS = ('first_name', 'last_name', 'username', 'title', 'bio')
+# Fields that are dropped from recorded updates altogether
+_DROPPED_FIELDS = ('contact', 'location', 'venue', 'photo', 'document', 'voice', 'video', 'caption')
+
+
+def _collect_texts(value, texts):
+    if isinstance(value, str):
+        texts.add(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_texts(item, texts)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect_texts(item, texts)
+    return texts
+
+
+# Texts users can send by tapping a button. Everything else a user types
+# (usernames, passwords, emails, custom symptoms, codes) is never recorded as is.
+KNOWN_TEXTS = frozenset(_collect_texts(
+    [LANGUAGES, SYMPTOM_OPTIONS, MEDICATION_OPTIONS, 'male', 'female', '👥 Partner Menu', '👥 منوی شریک'],
+    set()
+))
+
+
+class UpdateRecorder:
+    """Appends anonymized incoming updates to a JSONL file for later replay.
+
+    Chat and user ids are replaced by a keyed hash, so one person keeps the
+    same id within a recording without the real id being stored. Names are
+    replaced and free text is scrubbed: only button texts and commands are
+    kept, emails become a placeholder address and anything else a fixed
+    placeholder, so passwords and emails never reach the file.
+
+    The first update of each chat also carries the chat's session when the
+    recording started: whether it was logged in, its language and its
+    conversation states, so a replay can put the chat back where it was.
+    """
+
+    def __init__(self, path, salt=None, conversations=()):
+        self.path = path
+        self.conversations = list(conversations)
+        self._seen_chats = set()
+        self._key = (salt or os.urandom(16).hex()).encode()
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        self._started = time.monotonic()
+        self.recorded = 0
+
+    def anonymize_id(self, value):
+        digest = hmac.new(self._key, str(value).encode(), hashlib.sha256).digest()
+        # Keep ids positive integers that fit Telegram's 52 bit id space
+        return int.from_bytes(digest[:6], 'big')
+
+    def scrub_text(self, text):
+        if text in KNOWN_TEXTS:
+            return text
+        if text.startswith('/'):
+            # Keep the command, drop the bot name and any arguments
+            return text.split()[0].split('@', 1)[0]
+        if EMAIL_PATTERN.match(text.strip()):
+            return 'user@example.com'
+        return 'redacted'
+
+    def _anonymize(self, value, key=None):
+        if isinstance(value, list):
+            return [self._anonymize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for name, item in value.items():
+            if name in _DROPPED_FIELDS:
+                continue
+            if name in _NAME_FIELDS and isinstance(item, str):
+                result[name] = 'redacted'
+            elif name == 'id' and key in _PARTY_KEYS:
+                result[name] = self.anonymize_id(item)
+            elif name == 'text' and isinstance(item, str):
+                result[name] = self.scrub_text(item)
+            elif name in ('entities', 'caption_entities'):
+                # Offsets would no longer match the scrubbed text
+                continue
+            else:
+                result[name] = self._anonymize(item, name)
+        if result.get('text', '').startswith('/') and 'entities' in value:
+            result['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(result['text'])}]
+        return result
+
+    def anonymize(self, update):
+        """Return the update as an anonymized dict."""
+        return self._anonymize(update.to_dict())
+
+    def session(self, update, context):
+        """Describe the state the chat of an update is in before the update is handled."""
+        states = {}
+        for handler in self.conversations:
+            # Keys are built from the real ids, the replay rebuilds them from the anonymized ones
+            try:
+                state = handler._conversations.get(handler._get_key(update))
+            except RuntimeError:
+                # No user or chat to build the key from
+                continue
+            if state is not None:
+                states[handler.name] = state
+        return {
+            'logged_in': update.effective_chat.id in get_token_store(),
+            'language': (context.user_data or {}).get('language'),
+            'conversations': states
+        }
+
+    async def record(self, update, context):
+        record = {
+            't': round(time.monotonic() - self._started, 4),
+            'update': self.anonymize(update)
+        }
+        chat = update.effective_chat
+        if chat is not None and chat.id not in self._seen_chats:
+            self._seen_chats.add(chat.id)
+            record['session'] = self.session(update, context)
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.recorded += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"Recorded {self.recorded} updates to {self.path}")
+
+
+_recorder = None
+
+
+def start_recording(application):
+    """Record every incoming update if config.UPDATE_RECORDING_PATH is set."""
+    global _recorder
+    if not config.UPDATE_RECORDING_PATH:
+        return None
+    conversations = [
+        handler for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, ConversationHandler)
+    ]
+    _recorder = UpdateRecorder(
+        config.UPDATE_RECORDING_PATH, config.UPDATE_RECORDING_SALT or None, conversations
+    )
+    # A negative group runs before the real handlers and does not stop them
+    application.add_handler(TypeHandler(Update, _recorder.record), group=-1)
+    logger.info(f"Recording anonymized updates to {config.UPDATE_RECORDING_PATH}")
+    return _recorder
+
+
+async def stop_recording(application=None) -> None:
+    """Close the recording file. Used from the application's post_shutdown hook."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
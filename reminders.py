@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta, time as dt_time
+from zoneinfo import ZoneInfo
+from telegram.error import Forbidden, BadRequest
+from token_store import get_token_store
+from utils import get_access_token
+from cache import history_cache
+from local_analysis import analyze_periods
+from cycle_analysis import request_cycle_analysis
+from languages import get_message
+from rate_limiter import bulk_send_kwargs, SendDropped
+from timing_wheel import notification_scheduler, BEFORE_PERIOD
+from persistence import user_data_of
+from settings import user_timezone
+import config
+
+logger = logging.getLogger(__name__)
+
+# Counters over all runs, plus the duration of the last one
+reminder_stats = {'runs': 0, 'checked': 0, 'due': 0, 'sent': 0, 'failed': 0, 'last_run_seconds': 0.0}
+
+
+def _parse_time(value, timezone=None):
+    hour, minute = (int(part) for part in value.split(':'))
+    return dt_time(hour, minute, tzinfo=ZoneInfo(timezone or config.REMINDER_TIMEZONE))
+
+
+def next_send_time(send_time, timezone, now):
+    """Return the next moment after now at which it is send_time (HH:MM) in timezone."""
+    local_now = now.astimezone(ZoneInfo(timezone))
+    when = datetime.combine(local_now.date(), _parse_time(send_time, timezone))
+    if when <= local_now:
+        when = datetime.combine(local_now.date() + timedelta(days=1), _parse_time(send_time, timezone))
+    return when
+
+
+async def next_predicted_date(chat_id):
+    """Return the next predicted start date of a chat, or None."""
+    access_token = await get_access_token(chat_id)
+    if not access_token:
+        return None
+    data = await request_cycle_analysis(access_token)
+    if data is None:
+        # Backend unavailable: approximate from a cached history if there is one
+        periods = history_cache.get(chat_id)
+        data = analyze_periods(periods) if periods else None
+    if not data or not data.get('next_predicted_date'):
+        return None
+    return date.fromisoformat(data['next_predicted_date'])
+
+
+def reminder_text(lang, days, predicted):
+    if days == 0:
+        return get_message(lang, 'reminders', 'today', predicted.isoformat())
+    return get_message(lang, 'reminders', 'upcoming', days, predicted.isoformat())
+
+
+async def collect_due_reminders(application, chat_ids, now):
+    """Check every chat with bounded concurrency and group the due reminders by send time.
+
+    Each user is reminded the next time their send time comes round in their
+    own timezone, and the days left are counted from their local date then.
+    Returns {send datetime: [(chat_id, text), ...]}.
+    """
+    groups = {}
+    default_time = config.REMINDER_SEND_TIME
+    chat_ids = iter(chat_ids)
+
+    async def worker():
+        # Workers pull from one iterator, so memory does not grow with the number of chats
+        for chat_id in chat_ids:
+            # The per-user timer already covers this chat's upcoming period
+            if notification_scheduler.has(chat_id, BEFORE_PERIOD):
+                continue
+            reminder_stats['checked'] += 1
+            try:
+                predicted = await next_predicted_date(chat_id)
+            except Exception:
+                logger.error(f"Failed to check reminder for chat {chat_id}", exc_info=True)
+                continue
+            if predicted is None:
+                continue
+            # Private chats: the chat id is the user id
+            user_data = user_data_of(application, int(chat_id))
+            send_at = next_send_time(user_data.get('reminder_time', default_time), user_timezone(user_data), now)
+            days = (predicted - send_at.date()).days
+            if days not in config.REMINDER_DAYS_BEFORE:
+                continue
+            text = reminder_text(user_data.get('language', 'en'), days, predicted)
+            groups.setdefault(send_at, []).append((chat_id, text))
+            reminder_stats['due'] += 1
+
+    await asyncio.gather(*(worker() for _ in range(config.REMINDER_FETCH_CONCURRENCY)))
+    return groups
+
+
+async def send_reminders(context):
+    """Job: send one group of reminders through the bulk priority of the rate limiter."""
+    reminders = iter(context.job.data)
+    send_kwargs = bulk_send_kwargs(context.bot)
+
+    async def worker():
+        for chat_id, text in reminders:
+            try:
+                await context.bot.send_message(chat_id, text, **send_kwargs)
+                reminder_stats['sent'] += 1
+            except (Forbidden, BadRequest, SendDropped) as e:
+                # Blocked the bot, deleted the chat, or the bulk queue is full
+                logger.warning(f"Reminder to chat {chat_id} not sent: {e}")
+                reminder_stats['failed'] += 1
+
+    # More senders than the rate limit lets through keeps its queue filled
+    await asyncio.gather(*(worker() for _ in range(config.REMINDER_SEND_CONCURRENCY)))
+    logger.info(f"Processed {len(context.job.data)} reminders of {context.job.name}")
+
+
+async def run_daily_reminders(context):
+    """Daily job: find the chats due for a reminder and schedule one send job per send time."""
+    started = time.monotonic()
+    application = context.application
+    tz = ZoneInfo(config.REMINDER_TIMEZONE)
+    now = datetime.now(tz)
+    chat_ids = get_token_store().chat_ids()
+
+    groups = await collect_due_reminders(application, chat_ids, now)
+    for when, reminders in groups.items():
+        context.job_queue.run_once(
+            send_reminders,
+            when=when,
+            data=reminders,
+            name=f"reminders_{when.astimezone(tz):%Y-%m-%d_%H:%M}"
+        )
+
+    reminder_stats['runs'] += 1
+    reminder_stats['last_run_seconds'] = round(time.monotonic() - started, 3)
+    logger.info(
+        f"Checked {len(chat_ids)} chats for reminders in {reminder_stats['last_run_seconds']}s, "
+        f"{sum(len(reminders) for reminders in groups.values())} due in {len(groups)} send times"
+    )
+
+
+def schedule_reminders(application):
+    """Register the daily reminder job on the application's job queue."""
+    if application.job_queue is None:
+        logger.warning("JobQueue not available, reminders are disabled")
+        return
+    if not config.REMINDERS_ENABLED:
+        return
+    application.job_queue.run_daily(
+        run_daily_reminders,
+        time=_parse_time(config.REMINDER_CHECK_TIME),
+        name="daily_reminders"
+    )
+    logger.info(f"Scheduled daily reminder check at {config.REMINDER_CHECK_TIME} {config.REMINDER_TIMEZONE}")
@@ -3,6 +3,11 @@ from telegram.ext import CallbackContext, ConversationHandler
 from languages import get_message
 from states import MENU, SETTINGS
 from invitation import generate_invitation_code, start_accept_invitation
+from menu_router import MenuRouter
+import config
+
+# Button text of each reminder time choice
+REMINDER_TIME_BUTTONS = {f"⏰ {choice}": choice for choice in config.REMINDER_TIME_CHOICES}
 
 async def show_settings_menu(update: Update, context: CallbackContext) -> int:
     """Display settings menu."""
@@ -11,6 +16,7 @@ async def show_settings_menu(update: Update, context: CallbackContext) -> int:
     reply_keyboard = [
         [get_message(lang, 'menu', 'invitation_partner'), get_message(lang, 'menu', 'accept_invitation')],
         ['🇬🇧 English', '🇮🇷 فارسی'],
+        list(REMINDER_TIME_BUTTONS),
         [get_message(lang, 'menu', 'logout')],
         [get_message(lang, 'menu', 'back_to_main')]
     ]
@@ -21,28 +27,51 @@ async def show_settings_menu(update: Update, context: CallbackContext) -> int:
     )
     return SETTINGS
 
+async def _back_to_main(update: Update, context: CallbackContext) -> int:
+    from menu_handlers import show_main_menu
+    return await show_main_menu(update, context)
+
+def user_timezone(user_data):
+    """Return the timezone name of a user: stored with their settings, else that of their language."""
+    lang = user_data.get('language', 'en')
+    return user_data.get('timezone') or config.LANGUAGE_TIMEZONES.get(lang, config.REMINDER_TIMEZONE)
+
+async def _set_language(update: Update, context: CallbackContext, lang) -> int:
+    context.user_data['language'] = lang
+    # Notifications are sent at local time; the language is the only hint of it we ask for
+    context.user_data['timezone'] = config.LANGUAGE_TIMEZONES.get(lang, config.REMINDER_TIMEZONE)
+    await update.message.reply_text(get_message(lang, 'menu', 'language_changed'))
+    return await show_settings_menu(update, context)
+
+async def _set_english(update: Update, context: CallbackContext) -> int:
+    return await _set_language(update, context, 'en')
+
+async def _set_persian(update: Update, context: CallbackContext) -> int:
+    return await _set_language(update, context, 'fa')
+
+async def _set_reminder_time(update: Update, context: CallbackContext) -> int:
+    lang = context.user_data.get('language', 'en')
+    reminder_time = REMINDER_TIME_BUTTONS[update.message.text]
+    context.user_data['reminder_time'] = reminder_time
+    await update.message.reply_text(get_message(lang, 'settings', 'reminder_time_changed', reminder_time))
+    return await show_settings_menu(update, context)
+
+async def _logout(update: Update, context: CallbackContext) -> int:
+    from bot import logout
+    return await logout(update, context)
+
+settings_router = (
+    MenuRouter('settings')
+    .add('menu', 'back_to_main', _back_to_main)
+    .add_text('🇬🇧 English', _set_english)
+    .add_text('🇮🇷 فارسی', _set_persian)
+    .add('menu', 'invitation_partner', generate_invitation_code)
+    .add('menu', 'accept_invitation', start_accept_invitation)
+    .add('menu', 'logout', _logout)
+)
+for _button in REMINDER_TIME_BUTTONS:
+    settings_router.add_text(_button, _set_reminder_time)
+
 async def handle_settings(update: Update, context: CallbackContext) -> int:
     """Handle settings menu selections."""
-    text = update.message.text
-    lang = context.user_data.get('language', 'en')
-    
-    if text == get_message(lang, 'menu', 'back_to_main'):
-        from menu_handlers import show_main_menu
-        return await show_main_menu(update, context)
-    elif text == '🇬🇧 English':
-        context.user_data['language'] = 'en'
-        await update.message.reply_text(get_message('en', 'menu', 'language_changed'))
-        return await show_settings_menu(update, context)
-    elif text == '🇮🇷 فارسی':
-        context.user_data['language'] = 'fa'
-        await update.message.reply_text(get_message('fa', 'menu', 'language_changed'))
-        return await show_settings_menu(update, context)
-    elif text == get_message(lang, 'menu', 'invitation_partner'):
-        return await generate_invitation_code(update, context)
-    elif text == get_message(lang, 'menu', 'accept_invitation'):
-        return await start_accept_invitation(update, context)
-    elif text == get_message(lang, 'menu', 'logout'):
-        from bot import logout
-        return await logout(update, context)
-    
-    return SETTINGS 
\ No newline at end of file
+    return await settings_router.dispatch(update, context, default=SETTINGS)
@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from local_analysis import analyze_periods
+
+FIXTURES = sorted((Path(__file__).parent / 'fixtures' / 'cycle_analysis').glob('*.json'))
+
+
+@pytest.mark.skipif(not FIXTURES, reason='no recorded backend analyses, see benchmarks/record_analysis.py')
+@pytest.mark.parametrize('path', FIXTURES, ids=lambda path: path.stem)
+def test_local_analysis_matches_the_backend(path):
+    fixture = json.loads(path.read_text())
+    local = analyze_periods(fixture['periods'])
+
+    if fixture['status'] != 200:
+        # The backend refused to analyse this history, e.g. too few periods
+        assert local is None
+        return
+    expected = fixture['response']['data']
+    assert local is not None
+    assert local['next_predicted_date'] == expected['next_predicted_date']
+    assert local['average_cycle'] == pytest.approx(expected['average_cycle'], abs=0.1)
+    assert local['regularity_score'] == pytest.approx(expected['regularity_score'], abs=1)
+    assert local['prediction_reliability'] == pytest.approx(expected['prediction_reliability'], abs=1)
+    assert local['cycle_variations'] == pytest.approx(expected['cycle_variations'], abs=0.1)
@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+from benchmarks.fake_backend import make_jwt
+from coalescing import CoalescingTransport
+
+# Two access tokens of the same user, as before and after a refresh
+OLD = make_jwt('alice', 'access', 3600)
+FRESH = make_jwt('alice', 'access', 3600)
+
+
+class SlowBackend(httpx.AsyncBaseTransport):
+    """Answers 401 to OLD and 200 to any other token, after a short delay."""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        await asyncio.sleep(0.05)
+        # Streamed, like the responses of httpx's own transports
+        if request.headers['authorization'] == f'Bearer {OLD}':
+            return httpx.Response(401, stream=httpx.ByteStream(b'{"detail": "Token is invalid or expired"}'))
+        return httpx.Response(200, stream=httpx.ByteStream(b'[]'))
+
+
+async def get_concurrently(tokens):
+    backend = SlowBackend()
+    async with httpx.AsyncClient(base_url='http://backend', transport=CoalescingTransport(backend)) as client:
+        responses = await asyncio.gather(*(
+            client.get('/api/periods/', headers={'Authorization': f'Bearer {token}'}) for token in tokens
+        ))
+    return backend.requests, [response.status_code for response in responses]
+
+
+def test_requests_with_the_same_token_share_one_flight():
+    requests, statuses = asyncio.run(get_concurrently([FRESH, FRESH, FRESH]))
+
+    assert requests == 1
+    assert statuses == [200, 200, 200]
+
+
+def test_refreshed_token_does_not_get_the_old_tokens_401():
+    requests, statuses = asyncio.run(get_concurrently([OLD, FRESH]))
+
+    assert requests == 2
+    assert statuses == [401, 200]
@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import config
+import period
+from cache import TTLCache
+from languages import get_message
+from period import render_history_page, history_keyboard, TELEGRAM_MESSAGE_LIMIT
+
+
+def make_periods(count, symptoms=''):
+    return [
+        {'start_date': f"2024-{12 - i % 12:02d}-01", 'end_date': None, 'symptoms': symptoms, 'medication': ''}
+        for i in range(count)
+    ]
+
+
+def walk_forward(periods):
+    """Return [(start, text, keyboard)] of the pages reached by tapping ▶."""
+    pages = []
+    start, back = 0, None
+    while True:
+        text, next_start = render_history_page(periods, 'en', start)
+        keyboard = history_keyboard(start, next_start, len(periods), back)
+        pages.append((start, text, keyboard))
+        if next_start >= len(periods):
+            return pages
+        start, back = next_start, start
+
+
+def buttons(keyboard):
+    return {button.text: button.callback_data for button in keyboard.inline_keyboard[0]}
+
+
+def test_short_pages_start_at_page_boundaries():
+    periods = make_periods(12)
+    pages = walk_forward(periods)
+
+    assert [start for start, _, _ in pages] == [0, 5, 10]
+    assert 'Page 3 of 3' in pages[2][1]
+    assert buttons(pages[1][2]) == {'◀': 'history_0_0', '▶': 'history_10_5'}
+
+
+def test_long_cycles_continue_the_same_page():
+    # About 1300 characters per cycle: three fit in a message, five do not
+    periods = make_periods(12, symptoms='x' * 1100)
+    pages = walk_forward(periods)
+
+    starts = [start for start, _, _ in pages]
+    assert starts == [0, 3, 5, 8, 10]
+    assert all(len(text) <= TELEGRAM_MESSAGE_LIMIT for _, text, _ in pages)
+    # The continuation keeps the page number, the next page starts where it would with short cycles
+    assert 'Page 1 of 3' in pages[1][1]
+    assert 'Page 2 of 3' in pages[2][1]
+    # ◀ goes back to the screen ▶ came from
+    assert buttons(pages[2][2])['◀'].startswith('history_3_')
+    assert buttons(pages[1][2])['◀'] == 'history_0_0'
+
+
+def test_oversized_cycle_is_cut_between_lines():
+    periods = make_periods(2, symptoms='*' + 'y' * 5000 + '*')
+    text, next_start = render_history_page(periods, 'en')
+
+    assert next_start == 1
+    assert len(text) <= TELEGRAM_MESSAGE_LIMIT
+    assert text.endswith('\n')
+    assert text.count('*') % 2 == 0
+
+
+def test_page_size_setting_is_respected(monkeypatch):
+    monkeypatch.setattr(config, 'HISTORY_PAGE_SIZE', 2)
+    pages = walk_forward(make_periods(5))
+
+    assert [start for start, _, _ in pages] == [0, 2, 4]
+
+
+class TimingOutClient:
+    """Stands in for the shared client while the breaker cuts requests over the latency budget."""
+
+    async def get(self, url, **kwargs):
+        raise httpx.ReadTimeout("GET /api/periods/ exceeded its 5s latency budget")
+
+
+@pytest.fixture
+def timing_out(monkeypatch):
+    async def access_token(chat_id):
+        return 'access-token'
+
+    cache = TTLCache(10, 0)
+    monkeypatch.setattr(period, 'history_cache', cache)
+    monkeypatch.setattr(period, 'get_client', TimingOutClient)
+    monkeypatch.setattr(period, 'get_access_token', access_token)
+    return cache
+
+
+def view_history():
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(message=SimpleNamespace(chat_id=1, reply_text=reply_text))
+    context = SimpleNamespace(user_data={'language': 'en'})
+    asyncio.run(period.fetch_periods(update, context))
+    return replies
+
+
+def test_timeout_is_answered(timing_out):
+    assert view_history() == [get_message('en', 'errors', 'fetch_failed')]
+
+
+def test_timeout_serves_the_expired_history(timing_out):
+    # A ttl of 0 leaves the entry expired at once, as after HISTORY_CACHE_TTL
+    timing_out.set('1', make_periods(2))
+
+    [reply] = view_history()
+
+    assert reply.startswith(get_message('en', 'period_history', 'title'))
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import cycle_analysis
+import local_analysis
+from local_analysis import analyze_periods
+
+
+def periods_starting(*dates):
+    return [{'start_date': start, 'end_date': None} for start in dates]
+
+
+def test_two_cycles():
+    # Cycles of 28 and 30 days: mean 29, standard deviation 1
+    periods = periods_starting('2024-01-01', '2024-01-29', '2024-02-28')
+
+    assert analyze_periods(periods) == {
+        # 2024-02-28 plus 29 days, across the leap day
+        'next_predicted_date': '2024-03-28',
+        'average_cycle': 29.0,
+        # 100 - 1/29*100 = 96.55
+        'regularity_score': 97,
+        # 96.55 * 2/6 cycles = 32.18
+        'prediction_reliability': 32,
+        'cycle_variations': [1.0, 1.0]
+    }
+
+
+def test_regular_history_is_fully_reliable():
+    # Seven periods 28 days apart give six cycles, RELIABLE_CYCLE_COUNT
+    periods = periods_starting(
+        '2024-01-01', '2024-01-29', '2024-02-26', '2024-03-25',
+        '2024-04-22', '2024-05-20', '2024-06-17'
+    )
+
+    data = analyze_periods(periods)
+
+    assert data['next_predicted_date'] == '2024-07-15'
+    assert data['average_cycle'] == 28.0
+    assert data['regularity_score'] == 100
+    assert data['prediction_reliability'] == 100
+    assert data['cycle_variations'] == [0.0] * 6
+
+
+def test_order_duplicates_and_missing_dates_are_ignored():
+    # Newest first as the backend lists them; lengths 25, 35: mean 30, deviation 5
+    periods = periods_starting('2024-03-06', '2024-01-31', '2024-01-31', '2024-01-06')
+    periods.append({'start_date': None})
+
+    data = analyze_periods(periods)
+
+    assert data['next_predicted_date'] == '2024-04-05'
+    assert data['average_cycle'] == 30.0
+    # 100 - 5/30*100 = 83.33
+    assert data['regularity_score'] == 83
+    # 83.33 * 2/6 = 27.78
+    assert data['prediction_reliability'] == 28
+    assert data['cycle_variations'] == [5.0, 5.0]
+
+
+def test_a_single_period_gives_no_analysis():
+    assert analyze_periods(periods_starting('2024-01-01', '2024-01-01')) is None
+    assert analyze_periods([]) is None
+
+
+def test_pure_python_path_matches(monkeypatch):
+    periods = periods_starting('2024-01-06', '2024-01-31', '2024-03-06', '2024-04-01')
+    expected = analyze_periods(periods)
+
+    monkeypatch.setattr(local_analysis, 'np', None)
+
+    assert analyze_periods(periods) == expected
+
+
+class FakeMessage:
+    chat_id = 1
+
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeUpdate:
+    def __init__(self):
+        self.message = FakeMessage()
+
+
+class FakeContext:
+    user_data = {'language': 'en'}
+
+
+@pytest.mark.parametrize('backend_up', [True, False])
+def test_local_fallback_is_labelled_as_an_estimate(monkeypatch, backend_up):
+    data = analyze_periods(periods_starting('2024-01-01', '2024-01-29', '2024-02-28'))
+
+    async def access_token(chat_id):
+        return 'access-token'
+
+    async def backend(chat_id, access_token):
+        return data if backend_up else None
+
+    async def local(chat_id, access_token):
+        return data
+
+    monkeypatch.setattr(cycle_analysis, 'get_access_token', access_token)
+    monkeypatch.setattr(cycle_analysis, 'load_cycle_analysis', backend)
+    monkeypatch.setattr(cycle_analysis, 'local_cycle_analysis', local)
+    update = FakeUpdate()
+
+    asyncio.run(cycle_analysis.fetch_cycle_analysis(update, FakeContext()))
+
+    [reply] = update.message.replies
+    assert '2024-03-28' in reply
+    assert ('local estimate' in reply) is not backend_up
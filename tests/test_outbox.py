@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+import config
+import token_store
+from benchmarks.fake_backend import make_jwt
+from outbox import CycleOutbox, PENDING, ABANDONED
+from token_refresh import token_subject
+from token_store import SqliteTokenStore
+
+ALICE = {'access': make_jwt('alice', 'access', 3600), 'refresh': make_jwt('alice', 'refresh', 3600)}
+BOB = {'access': make_jwt('bob', 'access', 3600), 'refresh': make_jwt('bob', 'refresh', 3600)}
+
+
+class RecordingBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SqliteTokenStore(str(tmp_path / 'tokens.db'))
+    monkeypatch.setattr(token_store, '_store', store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = CycleOutbox(str(tmp_path / 'outbox.db'))
+    outbox.open()
+    yield outbox
+    outbox.close()
+
+
+def state_of(outbox, entry):
+    return outbox._conn.execute("SELECT state FROM outbox WHERE id = ?", (entry['id'],)).fetchone()[0]
+
+
+def test_entry_waits_while_its_user_is_logged_out(store, outbox):
+    entry = outbox.enqueue('1', {'start_date': '2025-01-01'}, token_subject(ALICE['access']))
+    bot = RecordingBot()
+
+    asyncio.run(outbox.deliver(bot, entry))
+
+    assert state_of(outbox, entry) == PENDING
+    assert outbox.pending_for_chat('1') == 1
+    assert bot.messages == []
+
+
+def test_entry_waits_while_another_user_is_logged_in(store, outbox):
+    entry = outbox.enqueue('1', {'start_date': '2025-01-01'}, token_subject(ALICE['access']))
+    store.set('1', BOB)
+
+    asyncio.run(outbox.deliver(RecordingBot(), entry))
+
+    assert state_of(outbox, entry) == PENDING
+
+
+def test_entry_is_abandoned_once_its_user_stayed_away_too_long(store, outbox):
+    entry = outbox.enqueue('1', {'start_date': '2025-01-01'}, token_subject(ALICE['access']))
+    entry['created'] = time.time() - config.OUTBOX_LOGIN_WAIT_HOURS * 3600 - 1
+    bot = RecordingBot()
+
+    asyncio.run(outbox.deliver(bot, entry))
+
+    assert state_of(outbox, entry) == ABANDONED
+    assert outbox.pending_for_chat('1') == 0
+    assert len(bot.messages) == 1 and '2025-01-01' in bot.messages[0][1]
+
+
+def test_logging_in_again_makes_waiting_entries_due(store, outbox):
+    entry = outbox.enqueue('1', {'start_date': '2025-01-01'}, token_subject(ALICE['access']))
+    asyncio.run(outbox.deliver(RecordingBot(), entry))
+    assert outbox._due_entries(10) == []
+
+    outbox.wake_chat('1')
+
+    assert [due['id'] for due in outbox._due_entries(10)] == [entry['id']]
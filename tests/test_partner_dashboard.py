@@ -0,0 +1,34 @@
+import config
+from partner import render_partner_dashboard
+from period import TELEGRAM_MESSAGE_LIMIT
+
+ANALYSIS = {
+    'partner_name': 'Sam', 'next_predicted_date': '2025-01-29', 'cycle_length_avg': 28.0,
+    'is_regular': True, 'last_period_start': '2025-01-01'
+}
+
+
+def snapshot(count, symptoms):
+    history = [
+        {'start_date': f"2024-{12 - i:02d}-01", 'end_date': None, 'symptoms': symptoms, 'medication': ''}
+        for i in range(count)
+    ]
+    return {'analysis': ANALYSIS, 'history': history}
+
+
+def test_dashboard_drops_whole_cycles_until_it_fits(monkeypatch):
+    monkeypatch.setattr(config, 'PARTNER_HISTORY_CYCLES', 5)
+    text = render_partner_dashboard(snapshot(5, 'x' * 1500), 'en')
+
+    assert len(text) <= TELEGRAM_MESSAGE_LIMIT
+    assert text.count('✨ *Cycle') == 2
+    assert text.endswith('•°•°•°•°•°•°•°•°•°\n\n')
+    assert text.count('*') % 2 == 0
+
+
+def test_short_dashboard_shows_every_recent_cycle(monkeypatch):
+    monkeypatch.setattr(config, 'PARTNER_HISTORY_CYCLES', 3)
+    text = render_partner_dashboard(snapshot(5, 'Cramps'), 'en')
+
+    assert text.startswith("👥 *Sam's Cycle Analysis*")
+    assert text.count('✨ *Cycle') == 3
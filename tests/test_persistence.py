@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import auth
+from persistence import SqlitePersistence, user_data_of, REGISTRATION_RESTARTED
+from states import REGISTER
+
+
+async def store_user_data(path, user_id, data):
+    persistence = SqlitePersistence(str(path))
+    await persistence.update_user_data(user_id, data)
+    await persistence.flush()
+
+
+def test_user_data_is_read_from_disk_before_the_user_writes_again(tmp_path):
+    path = tmp_path / 'bot.sqlite'
+    asyncio.run(store_user_data(path, 42, {'language': 'fa', 'reminder_time': '21:00'}))
+
+    # A restarted bot has not loaded anyone's user_data yet
+    application = SimpleNamespace(user_data={}, persistence=SqlitePersistence(str(path)))
+
+    assert user_data_of(application, 42) == {'language': 'fa', 'reminder_time': '21:00'}
+    assert user_data_of(application, 43) == {}
+
+
+def test_loaded_user_data_wins_over_disk(tmp_path):
+    path = tmp_path / 'bot.sqlite'
+    asyncio.run(store_user_data(path, 42, {'language': 'fa'}))
+
+    application = SimpleNamespace(user_data={42: {'language': 'en'}}, persistence=SqlitePersistence(str(path)))
+
+    assert user_data_of(application, 42) == {'language': 'en'}
+
+
+def test_registration_after_the_password_starts_over(tmp_path):
+    path = tmp_path / 'bot.sqlite'
+    asyncio.run(store_user_data(path, 42, {
+        'language': 'en', 'registration_step': 'sex',
+        'username': 'alice', 'password': 'secret', 'email': 'alice@example.com'
+    }))
+
+    stored = SqlitePersistence(str(path)).stored_user_data(42)
+
+    assert stored == {'language': 'en', 'registration_step': REGISTRATION_RESTARTED}
+
+
+def test_registration_before_the_password_is_kept(tmp_path):
+    path = tmp_path / 'bot.sqlite'
+    data = {'language': 'en', 'registration_step': 'password', 'username': 'alice'}
+    asyncio.run(store_user_data(path, 42, data))
+
+    assert SqlitePersistence(str(path)).stored_user_data(42) == data
+
+
+def test_restarted_registration_asks_for_the_username_again():
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(message=SimpleNamespace(text='female', chat_id=42, reply_text=reply_text))
+    context = SimpleNamespace(user_data={'language': 'en', 'registration_step': REGISTRATION_RESTARTED})
+
+    state = asyncio.run(auth.handle_registration(update, context))
+
+    assert state == REGISTER
+    assert context.user_data['registration_step'] == 'username'
+    assert 'username' in replies[0]
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import prefetch
+from cache import TTLCache
+from prefetch import MenuPrefetcher, HISTORY, ANALYSIS
+
+
+class FakeApplication:
+    def create_task(self, coroutine):
+        return asyncio.create_task(coroutine)
+
+
+class FakeTokenStore:
+    def get_access(self, chat_id):
+        return 'access-token'
+
+
+class SlowLoader:
+    """Fills a cache after release is set, like load_periods and load_cycle_analysis."""
+
+    def __init__(self, cache, data):
+        self.cache = cache
+        self.data = data
+        self.release = asyncio.Event()
+
+    async def __call__(self, chat_id, access_token):
+        await self.release.wait()
+        self.cache.set(chat_id, self.data)
+        return self.data
+
+
+@pytest.fixture
+def kinds(monkeypatch):
+    async def access_token(chat_id):
+        return 'access-token'
+
+    monkeypatch.setattr(prefetch, 'get_token_store', FakeTokenStore)
+    monkeypatch.setattr(prefetch, 'get_access_token', access_token)
+
+    def install():
+        history = SlowLoader(TTLCache(10, 60), [{'start_date': '2024-01-01'}])
+        analysis = SlowLoader(TTLCache(10, 60), {'average_cycle_length': 28})
+        monkeypatch.setattr(prefetch, 'PREFETCH_KINDS', {
+            HISTORY: (history.cache, history),
+            ANALYSIS: (analysis.cache, analysis),
+        })
+        return history, analysis
+
+    return install
+
+
+def test_claim_waits_only_for_its_own_kind(kinds):
+    async def scenario():
+        history, analysis = kinds()
+        prefetcher = MenuPrefetcher(4)
+        prefetcher.prefetch(FakeApplication(), '1')
+
+        history.release.set()
+        # The analysis prefetch is still held, the history claim must not wait for it
+        await asyncio.wait_for(prefetcher.claim('1', HISTORY), 1)
+        assert prefetcher.stats['hits'] == 1
+
+        analysis.release.set()
+        await asyncio.wait_for(prefetcher.claim('1', ANALYSIS), 1)
+        return prefetcher.prefetch_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats['fetched'] == 2
+    assert stats['hits'] == 2
+    assert stats['hit_rate'] == 1.0
+
+
+def test_claim_of_an_expired_entry_is_wasted(kinds):
+    async def scenario():
+        history, analysis = kinds()
+        history.release.set()
+        analysis.release.set()
+        prefetcher = MenuPrefetcher(4)
+        prefetcher.prefetch(FakeApplication(), '1')
+        await prefetcher.claim('1', HISTORY)
+        # Dropped before the user taps, so the tap is not served from the prefetch
+        analysis.cache.invalidate('1')
+        await prefetcher.claim('1', ANALYSIS)
+        return prefetcher.prefetch_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats['hits'] == 1
+    assert stats['wasted'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_claim_without_prefetch_counts_nothing(kinds):
+    async def scenario():
+        kinds()
+        prefetcher = MenuPrefetcher(4)
+        await prefetcher.claim('1', ANALYSIS)
+        return prefetcher.prefetch_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats['hits'] == 0
+    assert stats['wasted'] == 0
+    assert stats['joined'] == 0
+
+
+def test_cancel_stops_both_kinds(kinds):
+    async def scenario():
+        kinds()
+        prefetcher = MenuPrefetcher(4)
+        prefetcher.prefetch(FakeApplication(), '1')
+        assert prefetcher.prefetch_stats()['in_flight'] == 2
+        prefetcher.cancel('1')
+        await asyncio.sleep(0)
+        return prefetcher.prefetch_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats['cancelled'] == 2
+    assert stats['in_flight'] == 0
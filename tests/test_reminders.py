@@ -0,0 +1,44 @@
+import asyncio
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import reminders
+from reminders import next_send_time, collect_due_reminders
+
+# The daily check at its default time, 06:00 UTC
+CHECK = datetime(2025, 3, 10, 6, 0, tzinfo=timezone.utc)
+
+
+def test_send_time_already_passed_locally_is_sent_the_next_day():
+    # 08:00 in Tehran is 04:30 UTC, before the check
+    when = next_send_time('08:00', 'Asia/Tehran', CHECK)
+
+    assert when.astimezone(ZoneInfo('Asia/Tehran')) == datetime(2025, 3, 11, 8, 0, tzinfo=ZoneInfo('Asia/Tehran'))
+
+
+def test_send_time_west_of_utc_is_on_the_local_day():
+    # 06:00 UTC is still the evening before in Los Angeles
+    when = next_send_time('09:00', 'America/Los_Angeles', CHECK)
+
+    local = when.astimezone(ZoneInfo('America/Los_Angeles'))
+    assert (local.date(), local.hour) == (date(2025, 3, 10), 9)
+    assert when > CHECK
+
+
+def test_days_are_counted_from_the_users_local_send_date(monkeypatch):
+    async def predicted(chat_id):
+        return date(2025, 3, 12)
+
+    monkeypatch.setattr(reminders, 'next_predicted_date', predicted)
+    application = SimpleNamespace(persistence=None, user_data={
+        1: {'language': 'en', 'reminder_time': '08:00', 'timezone': 'Asia/Tehran'},
+        2: {'language': 'en', 'reminder_time': '09:00', 'timezone': 'America/Los_Angeles'},
+    })
+
+    groups = asyncio.run(collect_due_reminders(application, ['1', '2'], CHECK))
+
+    # Tehran is reminded on the 11th, one day before: not a reminder day.
+    # Los Angeles on the 10th, two days before.
+    assert list(groups.values()) == [[('2', reminders.reminder_text('en', 2, date(2025, 3, 12)))]]
+    assert all(when > CHECK for when in groups)
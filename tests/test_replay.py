@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import config
+import recorder
+import token_store
+from outbox import cycle_outbox
+from timing_wheel import notification_scheduler
+from benchmarks.fake_backend import FakeBackend
+from benchmarks.harness import running_bot, feed, quiet_logging
+from benchmarks.replay import load_recording, replay, restore_sessions
+from benchmarks.report import LatencyReport
+from benchmarks.telegram_stub import SyntheticChat
+from languages import get_message
+from states import MENU
+
+
+async def record_session(path):
+    """Log a chat in on a live bot, then record only its View History tap."""
+    backend = FakeBackend(latency=0)
+    await backend.start()
+    try:
+        async with running_bot(backend) as (application, _):
+            chat = SyntheticChat(application.bot, 4242)
+            for text in ('/start', get_message('en', 'auth', 'login'), 'someone', 'secret'):
+                await feed(application, chat.message(text))
+            config.UPDATE_RECORDING_PATH = str(path)
+            recorder.start_recording(application)
+            try:
+                await feed(application, chat.message(get_message('en', 'menu', 'view_history')))
+            finally:
+                await recorder.stop_recording()
+                config.UPDATE_RECORDING_PATH = ''
+    finally:
+        await backend.stop()
+
+
+async def replay_recording(path):
+    records = load_recording(path)
+    backend = FakeBackend(latency=0)
+    await backend.start()
+    try:
+        async with running_bot(backend) as (application, request):
+            restored = restore_sessions(application, records)
+            report = LatencyReport('test')
+            await replay(application, records, 0, report)
+            report.finish()
+            return restored, backend.requests, request.calls, report
+    finally:
+        await backend.stop()
+
+
+def test_recorded_mid_session_update_carries_the_session(tmp_path):
+    path = tmp_path / 'updates.jsonl'
+    asyncio.run(record_session(path))
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 1
+    assert records[0]['session']['logged_in'] is True
+    assert records[0]['session']['conversations'] == {'main_conversation': MENU}
+
+
+def test_replayed_logged_in_session_calls_the_backend(tmp_path):
+    quiet_logging()
+    path = tmp_path / 'updates.jsonl'
+    asyncio.run(record_session(path))
+
+    restored, backend_requests, bot_calls, report = asyncio.run(replay_recording(path))
+
+    assert restored == 1
+    assert backend_requests.get('GET /api/periods/') == 1
+    assert bot_calls.get('sendMessage') == 1
+    assert report.summary()['main menu:view_history']['errors'] == 0
+
+
+def test_harness_leaves_no_state_behind():
+    async def run_bot():
+        backend = FakeBackend(latency=0)
+        await backend.start()
+        try:
+            async with running_bot(backend):
+                assert config.BASE_URL == backend.url
+        finally:
+            await backend.stop()
+
+    before = (config.BASE_URL, config.PERSISTENCE_PATH, config.TELEGRAM_BOT_TOKEN, token_store._store)
+    asyncio.run(run_bot())
+
+    assert (config.BASE_URL, config.PERSISTENCE_PATH, config.TELEGRAM_BOT_TOKEN, token_store._store) == before
+    assert cycle_outbox._conn is None
+    assert notification_scheduler._conn is None
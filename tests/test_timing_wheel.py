@@ -0,0 +1,193 @@
+import asyncio
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from telegram.error import Forbidden, NetworkError
+
+import timing_wheel
+import token_store
+
+from timing_wheel import TimingWheel, NotificationScheduler, BEFORE_PERIOD, NOTIFICATION_SEND_ATTEMPTS
+
+
+def small_wheel(now=0):
+    # Levels of 4, 16 and 64 ticks, so a few hundred ticks cross every level
+    return TimingWheel(1, slot_bits=2, levels=3, now=now)
+
+
+def fire_ticks(wheel, until):
+    """Advance one tick at a time and return {key: tick it fired at}."""
+    fired = {}
+    for now in range(wheel.current + 1, until + 1):
+        for key, _ in wheel.advance(now):
+            fired[key] = now
+    return fired
+
+
+def test_timer_fires_at_its_due_tick():
+    wheel = small_wheel()
+    wheel.insert('a', 3, {'lang': 'en'})
+
+    assert wheel.advance(2) == []
+    assert wheel.advance(3) == [('a', {'lang': 'en'})]
+    assert len(wheel) == 0
+
+
+def test_due_time_between_ticks_fires_on_the_next_tick():
+    wheel = small_wheel()
+    wheel.insert('a', 2.5)
+
+    assert fire_ticks(wheel, 10) == {'a': 3}
+
+
+def test_cancelled_timer_does_not_fire():
+    wheel = small_wheel()
+    wheel.insert('a', 5)
+    wheel.insert('b', 40)
+
+    assert wheel.cancel('a')
+    assert wheel.cancel('b')
+    assert not wheel.cancel('a')
+    assert fire_ticks(wheel, 100) == {}
+
+
+def test_insert_replaces_the_timer_of_the_same_key():
+    wheel = small_wheel()
+    wheel.insert('a', 30)
+    wheel.insert('a', 6)
+
+    assert len(wheel) == 1
+    assert fire_ticks(wheel, 100) == {'a': 6}
+
+
+def test_timers_cascade_down_to_fire_on_time():
+    wheel = small_wheel(now=13)
+    due = {'level0': 15, 'level1': 28, 'level2': 70, 'beyond_top': 300}
+    for key, tick in due.items():
+        wheel.insert(key, tick)
+
+    # Placed by distance: under 4 ticks, under 16, and the rest in the top level
+    assert [wheel._timers[key][1] for key in due] == [0, 1, 2, 2]
+    assert fire_ticks(wheel, 400) == due
+
+
+def test_cancel_after_a_cascade():
+    wheel = small_wheel()
+    wheel.insert('a', 70)
+    fire_ticks(wheel, 66)
+
+    # By now the timer has moved down from the top level
+    assert wheel._timers['a'][1] < 2
+    assert wheel.cancel('a')
+    assert fire_ticks(wheel, 100) == {}
+
+
+class FlakyBot:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+        self.rows_while_sending = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.rows_while_sending.append(stored_timers(self.path))
+        if self.error is not None:
+            raise self.error
+        self.sent.append(chat_id)
+
+
+def stored_timers(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT chat_id, kind FROM timers").fetchall()
+
+
+def tick_due_timer(path, bot, ticks=1):
+    scheduler = NotificationScheduler(str(path), tick=0.05)
+    scheduler.open()
+    scheduler.schedule('42', BEFORE_PERIOD, time.time() - 1, {'lang': 'en', 'date': '2026-01-01'})
+    scheduler.flush()
+    bot.path = str(path)
+    context = SimpleNamespace(bot=bot)
+    for _ in range(ticks):
+        # Let the wheel move on by at least one tick, retries are due one tick later
+        time.sleep(0.1)
+        asyncio.run(scheduler.tick(context))
+    return scheduler
+
+
+def test_fired_timer_is_deleted_only_after_it_was_sent(tmp_path):
+    path = tmp_path / 'timers.sqlite'
+    bot = FlakyBot()
+    scheduler = tick_due_timer(path, bot)
+
+    assert bot.sent == ['42']
+    assert bot.rows_while_sending == [[('42', BEFORE_PERIOD)]]
+    assert stored_timers(path) == []
+    assert scheduler.stats['sent'] == 1
+
+
+def test_transient_send_failure_keeps_the_timer_for_a_retry(tmp_path):
+    path = tmp_path / 'timers.sqlite'
+    scheduler = tick_due_timer(path, FlakyBot(NetworkError('timed out')))
+
+    assert scheduler.has('42', BEFORE_PERIOD)
+    assert stored_timers(path) == [('42', BEFORE_PERIOD)]
+    assert scheduler.stats['retried'] == 1
+
+
+def test_transient_send_failure_is_given_up_after_the_last_attempt(tmp_path):
+    path = tmp_path / 'timers.sqlite'
+    bot = FlakyBot(NetworkError('timed out'))
+    scheduler = tick_due_timer(path, bot, ticks=NOTIFICATION_SEND_ATTEMPTS)
+
+    assert len(bot.rows_while_sending) == NOTIFICATION_SEND_ATTEMPTS
+    assert not scheduler.has('42', BEFORE_PERIOD)
+    assert stored_timers(path) == []
+    assert scheduler.stats['failed'] == 1
+
+
+def test_blocked_chat_drops_the_timer(tmp_path):
+    path = tmp_path / 'timers.sqlite'
+    scheduler = tick_due_timer(path, FlakyBot(Forbidden('bot was blocked by the user')))
+
+    assert not scheduler.has('42', BEFORE_PERIOD)
+    assert stored_timers(path) == []
+    assert scheduler.stats['failed'] == 1
+
+
+def test_timers_of_dropped_kinds_are_deleted_on_open(tmp_path):
+    path = tmp_path / 'timers.sqlite'
+    scheduler = NotificationScheduler(str(path), tick=60)
+    scheduler.open()
+    scheduler._conn.execute(
+        "INSERT INTO timers (chat_id, kind, due, payload) VALUES ('42', 'log_end_date', ?, '{}')",
+        (time.time() + 3600,)
+    )
+    scheduler._conn.commit()
+    scheduler.close()
+
+    scheduler = NotificationScheduler(str(path), tick=60)
+    scheduler.open()
+    scheduler.close()
+
+    assert stored_timers(path) == []
+
+
+def test_backfill_recomputes_only_chats_without_timers(tmp_path, monkeypatch):
+    scheduler = NotificationScheduler(str(tmp_path / 'timers.sqlite'), tick=60)
+    scheduler.open()
+    scheduler.schedule('1', BEFORE_PERIOD, time.time() + 3600, {'lang': 'en'})
+    recomputed = []
+
+    async def recompute(chat_id, lang='en', timezone=None):
+        recomputed.append((chat_id, lang))
+
+    monkeypatch.setattr(timing_wheel, 'notification_scheduler', scheduler)
+    monkeypatch.setattr(timing_wheel, 'recompute_user_timers', recompute)
+    monkeypatch.setattr(token_store, '_store', SimpleNamespace(chat_ids=lambda: ['1', '2']))
+    application = SimpleNamespace(user_data={2: {'language': 'fa'}}, persistence=None)
+
+    asyncio.run(timing_wheel.backfill_timers(SimpleNamespace(application=application)))
+    scheduler.close()
+
+    assert recomputed == [('2', 'fa')]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import token_refresh
+import token_store
+from benchmarks.fake_backend import make_jwt
+from token_refresh import TokenRefresher
+from token_store import SqliteTokenStore, RELOGIN_REQUIRED
+
+ALICE = {'access': make_jwt('alice', 'access', -10), 'refresh': make_jwt('alice', 'refresh', 3600)}
+BOB = {'access': make_jwt('bob', 'access', 3600), 'refresh': make_jwt('bob', 'refresh', 3600)}
+
+
+class HeldRefresh(httpx.AsyncBaseTransport):
+    """Answers /api/auth/jwt/refresh/ with the given status once released."""
+
+    def __init__(self, status):
+        self.status = status
+        self.received = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def handle_async_request(self, request):
+        self.received.set()
+        await self.release.wait()
+        body = {'access': 'REFRESHED_ALICE_ACCESS'} if self.status == 200 else {'detail': 'Token is blacklisted'}
+        return httpx.Response(self.status, stream=httpx.ByteStream(json.dumps(body).encode()))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SqliteTokenStore(str(tmp_path / 'tokens.db'))
+    monkeypatch.setattr(token_store, '_store', store)
+    yield store
+    store.close()
+
+
+async def refresh_during(monkeypatch, store, status, session_change):
+    """Start a refresh of chat 1 as alice, run session_change while it is held, then let it finish."""
+    backend = HeldRefresh(status)
+    refresher = TokenRefresher()
+    async with httpx.AsyncClient(base_url='http://backend', transport=backend) as client:
+        monkeypatch.setattr(token_refresh, 'get_client', lambda: client)
+        store.set('1', ALICE)
+        task = asyncio.ensure_future(refresher.refresh('1'))
+        await backend.received.wait()
+        session_change(refresher)
+        backend.release.set()
+        return refresher, await task
+
+
+def logout(refresher):
+    token_store.get_token_store().delete('1')
+    refresher.forget('1')
+
+
+def logout_and_login_as_bob(refresher):
+    logout(refresher)
+    token_store.get_token_store().set('1', BOB)
+
+
+def test_refresh_finishing_after_logout_does_not_log_the_chat_in_again(monkeypatch, store):
+    refresher, result = asyncio.run(refresh_during(monkeypatch, store, 200, logout))
+
+    assert result is None
+    assert store.get('1') is None
+    assert refresher.stats['discarded'] == 1
+
+
+def test_refresh_finishing_after_another_login_keeps_the_new_session(monkeypatch, store):
+    asyncio.run(refresh_during(monkeypatch, store, 200, logout_and_login_as_bob))
+
+    assert store.get('1') == BOB
+
+
+def test_refused_refresh_after_another_login_does_not_log_the_new_user_out(monkeypatch, store):
+    refresher, _ = asyncio.run(refresh_during(monkeypatch, store, 401, logout_and_login_as_bob))
+
+    assert store.get('1') == BOB
+    assert refresher.stats['relogin'] == 0
+
+
+def test_refresh_of_the_same_session_is_stored(monkeypatch, store):
+    refresher, result = asyncio.run(refresh_during(monkeypatch, store, 200, lambda refresher: None))
+
+    assert result == 'REFRESHED_ALICE_ACCESS'
+    assert store.get('1') == dict(ALICE, access='REFRESHED_ALICE_ACCESS')
+
+
+def test_update_never_creates_an_entry(store):
+    assert store.update('2', **{RELOGIN_REQUIRED: True}) is False
+    assert '2' not in store
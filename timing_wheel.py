@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, time as dt_time
+from zoneinfo import ZoneInfo
+from telegram.error import Forbidden, BadRequest, TelegramError
+from languages import get_message
+from local_analysis import analyze_periods
+from rate_limiter import bulk_send_kwargs
+import config
+
+logger = logging.getLogger(__name__)
+
+# Notification kinds and the offsets they are scheduled at
+BEFORE_PERIOD = 'before_period'
+FERTILE_WINDOW = 'fertile_window'
+NOTIFICATION_KINDS = (BEFORE_PERIOD, FERTILE_WINDOW)
+
+# Days before the predicted start: 2 for the reminder, 19 for the fertile
+# window (ovulation about 14 days before the period, fertile from 5 days earlier)
+BEFORE_PERIOD_DAYS = 2
+FERTILE_WINDOW_DAYS = 19
+# Sends of one notification before it is given up, e.g. while the bulk queue stays full
+NOTIFICATION_SEND_ATTEMPTS = 3
+
+
+class TimingWheel:
+    """Hierarchical timing wheel keyed by (chat_id, kind).
+
+    Level 0 has one slot per tick, every higher level has slots spanning a full
+    turn of the level below. Insert and cancel are O(1); advancing by one tick
+    touches one slot, plus one slot per level when a lower level wraps, where
+    that slot's timers cascade down. Timers further out than the top level
+    covers stay in the top level and are placed again on each cascade.
+    """
+
+    def __init__(self, tick, slot_bits=6, levels=4, now=None):
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.slots = 1 << slot_bits
+        self.levels = levels
+        self._wheels = [[set() for _ in range(self.slots)] for _ in range(levels)]
+        # key -> [due tick, level, slot, payload]
+        self._timers = {}
+        self._expired = []
+        self.current = int((time.time() if now is None else now) // tick)
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def due_time(self, key):
+        """Return the due time of a timer as a timestamp, or None."""
+        entry = self._timers.get(key)
+        return None if entry is None else entry[0] * self.tick
+
+    def _place(self, key, entry):
+        delta = entry[0] - self.current
+        if delta <= 0:
+            entry[1] = entry[2] = None
+            self._expired.append(key)
+            return
+        level = 0
+        while level < self.levels - 1 and delta >= 1 << (self.slot_bits * (level + 1)):
+            level += 1
+        slot = (entry[0] >> (self.slot_bits * level)) & (self.slots - 1)
+        entry[1], entry[2] = level, slot
+        self._wheels[level][slot].add(key)
+
+    def insert(self, key, due, payload=None):
+        """Schedule key at timestamp due, replacing an existing timer of the same key."""
+        self.cancel(key)
+        # Round up so a timer never fires before its due time
+        entry = [-int(-due // self.tick), None, None, payload]
+        self._timers[key] = entry
+        self._place(key, entry)
+
+    def cancel(self, key):
+        """Remove a timer. Returns whether it existed."""
+        entry = self._timers.pop(key, None)
+        if entry is None:
+            return False
+        if entry[1] is not None:
+            self._wheels[entry[1]][entry[2]].discard(key)
+        return True
+
+    def _cascade(self, level):
+        slot = (self.current >> (self.slot_bits * level)) & (self.slots - 1)
+        keys = self._wheels[level][slot]
+        self._wheels[level][slot] = set()
+        for key in keys:
+            self._place(key, self._timers[key])
+
+    def advance(self, now=None):
+        """Advance to now and return [(key, payload)] of the timers that are due."""
+        target = int((time.time() if now is None else now) // self.tick)
+        fired = []
+        while self.current < target:
+            self.current += 1
+            for level in range(1, self.levels):
+                if self.current & ((1 << (self.slot_bits * level)) - 1):
+                    break
+                self._cascade(level)
+            slot = self.current & (self.slots - 1)
+            keys = self._wheels[0][slot]
+            self._wheels[0][slot] = set()
+            self._expired.extend(keys)
+            while self._expired:
+                key = self._expired.pop()
+                entry = self._timers.get(key)
+                if entry is None:
+                    continue
+                if entry[0] > self.current:
+                    # Parked in a slot that came round before the timer is due
+                    self._place(key, entry)
+                    continue
+                del self._timers[key]
+                fired.append((key, entry[3]))
+        return fired
+
+
+class NotificationScheduler:
+    """Per-user notifications on one timing wheel, persisted in SQLite.
+
+    The timers live in a table next to the PTB persistence tables. Changes
+    are buffered and written in one transaction on each tick, and the wheel is
+    rebuilt from the table at startup. A single repeating job advances the
+    wheel and sends what is due.
+    """
+
+    def __init__(self, path, tick):
+        self.path = path
+        self.wheel = TimingWheel(tick)
+        self._conn = None
+        # (chat_id, kind) -> (due, payload json), or None to delete the row
+        self._dirty = {}
+        self.stats = {'inserted': 0, 'cancelled': 0, 'fired': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    def open(self):
+        # Only the timers of this database, not those of one opened before
+        self.wheel = TimingWheel(self.wheel.tick)
+        self._dirty = {}
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS timers ("
+                "chat_id TEXT NOT NULL, kind TEXT NOT NULL, due REAL NOT NULL, payload TEXT NOT NULL, "
+                "PRIMARY KEY (chat_id, kind))"
+            )
+            # Kinds no longer sent, e.g. the former end date reminder
+            placeholders = ', '.join('?' * len(NOTIFICATION_KINDS))
+            self._conn.execute(f"DELETE FROM timers WHERE kind NOT IN ({placeholders})", NOTIFICATION_KINDS)
+        for chat_id, kind, due, payload in self._conn.execute("SELECT chat_id, kind, due, payload FROM timers"):
+            self.wheel.insert((chat_id, kind), due, json.loads(payload))
+        logger.info(f"Loaded {len(self.wheel)} notification timers")
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def flush(self):
+        if not self._dirty or self._conn is None:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            with self._conn:
+                for (chat_id, kind), row in dirty.items():
+                    if row is None:
+                        self._conn.execute("DELETE FROM timers WHERE chat_id = ? AND kind = ?", (chat_id, kind))
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO timers (chat_id, kind, due, payload) VALUES (?, ?, ?, ?)",
+                            (chat_id, kind, row[0], row[1])
+                        )
+        except sqlite3.Error:
+            logger.error("Failed to write notification timers", exc_info=True)
+            for key, row in dirty.items():
+                self._dirty.setdefault(key, row)
+
+    def has(self, chat_id, kind):
+        return (chat_id, kind) in self.wheel
+
+    def has_any(self, chat_id):
+        return any(self.has(chat_id, kind) for kind in NOTIFICATION_KINDS)
+
+    def schedule(self, chat_id, kind, due, payload):
+        self.wheel.insert((chat_id, kind), due, payload)
+        self._dirty[(chat_id, kind)] = (due, json.dumps(payload))
+        self.stats['inserted'] += 1
+
+    def cancel(self, chat_id, kind):
+        if self.wheel.cancel((chat_id, kind)):
+            self._dirty[(chat_id, kind)] = None
+            self.stats['cancelled'] += 1
+
+    def cancel_all(self, chat_id):
+        for kind in NOTIFICATION_KINDS:
+            self.cancel(chat_id, kind)
+
+    def recompute(self, chat_id, periods, lang='en', timezone=None, analysis=None):
+        """Replace the timers of a chat from its period history (newest first).
+
+        The predicted start comes from the backend analysis if given; without
+        one it is approximated locally from the history.
+        """
+        self.cancel_all(chat_id)
+        if not periods:
+            return
+        tz = ZoneInfo(timezone or config.REMINDER_TIMEZONE)
+        at = dt_time(config.NOTIFICATION_HOUR, tzinfo=tz)
+        now = time.time()
+        payload = {'lang': lang}
+
+        def schedule_on(kind, day, **extra):
+            due = datetime.combine(day, at).timestamp()
+            if due > now:
+                self.schedule(chat_id, kind, due, dict(payload, **extra))
+
+        if analysis is None:
+            analysis = analyze_periods(periods)
+        if analysis and analysis.get('next_predicted_date'):
+            predicted = date.fromisoformat(analysis['next_predicted_date'])
+            schedule_on(BEFORE_PERIOD, predicted - timedelta(days=BEFORE_PERIOD_DAYS), date=predicted.isoformat())
+            schedule_on(FERTILE_WINDOW, predicted - timedelta(days=FERTILE_WINDOW_DAYS), date=predicted.isoformat())
+
+    async def tick(self, context):
+        """Job: fire the due timers and persist the changes of the last interval.
+
+        A fired timer keeps its row until its send has ended, so a restart in
+        between sends it again rather than losing it. Sends that fail for a
+        transient reason are retried on the next ticks, up to
+        NOTIFICATION_SEND_ATTEMPTS times.
+        """
+        fired = self.wheel.advance()
+        self.flush()
+        if not fired:
+            return
+        self.stats['fired'] += len(fired)
+        send_kwargs = bulk_send_kwargs(context.bot)
+        pending = iter(fired)
+
+        def done(key):
+            # Unless recompute scheduled a new timer of the key meanwhile
+            if key not in self.wheel:
+                self._dirty[key] = None
+
+        async def worker():
+            for (chat_id, kind), payload in pending:
+                lang = payload.get('lang', 'en')
+                try:
+                    await context.bot.send_message(
+                        chat_id, get_message(lang, 'reminders', kind, payload.get('date')), **send_kwargs
+                    )
+                    self.stats['sent'] += 1
+                except (Forbidden, BadRequest) as e:
+                    # Blocked the bot or deleted the chat, trying again does not help
+                    logger.warning(f"Notification {kind} to chat {chat_id} not sent: {e}")
+                    self.stats['failed'] += 1
+                except TelegramError as e:
+                    # Network errors, flood control, or SendDropped while the bulk queue is full
+                    attempts = payload.get('attempts', 0) + 1
+                    if attempts < NOTIFICATION_SEND_ATTEMPTS and (chat_id, kind) not in self.wheel:
+                        logger.warning(f"Notification {kind} to chat {chat_id} not sent, retrying: {e}")
+                        self.schedule(chat_id, kind, time.time() + self.wheel.tick, dict(payload, attempts=attempts))
+                        self.stats['retried'] += 1
+                        continue
+                    logger.warning(f"Notification {kind} to chat {chat_id} not sent: {e}")
+                    self.stats['failed'] += 1
+                done((chat_id, kind))
+
+        await asyncio.gather(*(worker() for _ in range(config.REMINDER_SEND_CONCURRENCY)))
+        self.flush()
+
+    def timer_stats(self):
+        return dict(self.stats, timers=len(self.wheel))
+
+
+notification_scheduler = NotificationScheduler(config.PERSISTENCE_PATH, config.NOTIFICATION_TICK)
+
+
+async def recompute_user_timers(chat_id, lang='en', timezone=None):
+    """Reload the history of a chat and recompute its notification timers."""
+    from period import load_periods
+    from utils import get_access_token
+    from cycle_analysis import request_cycle_analysis
+    try:
+        access_token = await get_access_token(chat_id)
+        if not access_token:
+            return
+        periods, analysis = await asyncio.gather(
+            load_periods(chat_id, access_token), request_cycle_analysis(access_token)
+        )
+    except Exception:
+        logger.error(f"Failed to load periods to schedule notifications for chat {chat_id}", exc_info=True)
+        return
+    if periods is not None:
+        notification_scheduler.recompute(chat_id, periods, lang, timezone, analysis)
+
+
+def start_recompute(application, chat_id, user_data):
+    """Recompute the timers of a chat in the background, e.g. after a login."""
+    from settings import user_timezone
+    application.create_task(
+        recompute_user_timers(chat_id, user_data.get('language', 'en'), user_timezone(user_data))
+    )
+
+
+async def backfill_timers(context):
+    """Job: compute the timers of logged-in chats that have none, e.g. from before notifications.
+
+    Chats without enough history for a prediction are looked up again on
+    every start, as nothing marks them as done.
+    """
+    from persistence import user_data_of
+    from settings import user_timezone
+    from token_store import get_token_store
+    chat_ids = [
+        chat_id for chat_id in get_token_store().chat_ids()
+        if not notification_scheduler.has_any(chat_id)
+    ]
+    semaphore = asyncio.Semaphore(config.REMINDER_FETCH_CONCURRENCY)
+
+    async def backfill(chat_id):
+        user_data = user_data_of(context.application, int(chat_id))
+        async with semaphore:
+            await recompute_user_timers(chat_id, user_data.get('language', 'en'), user_timezone(user_data))
+
+    await asyncio.gather(*(backfill(chat_id) for chat_id in chat_ids))
+    logger.info(f"Recomputed notification timers of {len(chat_ids)} chats without any")
+
+
+def schedule_notifications(application):
+    """Load the persisted timers and register the tick and backfill jobs."""
+    if application.job_queue is None:
+        logger.warning("JobQueue not available, notifications are disabled")
+        return
+    notification_scheduler.close()
+    notification_scheduler.path = config.PERSISTENCE_PATH
+    notification_scheduler.open()
+    application.job_queue.run_repeating(
+        notification_scheduler.tick,
+        interval=config.NOTIFICATION_TICK,
+        first=config.NOTIFICATION_TICK,
+        name="notification_tick"
+    )
+    application.job_queue.run_once(backfill_timers, when=config.NOTIFICATION_TICK, name="notification_backfill")
+    logger.info(f"Scheduled notification tick every {config.NOTIFICATION_TICK}s")
@@ -0,0 +1,253 @@
+import asyncio
+import base64
+import json
+import logging
+import time
+import config
+from http_client import get_client
+from token_store import get_token_store, RELOGIN_REQUIRED
+
+logger = logging.getLogger(__name__)
+
+
+def decode_jwt_claims(token):
+    """Decode the payload of a JWT without verifying its signature."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+# Claims identifying the user of an access token, in order of preference
+_SUBJECT_CLAIMS = ('user_id', 'sub', 'user')
+
+
+def token_subject(token):
+    """Return the user a JWT was issued to, e.g. 'user_id:42', or None if unknown."""
+    claims = decode_jwt_claims(token)
+    if isinstance(claims, dict):
+        for claim in _SUBJECT_CLAIMS:
+            if claims.get(claim) is not None:
+                return f"{claim}:{claims[claim]}"
+    return None
+
+
+TOKEN_VALID = 'valid'
+TOKEN_EXPIRING = 'expiring'
+TOKEN_UNKNOWN = 'unknown'
+
+# How many backend token validations local checks saved, and how many still ran
+validation_stats = {'avoided': 0, 'backend': 0}
+
+
+def check_token_locally(token, margin=0, now=None):
+    """Check expiry and basic claims of an access JWT without verifying its signature.
+
+    Returns TOKEN_VALID, TOKEN_EXPIRING (expired or expires within margin seconds)
+    or TOKEN_UNKNOWN when the token cannot be judged locally.
+    """
+    claims = decode_jwt_claims(token)
+    if not isinstance(claims, dict) or not isinstance(claims.get('exp'), (int, float)):
+        return TOKEN_UNKNOWN
+    if claims.get('token_type', 'access') != 'access':
+        return TOKEN_UNKNOWN
+
+    now = time.time() if now is None else now
+    nbf = claims.get('nbf')
+    if isinstance(nbf, (int, float)) and nbf > now:
+        return TOKEN_UNKNOWN
+    if claims['exp'] - now <= margin:
+        return TOKEN_EXPIRING
+    return TOKEN_VALID
+
+
+def token_expiry(token):
+    """Return the exp claim of a JWT as a unix timestamp, or None if unknown."""
+    claims = decode_jwt_claims(token)
+    if not claims or not isinstance(claims.get('exp'), (int, float)):
+        return None
+    return claims['exp']
+
+
+class TokenRefresher:
+    """Refreshes access tokens ahead of expiry, one request per chat at a time.
+
+    A chat whose refresh token has expired (checked locally) or is refused by
+    the backend is marked in the token store as having to log in again and
+    is not refreshed any more; a new login replaces the mark. After a
+    transient failure the background scan backs off exponentially per chat.
+    """
+
+    def __init__(self, margin=None, concurrency=None):
+        self.margin = config.TOKEN_REFRESH_MARGIN if margin is None else margin
+        self.concurrency = config.TOKEN_REFRESH_CONCURRENCY if concurrency is None else concurrency
+        self._inflight = {}
+        # chat_id -> (access token, exp) so the background scan does not re-decode
+        self._expiry = {}
+        # chat_id -> (consecutive transient failures, earliest next background attempt)
+        self._backoff = {}
+        self.stats = {'refreshes': 0, 'failures': 0, 'coalesced': 0, 'background': 0, 'relogin': 0, 'discarded': 0}
+
+    def expires_at(self, chat_id, access_token):
+        cached = self._expiry.get(chat_id)
+        if cached and cached[0] == access_token:
+            return cached[1]
+        exp = token_expiry(access_token)
+        self._expiry[chat_id] = (access_token, exp)
+        return exp
+
+    def needs_refresh(self, chat_id, access_token, margin=None):
+        """True if the token expires within the margin. Opaque tokens never do."""
+        exp = self.expires_at(chat_id, access_token)
+        if exp is None:
+            return False
+        margin = self.margin if margin is None else margin
+        return exp - time.time() <= margin
+
+    async def refresh(self, chat_id):
+        """Refresh the access token of a chat, sharing any refresh already running."""
+        chat_id = str(chat_id)
+        task = self._inflight.get(chat_id)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._refresh(chat_id))
+        self._inflight[chat_id] = task
+        task.add_done_callback(lambda done: self._forget_task(chat_id, done))
+        return await asyncio.shield(task)
+
+    def _forget_task(self, chat_id, task):
+        if self._inflight.get(chat_id) is task:
+            del self._inflight[chat_id]
+
+    def _require_relogin(self, chat_id, refresh_token, reason):
+        # Only for the session whose refresh token failed, not one logged in since
+        if not get_token_store().update(chat_id, if_refresh=refresh_token, **{RELOGIN_REQUIRED: True}):
+            return
+        self.stats['relogin'] += 1
+        self._backoff.pop(chat_id, None)
+        logger.warning(f"Refresh token of chat {chat_id} is {reason}, the user has to log in again")
+
+    def _transient_failure(self, chat_id):
+        self.stats['failures'] += 1
+        failures = self._backoff.get(chat_id, (0, 0))[0] + 1
+        delay = min(config.TOKEN_REFRESH_RETRY_MAX, config.TOKEN_REFRESH_INTERVAL * 2 ** (failures - 1))
+        self._backoff[chat_id] = (failures, time.time() + delay)
+
+    async def _refresh(self, chat_id):
+        tokens = get_token_store().get(chat_id)
+        if not tokens or "refresh" not in tokens:
+            logger.warning(f"No refresh token found for chat_id: {chat_id}")
+            return None
+        if tokens.get(RELOGIN_REQUIRED):
+            return None
+        refresh_exp = token_expiry(tokens["refresh"])
+        if refresh_exp is not None and refresh_exp <= time.time():
+            self._require_relogin(chat_id, tokens["refresh"], 'expired')
+            return None
+
+        logger.info(f"Attempting to refresh token for chat_id: {chat_id}")
+        try:
+            client = get_client()
+            response = await client.post(
+                "/api/auth/jwt/refresh/",
+                data={"refresh": tokens["refresh"]}
+            )
+
+            logger.info(f"Refresh response status: {response.status_code}")
+            if response.status_code == 200:
+                data = response.json()
+                new_access = data.get("access")
+                fields = {"access": new_access}
+                # Backends with refresh rotation send a new refresh token too
+                if data.get("refresh"):
+                    fields["refresh"] = data["refresh"]
+                if not get_token_store().update(chat_id, if_refresh=tokens["refresh"], **fields):
+                    # Logged out or logged in again while the request was running
+                    logger.info(f"Discarded the refreshed token of chat {chat_id}, its session has ended")
+                    self.stats['discarded'] += 1
+                    return None
+                self._backoff.pop(chat_id, None)
+                self.stats['refreshes'] += 1
+                logger.info("Token refresh successful")
+                return new_access
+            elif response.status_code in (400, 401):
+                self._require_relogin(chat_id, tokens["refresh"], 'refused')
+                return None
+            else:
+                self._transient_failure(chat_id)
+                logger.error(f"Token refresh failed: {response.text}")
+                return None
+
+        except Exception as e:
+            self._transient_failure(chat_id)
+            logger.error(f"Token refresh error: {str(e)}")
+            return None
+
+    async def get_access_token(self, chat_id):
+        """Return a usable access token, refreshing first only if it is already expiring."""
+        chat_id = str(chat_id)
+        access_token = get_token_store().get_access(chat_id)
+        if not access_token:
+            return None
+        if self.needs_refresh(chat_id, access_token, margin=0):
+            return await self.refresh(chat_id) or access_token
+        return access_token
+
+    async def refresh_expiring(self, context=None):
+        """Job callback: refresh every token that will expire within the margin."""
+        store = get_token_store()
+        now = time.time()
+        due = []
+        for chat_id in store.chat_ids():
+            tokens = store.get(chat_id)
+            if not tokens or "refresh" not in tokens or not tokens.get("access") or tokens.get(RELOGIN_REQUIRED):
+                continue
+            if self._backoff.get(chat_id, (0, 0))[1] > now:
+                continue
+            if self.needs_refresh(chat_id, tokens["access"]):
+                due.append(chat_id)
+
+        if not due:
+            return
+        logger.info(f"Refreshing {len(due)} expiring tokens in the background")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh_one(chat_id):
+            async with semaphore:
+                await self.refresh(chat_id)
+
+        self.stats['background'] += len(due)
+        await asyncio.gather(*(refresh_one(chat_id) for chat_id in due))
+
+    def forget(self, chat_id):
+        """Drop cached data of a chat, e.g. on logout.
+
+        A refresh still running for the chat is detached, so callers from now
+        on start their own; its result is discarded as the store no longer
+        holds the refresh token it sent.
+        """
+        chat_id = str(chat_id)
+        self._expiry.pop(chat_id, None)
+        self._backoff.pop(chat_id, None)
+        self._inflight.pop(chat_id, None)
+
+
+token_refresher = TokenRefresher()
+
+
+def schedule_token_refresh(application):
+    """Register the background refresh job on the application's job queue."""
+    if application.job_queue is None:
+        logger.warning("JobQueue not available, tokens will only be refreshed on demand")
+        return
+    application.job_queue.run_repeating(
+        token_refresher.refresh_expiring,
+        interval=config.TOKEN_REFRESH_INTERVAL,
+        first=config.TOKEN_REFRESH_INTERVAL,
+        name="token_refresh"
+    )
+    logger.info("Scheduled background token refresh")
@@ -0,0 +1,193 @@
+import abc
+import json
+import logging
+import os
+import sqlite3
+import config
+
+logger = logging.getLogger(__name__)
+
+# Set by the token refresher when the refresh token no longer works; a new login replaces it
+RELOGIN_REQUIRED = 'relogin_required'
+
+
+class TokenStore(abc.ABC):
+    """Per-chat token storage. Reads are served from an in-memory index.
+
+    Subclasses persist the index through _write and _remove.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+
+    def get(self, chat_id):
+        """Return the token dict for a chat, or None if the chat is not logged in."""
+        return self._tokens.get(str(chat_id))
+
+    def get_access(self, chat_id):
+        """Return the access token for a chat, or None, also when the chat has to log in again."""
+        tokens = self._tokens.get(str(chat_id))
+        if not tokens or tokens.get(RELOGIN_REQUIRED):
+            return None
+        return tokens.get("access")
+
+    def set(self, chat_id, tokens):
+        """Replace all tokens stored for a chat."""
+        chat_id = str(chat_id)
+        self._tokens[chat_id] = dict(tokens)
+        self._write(chat_id, self._tokens[chat_id])
+
+    def update(self, chat_id, if_refresh=None, **fields):
+        """Update some token fields (e.g. access) of a logged-in chat. Returns whether it did.
+
+        Never creates an entry, so a late write after logout does not log the
+        chat in again. With if_refresh the fields are only written while the
+        stored refresh token is still that one, so a refresh that finishes
+        after a new login cannot mix two sessions.
+        """
+        chat_id = str(chat_id)
+        tokens = self._tokens.get(chat_id)
+        if tokens is None or (if_refresh is not None and tokens.get("refresh") != if_refresh):
+            return False
+        tokens = dict(tokens)
+        tokens.update(fields)
+        self.set(chat_id, tokens)
+        return True
+
+    def delete(self, chat_id):
+        """Remove a chat's tokens. Returns True if the chat was logged in."""
+        chat_id = str(chat_id)
+        if chat_id not in self._tokens:
+            return False
+        del self._tokens[chat_id]
+        self._remove(chat_id)
+        return True
+
+    def chat_ids(self):
+        """Return the ids of all logged-in chats."""
+        return list(self._tokens)
+
+    def __contains__(self, chat_id):
+        return str(chat_id) in self._tokens
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def _write(self, chat_id, tokens):
+        """Persist the tokens of a chat."""
+
+    @abc.abstractmethod
+    def _remove(self, chat_id):
+        """Delete the stored tokens of a chat."""
+
+
+class SqliteTokenStore(TokenStore):
+    """Token store backed by SQLite in WAL mode, one row per chat."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "chat_id TEXT PRIMARY KEY, "
+            "data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        for chat_id, data in self._conn.execute("SELECT chat_id, data FROM tokens"):
+            self._tokens[chat_id] = json.loads(data)
+        logger.info(f"Loaded {len(self._tokens)} token entries from {path}")
+
+    def _write(self, chat_id, tokens):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tokens (chat_id, data) VALUES (?, ?)",
+                (chat_id, json.dumps(tokens))
+            )
+
+    def _remove(self, chat_id):
+        with self._conn:
+            self._conn.execute("DELETE FROM tokens WHERE chat_id = ?", (chat_id,))
+
+    def set_many(self, entries):
+        """Store several chats' tokens in a single transaction."""
+        entries = {str(chat_id): dict(tokens) for chat_id, tokens in entries.items()}
+        self._tokens.update(entries)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tokens (chat_id, data) VALUES (?, ?)",
+                [(chat_id, json.dumps(tokens)) for chat_id, tokens in entries.items()]
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class JsonTokenStore(TokenStore):
+    """Legacy store that rewrites the whole JSON file on every change."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._tokens = read_json_tokens(path)
+
+    def _write(self, chat_id, tokens):
+        self._save()
+
+    def _remove(self, chat_id):
+        self._save()
+
+    def _save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self._tokens, f, indent=4)
+
+
+def read_json_tokens(path):
+    """Read tokens from the legacy JSON file, returning {} if missing or invalid."""
+    try:
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {}
+    except json.JSONDecodeError:
+        logger.error(f"Invalid token file: {path}")
+        return {}
+
+
+def migrate_json_tokens(store, json_path):
+    """Copy tokens from the legacy JSON file into an empty SQLite store."""
+    tokens = read_json_tokens(json_path)
+    if not tokens:
+        return 0
+    store.set_many(tokens)
+    os.replace(json_path, f"{json_path}.migrated")
+    logger.info(f"Migrated {len(tokens)} token entries from {json_path}")
+    return len(tokens)
+
+
+def open_token_store():
+    """Open the token store selected by config.TOKEN_STORE_BACKEND."""
+    if config.TOKEN_STORE_BACKEND == 'json':
+        return JsonTokenStore(config.TOKEN_FILE)
+
+    store = SqliteTokenStore(config.TOKEN_DB_PATH)
+    if len(store) == 0:
+        migrate_json_tokens(store, config.TOKEN_FILE)
+    return store
+
+
+_store = None
+
+
+def get_token_store():
+    """Return the process-wide token store, opening it on first use."""
+    global _store
+    if _store is None:
+        _store = open_token_store()
+    return _store
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently and updates of one chat in order.
+
+    PTB's own semaphore (max_queued) only bounds how many updates are admitted.
+    The number of handlers actually running is bounded by max_running, which is
+    acquired after the chat lock so a chat with a backlog cannot hold slots that
+    other chats could use.
+    """
+
+    def __init__(self, max_running, max_queued):
+        super().__init__(max_concurrent_updates=max_queued)
+        self.max_running = max_running
+        self._running_slots = asyncio.BoundedSemaphore(max_running)
+        # chat_id -> [lock, number of updates holding or waiting for it]
+        self._chat_locks = {}
+        self.stats = {'queued': 0, 'running': 0, 'processed': 0, 'peak_queued': 0}
+
+    async def do_process_update(self, update, coroutine):
+        self.stats['queued'] += 1
+        self.stats['peak_queued'] = max(self.stats['peak_queued'], self.stats['queued'])
+        started = []
+        try:
+            chat = update.effective_chat if isinstance(update, Update) else None
+            if chat is None:
+                await self._run(coroutine, started)
+                return
+
+            entry = self._chat_locks.get(chat.id)
+            if entry is None:
+                entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    await self._run(coroutine, started)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._chat_locks[chat.id]
+        finally:
+            # Cancelled before it got to run
+            if not started:
+                self.stats['queued'] -= 1
+
+    async def _run(self, coroutine, started):
+        """Run the update once a running slot is free. Counts as queued until then."""
+        async with self._running_slots:
+            started.append(True)
+            self.stats['queued'] -= 1
+            self.stats['running'] += 1
+            try:
+                await coroutine
+            finally:
+                self.stats['running'] -= 1
+                self.stats['processed'] += 1
+
+    def queue_stats(self):
+        """Return counters plus the number of chats with updates in progress."""
+        return dict(self.stats, active_chats=len(self._chat_locks))
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._chat_locks:
+            logger.info(f"Shutting down with {len(self._chat_locks)} chats still being processed")